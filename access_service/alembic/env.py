@@ -27,11 +27,19 @@ sync_url = db_url_async.replace("+asyncpg", "")
 config.set_main_option("sqlalchemy.url", sync_url)
 
 target_metadata = Base.metadata
+# Своя таблица версий позволяет держать схемы нескольких сервисов в одной БД
+# (режим монолита).
+VERSION_TABLE = os.getenv("ALEMBIC_VERSION_TABLE", "alembic_version")
 
 
 def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
-    context.configure(url=url, target_metadata=target_metadata, literal_binds=True)
+    context.configure(
+        url=url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        version_table=VERSION_TABLE,
+    )
     with context.begin_transaction():
         context.run_migrations()
 
@@ -39,7 +47,11 @@ def run_migrations_offline() -> None:
 def run_migrations_online() -> None:
     connectable = create_engine(sync_url)
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            version_table=VERSION_TABLE,
+        )
         with context.begin_transaction():
             context.run_migrations()
 
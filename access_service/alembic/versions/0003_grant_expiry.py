@@ -0,0 +1,25 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_grant_expiry"
+down_revision = "0002_membership_changes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    for table in ("user_accesses", "user_groups"):
+        op.add_column(table, sa.Column("expires_at", sa.DateTime(timezone=True)))
+        # планировщик истечений читает только временные выдачи
+        op.create_index(
+            f"ix_{table}_expires_at",
+            table,
+            ["expires_at"],
+            postgresql_where=sa.text("expires_at IS NOT NULL"),
+        )
+
+
+def downgrade() -> None:
+    for table in ("user_accesses", "user_groups"):
+        op.drop_index(f"ix_{table}_expires_at", table_name=table)
+        op.drop_column(table, "expires_at")
@@ -0,0 +1,34 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_audit_log"
+down_revision = "0003_grant_expiry"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "audit_log",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("occurred_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("action", sa.String(length=20), nullable=False),
+        sa.Column("user_id", sa.String(length=100), nullable=False),
+        sa.Column("kind", sa.String(length=10), nullable=False),
+        sa.Column("target_id", sa.Integer(), nullable=False),
+        sa.Column("request_id", sa.Integer()),
+        sa.Column("expires_at", sa.DateTime(timezone=True)),
+        sa.Column("source", sa.String(length=20), nullable=False),
+    )
+    # строки только дописываются по времени: BRIN в сотни раз меньше B-tree
+    op.create_index(
+        "ix_audit_log_occurred_at",
+        "audit_log",
+        ["occurred_at"],
+        postgresql_using="brin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_audit_log_occurred_at", table_name="audit_log")
+    op.drop_table("audit_log")
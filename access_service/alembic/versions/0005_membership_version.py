@@ -0,0 +1,32 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_membership_version"
+down_revision = "0004_audit_log"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "membership_version",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+    )
+    # прежние записи журнала: версия совпадает с id, счётчик продолжает с максимума
+    op.add_column("membership_changes", sa.Column("version", sa.BigInteger()))
+    op.execute("UPDATE membership_changes SET version = id")
+    op.alter_column("membership_changes", "version", nullable=False)
+    op.create_index(
+        "ix_membership_changes_version", "membership_changes", ["version"]
+    )
+    op.execute(
+        "INSERT INTO membership_version (id, version) "
+        "SELECT 1, COALESCE(MAX(id), 0) FROM membership_changes"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_membership_changes_version", table_name="membership_changes")
+    op.drop_column("membership_changes", "version")
+    op.drop_table("membership_version")
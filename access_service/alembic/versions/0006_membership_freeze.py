@@ -0,0 +1,20 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_membership_freeze"
+down_revision = "0005_membership_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "membership_freeze",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("frozen", sa.Boolean(), nullable=False),
+    )
+    op.execute("INSERT INTO membership_freeze (id, frozen) VALUES (1, false)")
+
+
+def downgrade() -> None:
+    op.drop_table("membership_freeze")
@@ -0,0 +1,128 @@
+"""
+Журнал аудита выдач и отзывов с отложенной пакетной записью (write-behind).
+
+record() только добавляет событие в буфер в памяти и не ждёт БД, поэтому
+/access/apply не платит за аудит вторым INSERT. Фоновая задача сбрасывает
+буфер пачкой (COPY в Postgres, многострочный INSERT иначе), когда в нём
+набралось AUDIT_BATCH_SIZE событий или прошло AUDIT_FLUSH_INTERVAL секунд.
+При ошибке записи пачка возвращается в начало буфера и повторяется; при
+остановке сервиса буфер сбрасывается полностью.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from . import db
+from . import repositories as repo
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1"))
+
+
+class AuditLog:
+    """Буфер событий аудита со сбросом по размеру или по времени."""
+
+    def __init__(
+        self,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_INTERVAL,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[dict] = []
+        self._lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.failures = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def record(
+        self,
+        action: str,
+        user_id: str,
+        kind: str,
+        target_id: int,
+        source: str,
+        request_id: Optional[int] = None,
+        expires_at: Optional[datetime] = None,
+    ) -> None:
+        """Добавить событие (action: grant | revoke | expire) в буфер."""
+        self._buffer.append(
+            {
+                "occurred_at": datetime.now(timezone.utc),
+                "action": action,
+                "user_id": user_id,
+                "kind": kind,
+                "target_id": target_id,
+                "request_id": request_id,
+                "expires_at": expires_at,
+                "source": source,
+            }
+        )
+        if len(self._buffer) >= self.batch_size:
+            self._full.set()
+
+    def lag(self) -> float:
+        """Возраст самого старого несброшенного события в секундах (0 — пусто)."""
+        if not self._buffer:
+            return 0.0
+        oldest = self._buffer[0]["occurred_at"]
+        return (datetime.now(timezone.utc) - oldest).total_seconds()
+
+    async def flush(self) -> int:
+        """Записать буфер пачками; вернуть число записанных событий."""
+        written = 0
+        async with self._lock:
+            while self._buffer:
+                batch = self._buffer[: self.batch_size]
+                del self._buffer[: self.batch_size]
+                try:
+                    async with db.async_session_factory() as session:
+                        await repo.insert_audit_events(session, batch)
+                except BaseException:
+                    # вернуть пачку в начало буфера (и при отмене задачи):
+                    # порядок и события сохраняются
+                    self._buffer[:0] = batch
+                    self.failures += 1
+                    raise
+                written += len(batch)
+                self.flushed += len(batch)
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            self._full.clear()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.warning("Audit flush failed, will retry", exc_info=True)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить фоновую задачу и сбросить оставшиеся события."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+audit_log = AuditLog()
@@ -0,0 +1,211 @@
+"""
+Синхронизация справочников Access с декларативным каталогом (POST /catalog:sync).
+
+Текущее состояние читается пятью запросами кортежей (Core, без ORM-слоя),
+сравнивается с документом в памяти, и применяются только отличия:
+пачечные DELETE по id, многострочные INSERT ... RETURNING и UPDATE описаний
+по первичному ключу — всё в одной транзакции. Повторная синхронизация
+неизменного каталога сводится к чтению и сравнению, без записи.
+
+При шардировании членства (app.sharding) проверка «выдано ли удаляемое»
+опрашивает все шарды параллельно, а после применения справочники
+основной БД реплицируются на шарды с сохранением id.
+
+Проверка и удаление не разделены гонкой: удаляемые строки справочников
+блокируются FOR UPDATE до проверки (выдача, ссылающаяся на них, ждёт
+commit и затем получает нарушение внешнего ключа), а при шардировании
+записи членства на время синхронизации исключены db.membership_exclusive.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import db
+from . import repositories as repo
+from . import schemas
+
+
+class CatalogConflict(Exception):
+    """Удаляемые доступы или группы ещё выданы пользователям."""
+
+    def __init__(self, accesses: List[str], groups: List[str]):
+        super().__init__("Catalog entries are still granted to users")
+        self.accesses = accesses
+        self.groups = groups
+
+
+@dataclass
+class EntityDiff:
+    # (код или имя, описание) новых записей
+    create: List[Tuple[str, Optional[str]]] = field(default_factory=list)
+    # (id, новое описание)
+    update: List[Tuple[int, Optional[str]]] = field(default_factory=list)
+    # id удаляемых записей
+    delete: List[int] = field(default_factory=list)
+
+
+@dataclass
+class LinkDiff:
+    # (код/имя владельца, код доступа) новых связей
+    add: List[Tuple[str, str]] = field(default_factory=list)
+    # id удаляемых строк связей
+    remove: List[int] = field(default_factory=list)
+
+
+@dataclass
+class CatalogDiff:
+    accesses: EntityDiff
+    groups: EntityDiff
+    resources: EntityDiff
+    group_accesses: LinkDiff
+    resource_accesses: LinkDiff
+
+    @property
+    def changed(self) -> bool:
+        entities = (self.accesses, self.groups, self.resources)
+        links = (self.group_accesses, self.resource_accesses)
+        return any(e.create or e.update or e.delete for e in entities) or any(
+            link.add or link.remove for link in links
+        )
+
+    def summary(self, dry_run: bool) -> schemas.CatalogSyncResponse:
+        def entity(d: EntityDiff) -> schemas.CatalogSectionDiff:
+            return schemas.CatalogSectionDiff(
+                created=len(d.create), updated=len(d.update), deleted=len(d.delete)
+            )
+
+        def link(d: LinkDiff) -> schemas.CatalogSectionDiff:
+            return schemas.CatalogSectionDiff(created=len(d.add), deleted=len(d.remove))
+
+        return schemas.CatalogSyncResponse(
+            changed=self.changed,
+            dry_run=dry_run,
+            accesses=entity(self.accesses),
+            groups=entity(self.groups),
+            resources=entity(self.resources),
+            group_accesses=link(self.group_accesses),
+            resource_accesses=link(self.resource_accesses),
+        )
+
+
+def _diff_entities(
+    current: Dict[str, Tuple[int, Optional[str]]],
+    desired: Dict[str, Optional[str]],
+) -> EntityDiff:
+    diff = EntityDiff()
+    for key, description in desired.items():
+        existing = current.get(key)
+        if existing is None:
+            diff.create.append((key, description))
+        elif existing[1] != description:
+            diff.update.append((existing[0], description))
+    diff.delete = [id_ for key, (id_, _) in current.items() if key not in desired]
+    return diff
+
+
+def _diff_links(
+    current: Dict[Tuple[int, int], int],
+    owners: Dict[str, Tuple[int, Optional[str]]],
+    accesses: Dict[str, Tuple[int, Optional[str]]],
+    desired: Dict[str, List[str]],
+) -> LinkDiff:
+    # сравнение в пространстве id: существующие связи не перекодируются
+    diff = LinkDiff()
+    wanted = set()
+    for key, codes in desired.items():
+        owner = owners.get(key)
+        for code in dict.fromkeys(codes):
+            access = accesses.get(code)
+            if owner is None or access is None:
+                diff.add.append((key, code))
+                continue
+            pair = (owner[0], access[0])
+            wanted.add(pair)
+            if pair not in current:
+                diff.add.append((key, code))
+    diff.remove = [link_id for pair, link_id in current.items() if pair not in wanted]
+    return diff
+
+
+def diff(state: dict, doc: schemas.CatalogDocument) -> CatalogDiff:
+    """Сравнить текущее состояние (repo.load_catalog) с документом."""
+    return CatalogDiff(
+        accesses=_diff_entities(
+            state["accesses"], {a["code"]: a.get("description") for a in doc.accesses}
+        ),
+        groups=_diff_entities(
+            state["groups"], {g["code"]: g.get("description") for g in doc.groups}
+        ),
+        resources=_diff_entities(
+            state["resources"], {r["name"]: r.get("description") for r in doc.resources}
+        ),
+        group_accesses=_diff_links(
+            state["group_accesses"],
+            state["groups"],
+            state["accesses"],
+            {g["code"]: g.get("accesses", ()) for g in doc.groups},
+        ),
+        resource_accesses=_diff_links(
+            state["resource_accesses"],
+            state["resources"],
+            state["accesses"],
+            {r["name"]: r.get("accesses", ()) for r in doc.resources},
+        ),
+    )
+
+
+async def granted_entries(
+    session: AsyncSession, access_ids: List[int], group_ids: List[int]
+) -> Tuple[List[str], List[str]]:
+    """Коды доступов и групп из списков, выданные пользователям (во всех шардах)."""
+    if db.shards is None:
+        return await repo.granted_catalog_entries(session, access_ids, group_ids)
+    found = await db.shards.fan_out(
+        lambda s: repo.granted_catalog_entries(s, access_ids, group_ids)
+    )
+    accesses = {code for codes, _ in found.values() for code in codes}
+    groups = {code for _, codes in found.values() for code in codes}
+    return sorted(accesses), sorted(groups)
+
+
+async def _check_not_granted(session: AsyncSession, result: CatalogDiff) -> None:
+    """CatalogConflict, если удаляемое выдано; транзакция с блокировками откатывается."""
+    accesses, groups = await granted_entries(
+        session, result.accesses.delete, result.groups.delete
+    )
+    if accesses or groups:
+        await session.rollback()
+        raise CatalogConflict(accesses, groups)
+
+
+async def replicate(session: AsyncSession) -> List[str]:
+    """Разослать справочники основной БД на шарды; вернуть изменённые шарды."""
+    if db.shards is None:
+        return []
+    state = await repo.load_catalog(session)
+    changed = await db.shards.fan_out(lambda s: repo.replicate_catalog(s, state))
+    return [name for name, shard_changed in changed.items() if shard_changed]
+
+
+async def sync(
+    session: AsyncSession, doc: schemas.CatalogDocument, dry_run: bool = False
+) -> CatalogDiff:
+    """
+    Привести справочники к документу. Удаление доступов и групп, которые ещё
+    выданы пользователям, отклоняется (CatalogConflict): сначала отзыв прав.
+    """
+    state = await repo.load_catalog(session)
+    result = diff(state, doc)
+    if not result.changed:
+        return result
+    if dry_run:
+        await _check_not_granted(session, result)
+        return result
+    async with db.membership_exclusive():
+        await repo.lock_catalog_entries(session, result.accesses.delete, result.groups.delete)
+        await _check_not_granted(session, result)
+        await repo.apply_catalog(session, state, result)
+        await replicate(session)
+    return result
@@ -0,0 +1,160 @@
+"""
+Планировщик истечения временных выдач (expires_at у user_accesses/user_groups).
+
+В памяти держится min-heap ближайших истечений в пределах горизонта
+EXPIRY_HORIZON_SECONDS, загруженный по индексу expires_at. Задача спит до
+ближайшего дедлайна (или до новой, более ранней выдачи) и отзывает наступившие
+пачками до EXPIRY_BATCH_SIZE — периодического сканирования таблиц нет.
+Отзыв пишется в журнал membership_changes так же, как ручной. При
+шардировании истечения читаются со всех шардов параллельно, а пачка
+отзывов раскладывается по шардам пользователей.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Tuple
+
+from . import db
+from . import repositories as repo
+from .audit import audit_log
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_ENABLED = os.getenv("EXPIRY_ENABLED", "1") == "1"
+EXPIRY_BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", "500"))
+EXPIRY_HORIZON_SECONDS = float(os.getenv("EXPIRY_HORIZON_SECONDS", "3600"))
+# пауза перед повтором после ошибки БД
+EXPIRY_RETRY_SECONDS = float(os.getenv("EXPIRY_RETRY_SECONDS", "5"))
+
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ExpiryScheduler:
+    """Отзыв временных выдач в момент истечения по min-heap дедлайнов."""
+
+    def __init__(
+        self,
+        batch_size: int = EXPIRY_BATCH_SIZE,
+        horizon: float = EXPIRY_HORIZON_SECONDS,
+        clock: Callable[[], datetime] = _utcnow,
+    ):
+        self.batch_size = batch_size
+        self.horizon = timedelta(seconds=horizon)
+        self._clock = clock
+        self._heap: List[Tuple[datetime, str, str, int]] = []
+        # выдачи с expires_at <= loaded_until гарантированно есть в куче
+        self.loaded_until = _EPOCH
+        # schedule() во время load(): запрос мог их не увидеть, а куча
+        # будет заменена — они добавляются к загруженным
+        self._loading: Optional[List[Tuple[datetime, str, str, int]]] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.revoked = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, user_id: str, kind: str, target_id: int, expires_at: datetime) -> None:
+        """Учесть новую или продлённую выдачу (вызывается после commit)."""
+        expires_at = repo.as_utc(expires_at)
+        if self._loading is not None:
+            self._loading.append((expires_at, kind, user_id, target_id))
+            return
+        if expires_at > self.loaded_until:
+            # попадёт в кучу при загрузке следующего окна
+            return
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (expires_at, kind, user_id, target_id))
+        if earliest is None or expires_at < earliest:
+            self._wakeup.set()
+
+    async def load(self) -> None:
+        """
+        Загрузить истечения до now + horizon (включая пропущенные). Выдачи,
+        учтённые schedule() во время запроса, добавляются к результату:
+        их commit мог не попасть в снимок запроса, а дедлайн — лежать между
+        прежним и новым loaded_until. При ошибке буфер отбрасывается:
+        следующая загрузка прочитает эти выдачи из БД.
+        """
+        until = self._clock() + self.horizon
+        self._loading = []
+        try:
+            found = await db.membership_router().fan_out(
+                lambda session: repo.get_expiring(session, until)
+            )
+        finally:
+            scheduled, self._loading = self._loading, None
+        items = [item for shard_items in found.values() for item in shard_items]
+        items += [item for item in scheduled if item[0] <= until]
+        items = list(dict.fromkeys(items))
+        heapq.heapify(items)
+        self._heap = items
+        self.loaded_until = until
+
+    async def run_due(self) -> int:
+        """Отозвать все наступившие истечения пачками; вернуть число отзывов."""
+        revoked = 0
+        now = self._clock()
+        while self._heap and self._heap[0][0] <= now:
+            batch = []
+            while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                _, kind, user_id, target_id = heapq.heappop(self._heap)
+                batch.append((kind, user_id, target_id))
+            removed = []
+            router = db.membership_router()
+            async with db.membership_write():
+                for shard, items in router.group(batch, lambda item: item[1]).items():
+                    async with router.factories[shard]() as session:
+                        removed += await repo.revoke_expired(session, items, now)
+            for kind, user_id, target_id in removed:
+                db.recent_writes.mark(user_id)
+                audit_log.record("expire", user_id, kind, target_id, "expiry")
+            revoked += len(removed)
+        self.revoked += revoked
+        return revoked
+
+    def _next_wakeup(self) -> float:
+        deadline = self.loaded_until
+        if self._heap and self._heap[0][0] < deadline:
+            deadline = self._heap[0][0]
+        return max(0.0, (deadline - self._clock()).total_seconds())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self._clock() >= self.loaded_until:
+                    await self.load()
+                await self.run_due()
+            except Exception:
+                logger.warning("Grant expiry failed", exc_info=True)
+                self.loaded_until = _EPOCH
+                await asyncio.sleep(EXPIRY_RETRY_SECONDS)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._next_wakeup())
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None and EXPIRY_ENABLED:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+scheduler = ExpiryScheduler()
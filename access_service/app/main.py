@@ -1,12 +1,33 @@
 import os
-from fastapi import FastAPI, Depends, HTTPException
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import yaml
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
-from .db import async_session_factory
+from acs_common.serialization import MSGPACK_RESPONSE, render
+from acs_common.tracing import setup_tracing
+
+from .db import (
+    async_session_factory,
+    get_read_factory,
+    recent_writes,
+    shard_session,
+    user_session,
+)
+from . import db
 from . import schemas
-from . import models
 from . import repositories as repo
+from . import catalog
+from . import expiry
+from . import offboarding
+from .audit import audit_log
+from . import rpc
+from . import snapshot
+from .metrics import setup_metrics
 
 app = FastAPI(
     title="Access Service",
@@ -16,6 +37,33 @@ app = FastAPI(
         "Предоставляет внутренние API для чтения прав, требований ресурсов, применения и отзыва прав."
     ),
 )
+setup_metrics(app)
+setup_tracing(app, "access_service")
+
+
+@app.exception_handler(db.MembershipFrozen)
+async def membership_frozen(request: Request, exc: db.MembershipFrozen):
+    """Перенос между шардами: запись членства временно недоступна."""
+    return JSONResponse(
+        {"detail": str(exc)}, status_code=503, headers={"Retry-After": "5"}
+    )
+
+
+@app.on_event("startup")
+async def startup_event():
+    if rpc.RPC_LISTEN:
+        await rpc.server.start(rpc.RPC_LISTEN)
+    expiry.scheduler.start()
+    audit_log.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await expiry.scheduler.stop()
+    await rpc.server.close()
+    await offboarding.aclose()
+    # после остановки источников событий: в буфере ничего не останется
+    await audit_log.stop()
 
 
 async def get_session() -> AsyncSession:
@@ -24,41 +72,68 @@ async def get_session() -> AsyncSession:
         yield session
 
 
+async def get_read_session(request: Request) -> AsyncSession:
+    """
+    Зависимость FastAPI для эндпоинтов только на чтение: сессия реплики
+    (DATABASE_READ_URL), но основной БД, если по user_id из пути недавно
+    была запись в этом процессе или запрос передал consistent=true.
+    """
+    consistent = request.query_params.get("consistent", "").lower() in ("1", "true")
+    factory = get_read_factory(request.path_params.get("user_id"), consistent)
+    async with factory() as session:
+        yield session
+
+
+def check_shard(shard: Optional[str]) -> None:
+    """Проверить имя шарда членства (обязательно только при шардировании)."""
+    if db.shards is not None and shard not in db.shards.factories:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Unknown or missing shard", "shards": db.shards.names},
+        )
+
+
 @app.get(
     "/user/{user_id}/rights",
     response_model=schemas.UserRightsResponse,
+    responses=MSGPACK_RESPONSE,
     tags=["Права пользователя"],
     summary="Получить права пользователя",
     description=(
-        "Возвращает группы пользователя, прямые доступы и эффективные доступы (объединение без дубликатов)."
+        "Возвращает группы пользователя, прямые доступы и эффективные доступы (объединение без дубликатов). "
+        "По заголовку Accept: application/x-msgpack ответ кодируется в MessagePack. "
+        "По умолчанию читается реплика; consistent=true читает основную БД — "
+        "так права запрашивает Authorization для проверки конфликтов."
     ),
 )
-async def get_user_rights(user_id: str, session: AsyncSession = Depends(get_session)):
+async def get_user_rights(
+    user_id: str,
+    request: Request,
+    consistent: bool = Query(default=False),
+    session: AsyncSession = Depends(get_read_session),
+):
     """
     Получить права пользователя:
     - группы (`groups`)
     - прямые доступы (`direct_accesses`)
     - эффективные доступы (`effective_accesses`) — объединение без дубликатов
-    """
-    groups = await repo.get_user_groups(session, user_id)
-    direct_accesses = await repo.get_user_direct_accesses(session, user_id)
-    group_accesses = await repo.get_accesses_for_groups(session, [g.id for g in groups])
-
-    def to_access_out(a: models.Access) -> schemas.AccessOut:
-        return schemas.AccessOut(id=a.id, code=a.code)
 
-    def to_group_out(g: models.RightGroup) -> schemas.GroupOut:
-        return schemas.GroupOut(id=g.id, code=g.code)
-
-    eff_map = {a.id: a for a in direct_accesses}
-    for a in group_accesses:
-        eff_map.setdefault(a.id, a)
-
-    return schemas.UserRightsResponse(
-        user_id=user_id,
-        groups=[to_group_out(g) for g in groups],
-        direct_accesses=[to_access_out(a) for a in direct_accesses],
-        effective_accesses=[to_access_out(a) for a in eff_map.values()],
+    Ответ собирается из кортежей (id, code) и сериализуется напрямую,
+    минуя построение и повторную валидацию моделей.
+    """
+    groups, direct_accesses, effective_accesses = await repo.get_user_rights(
+        session, user_id
+    )
+    return render(
+        request,
+        {
+            "user_id": user_id,
+            "groups": [{"id": id_, "code": code} for id_, code in groups],
+            "direct_accesses": [{"id": id_, "code": code} for id_, code in direct_accesses],
+            "effective_accesses": [
+                {"id": id_, "code": code} for id_, code in effective_accesses
+            ],
+        },
     )
 
 
@@ -80,12 +155,57 @@ async def revoke(
     Тело: { kind: 'access' | 'group', target_id: int }
     Возвращает количество удалённых записей.
     """
-    deleted, _ = await repo.revoke_user_target(
-        session, user_id, body.kind, body.target_id
-    )
+    async with user_session(session, user_id) as shard:
+        deleted, _ = await repo.revoke_user_target(
+            shard, user_id, body.kind, body.target_id
+        )
+    recent_writes.mark(user_id)
+    if deleted:
+        audit_log.record("revoke", user_id, body.kind, body.target_id, "http")
     return {"removed": deleted}
 
 
+@app.post(
+    "/user/{user_id}/revoke-all",
+    response_model=schemas.RevokeAllResult,
+    tags=["Права пользователя"],
+    summary="Отозвать все права пользователя (офбординг)",
+    description=(
+        "Удаляет все прямые доступы и группы пользователя в одной транзакции "
+        "и возвращает удалённое; отменяет его pending-заявки в Request Service. "
+        "Идемпотентно: повторный вызов вернёт пустой removed."
+    ),
+)
+async def revoke_all(
+    user_id: str,
+    body: Optional[schemas.RevokeAllRequest] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    """Офбординг одного пользователя: все выдачи и pending-заявки одним вызовом."""
+    [result] = await offboarding.offboard(session, [user_id], body.reason if body else None)
+    return result
+
+
+@app.post(
+    "/users/revoke-all:batch",
+    response_model=schemas.RevokeAllBatchResponse,
+    tags=["Права пользователя"],
+    summary="Отозвать все права пачки пользователей (офбординг)",
+    description=(
+        "Как /user/{user_id}/revoke-all, но для списка пользователей: выдачи "
+        "всех пользователей удаляются одним DELETE на таблицу (при "
+        "шардировании — транзакция на шард), pending-заявки отменяются "
+        "одним вызовом Request Service. Результаты — в порядке user_ids."
+    ),
+)
+async def revoke_all_batch(
+    body: schemas.RevokeAllBatchRequest,
+    session: AsyncSession = Depends(get_session),
+):
+    """Офбординг пачки пользователей (например, подразделения)."""
+    return {"results": await offboarding.offboard(session, body.user_ids, body.reason)}
+
+
 @app.get(
     "/resource/{resource_id}/access",
     response_model=schemas.ResourceAccessResponse,
@@ -94,7 +214,7 @@ async def revoke(
     description="Возвращает список доступов, необходимых для доступа к ресурсу.",
 )
 async def resource_access(
-    resource_id: int, session: AsyncSession = Depends(get_session)
+    resource_id: int, session: AsyncSession = Depends(get_read_session)
 ):
     """Вернуть список доступов, требуемых указанным ресурсом."""
     accesses = await repo.get_required_accesses_for_resource(session, resource_id)
@@ -112,7 +232,9 @@ async def resource_access(
     summary="Применить доступ/группу к пользователю",
     description=(
         "Применяет доступ или группу к пользователю после одобрения заявки.\n"
-        "Валидация: проверяется существование целевой записи. Идемпотентно."
+        "Валидация: проверяется существование целевой записи. Идемпотентно. "
+        "Необязательный expires_at делает выдачу временной: после него право "
+        "не видно в правах пользователя и отзывается планировщиком."
     ),
 )
 async def access_apply(
@@ -122,17 +244,28 @@ async def access_apply(
     Применить к пользователю доступ или группу после успешной заявки.
     Валидация: проверяется существование целевого объекта.
     """
-    if body.kind == "access":
-        exists_stmt = select(models.Access.id).where(models.Access.id == body.target_id)
-    else:
-        exists_stmt = select(models.RightGroup.id).where(
-            models.RightGroup.id == body.target_id
-        )
-    res = await session.execute(exists_stmt)
-    if res.scalar_one_or_none() is None:
+    if not await repo.target_exists(session, body.kind, body.target_id):
         raise HTTPException(status_code=404, detail="Target not found")
 
-    await repo.apply_access(session, body.user_id, body.kind, body.target_id)
+    async with user_session(session, body.user_id) as shard:
+        changed = await repo.apply_access(
+            shard, body.user_id, body.kind, body.target_id, body.expires_at
+        )
+    recent_writes.mark(body.user_id)
+    if changed:
+        audit_log.record(
+            "grant",
+            body.user_id,
+            body.kind,
+            body.target_id,
+            "http",
+            request_id=body.request_id,
+            expires_at=body.expires_at,
+        )
+    if body.expires_at is not None:
+        expiry.scheduler.schedule(
+            body.user_id, body.kind, body.target_id, body.expires_at
+        )
     return {"applied": True}
 
 
@@ -148,3 +281,145 @@ async def get_group(group_id: int, session: AsyncSession = Depends(get_session))
     if not g:
         raise HTTPException(status_code=404, detail="Group not found")
     return {"id": g.id, "code": g.code}
+
+
+@app.get(
+    "/snapshot",
+    tags=["Репликация"],
+    summary="Бинарный снапшот членства",
+    description=(
+        "Возвращает компактный бинарный снапшот всех связей пользователь→группа "
+        "и пользователь→доступ (формат — access_service/app/snapshot.py). "
+        "Версия снапшота — в заголовках X-Snapshot-Version и ETag; "
+        "дальнейшие изменения читаются из /changes?since=<версия>. "
+        "При шардировании членства снапшот и журнал ведутся по шардам: "
+        "параметр shard обязателен."
+    ),
+)
+async def get_snapshot(
+    shard: Optional[str] = None, session: AsyncSession = Depends(get_read_session)
+):
+    """Сформировать снапшот членства для начальной загрузки потребителей."""
+    check_shard(shard)
+    async with shard_session(session, shard) as shard_s:
+        data = await snapshot.build(shard_s)
+    version = snapshot.HEADER.unpack_from(data)[1]
+    return Response(
+        content=data,
+        media_type="application/octet-stream",
+        headers={"X-Snapshot-Version": str(version), "ETag": f'"{version}"'},
+    )
+
+
+@app.get(
+    "/changes",
+    response_model=schemas.MembershipChangesResponse,
+    tags=["Репликация"],
+    summary="Журнал изменений членства",
+    description=(
+        "Возвращает изменения членства (add/remove) с версией больше since "
+        "по возрастанию, не больше limit (записи одной версии не делятся между "
+        "страницами). Поле version — since для следующего вызова. Версии "
+        "выдаются в порядке фиксации транзакций, поэтому продолжение с "
+        "version не пропускает изменений, закоммиченных позже. "
+        "При шардировании версии свои у каждого шарда (параметр shard)."
+    ),
+)
+async def get_changes(
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=1000, ge=1, le=10000),
+    shard: Optional[str] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Прочитать журнал изменений членства после версии since."""
+    check_shard(shard)
+    async with shard_session(session, shard) as shard_s:
+        changes = await repo.get_membership_changes(shard_s, since, limit)
+    return schemas.MembershipChangesResponse(
+        version=changes[-1].version if changes else since,
+        changes=[
+            schemas.MembershipChangeOut(
+                id=c.id,
+                version=c.version,
+                user_id=c.user_id,
+                kind=c.kind,
+                target_id=c.target_id,
+                op=c.op,
+            )
+            for c in changes
+        ],
+    )
+
+
+@app.get(
+    "/audit",
+    response_model=List[schemas.AuditEventOut],
+    tags=["Аудит"],
+    summary="Журнал аудита выдач и отзывов",
+    description=(
+        "Возвращает события аудита (grant, revoke, expire) за полуинтервал "
+        "[since, until) по возрастанию времени, необязательно по одному "
+        "пользователю. По умолчанию — последние 24 часа. События пишутся "
+        "пачками в фоне, поэтому последние AUDIT_FLUSH_INTERVAL секунд могут "
+        "ещё не попасть в выдачу."
+    ),
+)
+async def get_audit(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user_id: Optional[str] = None,
+    limit: int = Query(default=1000, ge=1, le=10000),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Прочитать журнал аудита за период."""
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(hours=24)
+    events = await repo.get_audit_events(session, since, until, user_id, limit)
+    return [schemas.AuditEventOut.model_validate(e, from_attributes=True) for e in events]
+
+
+@app.post(
+    "/catalog:sync",
+    response_model=schemas.CatalogSyncResponse,
+    tags=["Справочники"],
+    summary="Синхронизировать каталог доступов, групп и ресурсов",
+    description=(
+        "Принимает полный декларативный каталог (JSON или YAML по Content-Type): "
+        "accesses [{code, description}], groups [{code, description, accesses}], "
+        "resources [{name, description, accesses}]. Всё, чего нет в документе, "
+        "удаляется; меняются только отличия, в одной транзакции. Повтор "
+        "неизменного каталога ничего не пишет (changed=false). dry_run=true "
+        "только считает изменения. Удаление доступа или группы, выданных "
+        "пользователям, отклоняется с 409."
+    ),
+)
+async def catalog_sync(
+    request: Request,
+    dry_run: bool = False,
+    session: AsyncSession = Depends(get_session),
+):
+    """Привести справочники Access к присланному каталогу."""
+    raw = await request.body()
+    try:
+        if "yaml" in request.headers.get("content-type", ""):
+            doc = schemas.CatalogDocument.model_validate(yaml.safe_load(raw) or {})
+        else:
+            doc = schemas.CatalogDocument.model_validate_json(raw or b"{}")
+    except (ValueError, yaml.YAMLError) as exc:
+        if isinstance(exc, ValidationError):
+            raise RequestValidationError(
+                exc.errors(include_url=False, include_context=False)
+            )
+        raise HTTPException(status_code=400, detail="Malformed catalog document")
+    try:
+        result = await catalog.sync(session, doc, dry_run=dry_run)
+    except catalog.CatalogConflict as exc:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": str(exc),
+                "accesses": exc.accesses,
+                "groups": exc.groups,
+            },
+        )
+    return result.summary(dry_run)
@@ -0,0 +1,68 @@
+"""
+Метрики Access Service. Реестр, типы метрик и общие метрики (HTTP, SQL, пул,
+исходящие вызовы) — в acs_common.metrics; здесь регистрируются метрики
+этого сервиса, а общий API реэкспортируется для модулей app.
+"""
+
+from typing import Dict, Tuple
+
+from acs_common.metrics import (  # noqa: F401 — общий API метрик сервиса
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    httpx_event_hooks,
+    instrument_engine,
+    setup_metrics,
+)
+
+
+RPC_SERVER_LATENCY = REGISTRY.register(
+    Histogram(
+        "rpc_server_duration_seconds",
+        "Internal RPC handling time by method and result.",
+        ("method", "result"),
+    )
+)
+
+
+def _audit_lag() -> Dict[Tuple[str, ...], float]:
+    from .audit import audit_log
+
+    return {(): audit_log.lag()}
+
+
+def _audit_pending() -> Dict[Tuple[str, ...], float]:
+    from .audit import audit_log
+
+    return {(): len(audit_log)}
+
+
+def _audit_events() -> Dict[Tuple[str, ...], float]:
+    from .audit import audit_log
+
+    return {("flushed",): audit_log.flushed, ("failed_flushes",): audit_log.failures}
+
+
+AUDIT_FLUSH_LAG = REGISTRY.register(
+    Gauge(
+        "audit_flush_lag_seconds",
+        "Age of the oldest audit event not yet written to the database.",
+        callback=_audit_lag,
+    )
+)
+AUDIT_PENDING = REGISTRY.register(
+    Gauge(
+        "audit_pending_events",
+        "Audit events buffered in memory.",
+        callback=_audit_pending,
+    )
+)
+AUDIT_EVENTS = REGISTRY.register(
+    Counter(
+        "audit_events_total",
+        "Audit events written and failed flush attempts.",
+        ("result",),
+        callback=_audit_events,
+    )
+)
@@ -1,4 +1,17 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, UniqueConstraint
+from datetime import datetime, timezone
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Integer,
+    String,
+    Text,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+    text,
+)
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from typing import Optional
 from .db import Base
@@ -133,6 +146,8 @@ class UserAccess(Base):
     """
     Прямой доступ пользователя (не через группу).
     Уникальность (user_id, access_id) обеспечивает идемпотентность выдачи.
+    expires_at — момент истечения временной выдачи (None — бессрочно);
+    истёкшие строки не видны в правах и удаляются планировщиком (app.expiry).
     """
 
     __tablename__ = "user_accesses"
@@ -143,15 +158,26 @@ class UserAccess(Base):
         ForeignKey("accesses.id", ondelete="CASCADE"), nullable=False
     )
 
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
     access: Mapped[Access] = relationship("Access")
 
-    __table_args__ = (UniqueConstraint("user_id", "access_id", name="uq_user_access"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "access_id", name="uq_user_access"),
+        Index(
+            "ix_user_accesses_expires_at",
+            "expires_at",
+            postgresql_where=text("expires_at IS NOT NULL"),
+        ),
+    )
 
 
 class UserGroup(Base):
     """
     Принадлежность пользователя группе прав.
     Уникальность (user_id, group_id) предотвращает повторные назначения.
+    expires_at — момент истечения временной выдачи (None — бессрочно);
+    истёкшие строки не видны в правах и удаляются планировщиком (app.expiry).
     """
 
     __tablename__ = "user_groups"
@@ -162,6 +188,98 @@ class UserGroup(Base):
         ForeignKey("right_groups.id", ondelete="CASCADE"), nullable=False
     )
 
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
     group: Mapped[RightGroup] = relationship("RightGroup")
 
-    __table_args__ = (UniqueConstraint("user_id", "group_id", name="uq_user_group"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "group_id", name="uq_user_group"),
+        Index(
+            "ix_user_groups_expires_at",
+            "expires_at",
+            postgresql_where=text("expires_at IS NOT NULL"),
+        ),
+    )
+
+
+class MembershipChange(Base):
+    """
+    Журнал изменений членства пользователей (выдача/отзыв доступа или группы).
+    Пишется в той же транзакции, что и изменение. Версия (version) — номер
+    транзакции из счётчика MembershipVersion, общий для всех её записей.
+    Снапшот помечается текущим значением счётчика, потребители продолжают
+    чтение журнала с него (GET /changes?since=).
+    """
+
+    __tablename__ = "membership_changes"
+
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
+    user_id: Mapped[str] = mapped_column(String(100), nullable=False)
+    kind: Mapped[str] = mapped_column(String(10), nullable=False)
+    target_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    op: Mapped[str] = mapped_column(String(10), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+
+
+class MembershipVersion(Base):
+    """
+    Счётчик версий журнала членства — единственная строка (id=1).
+    Транзакция, меняющая членство, увеличивает его перед commit и держит
+    блокировку строки до конца транзакции, поэтому версии становятся видимы
+    строго по возрастанию. Id из последовательности такого не гарантируют:
+    транзакция с меньшим id может закоммититься позже, и читатель,
+    продолживший с большего id, её пропустил бы.
+    """
+
+    __tablename__ = "membership_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+
+class MembershipFreeze(Base):
+    """
+    Флаг заморозки записей членства — единственная строка (id=1).
+    Ставится app.rebalance на время переноса пользователей между шардами;
+    записи членства проверяют его (db.membership_write).
+    """
+
+    __tablename__ = "membership_freeze"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    frozen: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+
+
+class AuditEvent(Base):
+    """
+    Неизменяемый журнал аудита выдач и отзывов: кто (user_id), что (kind,
+    target_id), когда (occurred_at) и почему (action, request_id, source).
+    Пишется пачками фоновым AuditLog (app.audit), а не в транзакции операции.
+    Таблица только дополняется, строки приходят примерно по возрастанию
+    occurred_at — поэтому в Postgres на нём BRIN-индекс.
+    """
+
+    __tablename__ = "audit_log"
+
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    occurred_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    action: Mapped[str] = mapped_column(String(20), nullable=False)
+    user_id: Mapped[str] = mapped_column(String(100), nullable=False)
+    kind: Mapped[str] = mapped_column(String(10), nullable=False)
+    target_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    request_id: Mapped[Optional[int]] = mapped_column(Integer)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    source: Mapped[str] = mapped_column(String(20), nullable=False)
+
+    __table_args__ = (
+        Index("ix_audit_log_occurred_at", "occurred_at", postgresql_using="brin"),
+    )
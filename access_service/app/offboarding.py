@@ -0,0 +1,136 @@
+"""
+Офбординг пользователей: отмена заявок и отзыв всех выдач одним вызовом.
+
+Сначала pending-заявки пользователей отменяются одним вызовом
+POST /requests/cancel:batch Request Service, затем удаляются выдачи — по
+одному DELETE ... RETURNING на таблицу (user_accesses, user_groups) для всех
+пользователей пачки, в одной транзакции; при шардировании — одна транзакция
+на шард, шарды обрабатываются параллельно. Каждое удаление пишется в журнал
+изменений членства и в аудит (revoke).
+
+Порядок важен. Request меняет статус только у pending-заявок, а consumer
+Authorization пропускает не-pending заявки до применения. Если consumer
+успел проверить заявку до отмены, его approved после отмены не записывается,
+и выданный доступ consumer отзывает сам. Если approved записан до отмены,
+выдача уже есть в БД и удаляется здесь.
+
+Отзыв выдач не зависит от доступности Request Service: если он не ответил,
+выдачи всё равно отзываются, а в ответе cancelled_requests=None — повторный
+вызов идемпотентен и отменит заявки.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from acs_common import tracing
+
+from . import db, metrics
+from . import repositories as repo
+from .audit import audit_log
+
+logger = logging.getLogger(__name__)
+
+REQUEST_SERVICE_URL = os.getenv("REQUEST_SERVICE_URL", "http://localhost:8000")
+REQUEST_SERVICE_TIMEOUT = float(os.getenv("REQUEST_SERVICE_TIMEOUT", "5"))
+DEFAULT_REASON = "User offboarded"
+
+# Транспорт вызовов Request Service: None — сеть; в режиме монолита —
+# приложение Request Service в том же процессе.
+transport: Optional[httpx.AsyncBaseTransport] = None
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Общий HTTP-клиент Request Service на время жизни процесса."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            transport=tracing.TracingTransport(transport),
+            timeout=REQUEST_SERVICE_TIMEOUT,
+            event_hooks=metrics.httpx_event_hooks(),
+        )
+    return _client
+
+
+async def aclose() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def revoke_all(
+    session: AsyncSession, user_ids: Sequence[str]
+) -> List[Tuple[str, str, int]]:
+    """
+    Удалить все выдачи пользователей: session основной БД без шардирования,
+    иначе по транзакции на шард.
+    :return: удалённые (kind, user_id, target_id)
+    """
+    if db.shards is None:
+        return await repo.delete_memberships(session, list(user_ids))
+
+    async def run(name: str, ids: List[str]) -> List[Tuple[str, str, int]]:
+        async with db.shards.factories[name]() as shard:
+            return await repo.delete_memberships(shard, ids)
+
+    grouped = db.shards.group(user_ids, lambda user_id: user_id)
+    async with db.membership_write():
+        results = await asyncio.gather(*(run(name, ids) for name, ids in grouped.items()))
+    return [row for rows in results for row in rows]
+
+
+async def cancel_pending_requests(
+    user_ids: Sequence[str], reason: str
+) -> Optional[Dict[str, List[int]]]:
+    """
+    Отменить pending-заявки пользователей одним вызовом Request Service.
+    :return: {user_id: [id отменённых заявок]} или None, если вызов не удался
+    """
+    try:
+        response = await get_client().post(
+            f"{REQUEST_SERVICE_URL}/requests/cancel:batch",
+            json={"user_ids": list(user_ids), "reason": reason},
+        )
+        response.raise_for_status()
+    except httpx.HTTPError:
+        logger.warning(
+            "Failed to cancel pending requests of %d users", len(user_ids), exc_info=True
+        )
+        return None
+    cancelled: Dict[str, List[int]] = {}
+    for req in response.json()["cancelled"]:
+        cancelled.setdefault(req["user_id"], []).append(req["id"])
+    return cancelled
+
+
+async def offboard(
+    session: AsyncSession, user_ids: Sequence[str], reason: Optional[str] = None
+) -> List[dict]:
+    """
+    Отменить pending-заявки пользователей и отозвать все их выдачи.
+    :return: по пользователю (в порядке запроса, без повторов) —
+             {user_id, removed: [{kind, target_id}], cancelled_requests}
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    cancelled = await cancel_pending_requests(user_ids, reason or DEFAULT_REASON)
+    removed = await revoke_all(session, user_ids)
+    by_user: Dict[str, List[dict]] = {user_id: [] for user_id in user_ids}
+    for kind, user_id, target_id in removed:
+        by_user[user_id].append({"kind": kind, "target_id": target_id})
+        audit_log.record("revoke", user_id, kind, target_id, "offboarding")
+    for user_id in user_ids:
+        db.recent_writes.mark(user_id)
+    return [
+        {
+            "user_id": user_id,
+            "removed": by_user[user_id],
+            "cancelled_requests": None if cancelled is None else cancelled.get(user_id, []),
+        }
+        for user_id in user_ids
+    ]
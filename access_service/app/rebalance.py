@@ -0,0 +1,108 @@
+"""
+Перераспределение членства по шардам после изменения DATABASE_SHARD_URLS.
+
+Сначала справочники основной БД реплицируются на все шарды (новый шард
+получает каталог до первых выдач). Затем каждый шард просматривается
+целиком: пользователи, которых кольцо теперь относит к другому шарду,
+переносятся пачками — выдачи копируются в новый шард (повторный запуск
+безопасен: вставка идемпотентна), после чего удаляются из старого. Оба
+шага пишутся в журналы membership_changes соответствующих шардов.
+
+Запускается после того, как все экземпляры Access получили новый список
+шардов. На время переноса записи членства заморожены (флаг
+membership_freeze в основной БД, db.membership_write): выдачи, отзывы,
+офбординг и истечения отвечают 503 (consumer Authorization возвращает
+сообщение в очередь, планировщик истечений повторит попытку). Иначе
+отзыв, попавший в новый шард до копирования, ничего бы не удалил, а
+копирование вернуло бы отозванную выдачу. Заморозка ставится до первой
+записи и снимается по завершении, в том числе при ошибке; прерванный
+процесс оставит флаг — повторный запуск снимет его. Чтения переезжающих
+пользователей до окончания переноса могут не видеть их старые выдачи, но
+решение, принятое по такому чтению, не запишется. Консистентное
+хеширование ограничивает перенос долей ~1/N пользователей при добавлении
+шарда.
+
+Запуск (в контейнере Access): python -m app.rebalance --batch-size 1000 [--dry-run]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from typing import Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from . import db
+from . import repositories as repo
+from .sharding import ShardRouter
+
+
+async def rebalance(
+    router: ShardRouter,
+    primary: async_sessionmaker,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+) -> Dict[str, Dict[str, int]]:
+    """
+    Перенести пользователей в шарды, назначенные кольцом router.
+    :return: {шард-источник: {"users": перенесено, "rows": выдач}}
+    """
+    if dry_run:
+        return await _move(router, batch_size, dry_run)
+    async with primary() as session:
+        await repo.set_membership_frozen(session, True)
+    try:
+        async with primary() as session:
+            state = await repo.load_catalog(session)
+        await router.fan_out(lambda session: repo.replicate_catalog(session, state))
+        return await _move(router, batch_size, dry_run)
+    finally:
+        async with primary() as session:
+            await repo.set_membership_frozen(session, False)
+
+
+async def _move(
+    router: ShardRouter, batch_size: int, dry_run: bool
+) -> Dict[str, Dict[str, int]]:
+    report = {}
+    for source, factory in router.factories.items():
+        misplaced: Dict[str, List[str]] = {}
+        async with factory() as session:
+            async for user_id in repo.stream_member_users(session):
+                target = router.shard_for(user_id)
+                if target != source:
+                    misplaced.setdefault(target, []).append(user_id)
+
+        users = rows = 0
+        for target, user_ids in misplaced.items():
+            for i in range(0, len(user_ids), batch_size):
+                batch = user_ids[i : i + batch_size]
+                async with factory() as session:
+                    moved = await repo.export_memberships(session, batch)
+                if not dry_run:
+                    async with router.factories[target]() as session:
+                        await repo.import_memberships(session, moved)
+                    async with factory() as session:
+                        await repo.delete_memberships(session, batch)
+                users += len(batch)
+                rows += len(moved)
+        report[source] = {"users": users, "rows": rows}
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.rebalance")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+    if db.shards is None:
+        sys.exit("DATABASE_SHARD_URLS is not set: membership is not sharded")
+    report = asyncio.run(
+        rebalance(db.shards, db.async_session_factory, args.batch_size, args.dry_run)
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
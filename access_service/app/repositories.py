@@ -1,5 +1,6 @@
-from typing import List, Tuple, Optional
-from sqlalchemy import select, delete
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple, Optional
+from sqlalchemy import func, or_, select, delete, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.dialects.postgresql import insert
 from .models import (
@@ -8,13 +9,29 @@ from .models import (
     GroupAccess,
     UserAccess,
     UserGroup,
+    Resource,
     ResourceAccess,
+    MembershipChange,
+    MembershipFreeze,
+    MembershipVersion,
+    AuditEvent,
 )
 
 
+def as_utc(value: datetime) -> datetime:
+    """Привести момент времени к UTC (наивный считается уже UTC)."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _not_expired(model, now: datetime):
+    return or_(model.expires_at.is_(None), model.expires_at > now)
+
+
 async def get_user_groups(session: AsyncSession, user_id: str) -> List[RightGroup]:
     """
-    Вернуть список групп пользователя.
+    Вернуть список групп пользователя (без истёкших временных выдач).
     :param session: асинхронная сессия БД
     :param user_id: идентификатор пользователя (строка)
     :return: список объектов RightGroup
@@ -22,7 +39,10 @@ async def get_user_groups(session: AsyncSession, user_id: str) -> List[RightGrou
     stmt = (
         select(RightGroup)
         .join(UserGroup, UserGroup.group_id == RightGroup.id)
-        .where(UserGroup.user_id == user_id)
+        .where(
+            UserGroup.user_id == user_id,
+            _not_expired(UserGroup, datetime.now(timezone.utc)),
+        )
     )
     result = await session.execute(stmt)
     return list(result.scalars().all())
@@ -30,12 +50,16 @@ async def get_user_groups(session: AsyncSession, user_id: str) -> List[RightGrou
 
 async def get_user_direct_accesses(session: AsyncSession, user_id: str) -> List[Access]:
     """
-    Вернуть список прямых доступов пользователя (не через группы).
+    Вернуть список прямых доступов пользователя (не через группы),
+    без истёкших временных выдач.
     """
     stmt = (
         select(Access)
         .join(UserAccess, UserAccess.access_id == Access.id)
-        .where(UserAccess.user_id == user_id)
+        .where(
+            UserAccess.user_id == user_id,
+            _not_expired(UserAccess, datetime.now(timezone.utc)),
+        )
     )
     result = await session.execute(stmt)
     return list(result.scalars().all())
@@ -60,6 +84,45 @@ async def get_accesses_for_groups(
     return list(result.scalars().all())
 
 
+async def get_user_rights(
+    session: AsyncSession, user_id: str
+) -> Tuple[List[Tuple[int, str]], List[Tuple[int, str]], List[Tuple[int, str]]]:
+    """
+    Вернуть права пользователя кортежами (id, code): (группы, прямые доступы,
+    эффективные доступы). Эффективные — объединение прямых и групповых
+    доступов без дубликатов. Читаются только нужные столбцы (без ORM-объектов),
+    ответ сериализуется из кортежей напрямую.
+    """
+    now = datetime.now(timezone.utc)
+    groups = (
+        await session.execute(
+            select(RightGroup.id, RightGroup.code)
+            .join(UserGroup, UserGroup.group_id == RightGroup.id)
+            .where(UserGroup.user_id == user_id, _not_expired(UserGroup, now))
+        )
+    ).all()
+    direct = (
+        await session.execute(
+            select(Access.id, Access.code)
+            .join(UserAccess, UserAccess.access_id == Access.id)
+            .where(UserAccess.user_id == user_id, _not_expired(UserAccess, now))
+        )
+    ).all()
+    via_groups = (
+        await session.execute(
+            select(Access.id, Access.code)
+            .join(GroupAccess, GroupAccess.access_id == Access.id)
+            .join(UserGroup, UserGroup.group_id == GroupAccess.group_id)
+            .where(UserGroup.user_id == user_id, _not_expired(UserGroup, now))
+        )
+    ).all()
+
+    effective = dict(direct)
+    for access_id, code in via_groups:
+        effective.setdefault(access_id, code)
+    return [tuple(g) for g in groups], [tuple(a) for a in direct], list(effective.items())
+
+
 async def revoke_user_target(
     session: AsyncSession, user_id: str, kind: str, target_id: int
 ) -> Tuple[int, int]:
@@ -78,8 +141,11 @@ async def revoke_user_target(
             UserGroup.user_id == user_id, UserGroup.group_id == target_id
         )
     result = await session.execute(stmt)
+    deleted = result.rowcount or 0
+    if deleted:
+        await log_membership_changes(session, [(kind, user_id, target_id, "remove")])
     await session.commit()
-    return result.rowcount or 0, target_id
+    return deleted, target_id
 
 
 async def get_required_accesses_for_resource(
@@ -98,30 +164,107 @@ async def get_required_accesses_for_resource(
 
 
 async def apply_access(
-    session: AsyncSession, user_id: str, kind: str, target_id: int
-) -> None:
+    session: AsyncSession,
+    user_id: str,
+    kind: str,
+    target_id: int,
+    expires_at: Optional[datetime] = None,
+) -> bool:
     """
     Применить к пользователю доступ или группу (идемпотентно).
-    При повторном применении дубликаты игнорируются на уровне БД (ON CONFLICT DO NOTHING).
+    expires_at — момент истечения временной выдачи (None — бессрочно).
+    Повторное применение только продлевает выдачу: бессрочная остаётся
+    бессрочной, из двух сроков берётся поздний.
+    Фактическая выдача или продление записывается в журнал изменений членства.
+    :return: True, если выдача создана или продлена
     """
-    if kind == "access":
-        stmt = (
-            insert(UserAccess)
-            .values(user_id=user_id, access_id=target_id)
-            .on_conflict_do_nothing(
-                index_elements=[UserAccess.user_id, UserAccess.access_id]
-            )
+    model, target = (
+        (UserAccess, UserAccess.access_id)
+        if kind == "access"
+        else (UserGroup, UserGroup.group_id)
+    )
+    if expires_at is not None:
+        expires_at = as_utc(expires_at)
+    stmt = insert(model).values(
+        {model.user_id: user_id, target: target_id, model.expires_at: expires_at}
+    )
+    current, proposed = model.expires_at, stmt.excluded.expires_at
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[model.user_id, target],
+        set_={"expires_at": proposed},
+        # продлеваем только временную выдачу и только на более поздний срок
+        where=current.is_not(None) & (proposed.is_(None) | (proposed > current)),
+    )
+    result = await session.execute(stmt)
+    changed = bool(result.rowcount)
+    if changed:
+        await log_membership_changes(session, [(kind, user_id, target_id, "add")])
+    await session.commit()
+    return changed
+
+
+async def get_expiring(
+    session: AsyncSession, until: datetime
+) -> List[Tuple[datetime, str, str, int]]:
+    """
+    Вернуть временные выдачи, истекающие не позже until (включая уже истёкшие),
+    как (expires_at, kind, user_id, target_id). Читает индекс по expires_at.
+    """
+    items = []
+    for kind, model, target in (
+        ("access", UserAccess, UserAccess.access_id),
+        ("group", UserGroup, UserGroup.group_id),
+    ):
+        stmt = select(model.expires_at, model.user_id, target).where(
+            model.expires_at.is_not(None), model.expires_at <= until
         )
-    else:
+        for expires_at, user_id, target_id in (await session.execute(stmt)).all():
+            items.append((as_utc(expires_at), kind, user_id, target_id))
+    return items
+
+
+async def revoke_expired(
+    session: AsyncSession, items: List[Tuple[str, str, int]], now: datetime
+) -> List[Tuple[str, str, int]]:
+    """
+    Отозвать пачку истёкших выдач (kind, user_id, target_id) одним DELETE
+    на вид. Строки, продлённые после постановки в очередь (expires_at > now),
+    не трогаются. Каждое удаление пишется в журнал как обычный отзыв.
+    :return: фактически удалённые (kind, user_id, target_id)
+    """
+    removed = []
+    for kind, model, target in (
+        ("access", UserAccess, UserAccess.access_id),
+        ("group", UserGroup, UserGroup.group_id),
+    ):
+        keys = [(user_id, target_id) for k, user_id, target_id in items if k == kind]
+        if not keys:
+            continue
         stmt = (
-            insert(UserGroup)
-            .values(user_id=user_id, group_id=target_id)
-            .on_conflict_do_nothing(
-                index_elements=[UserGroup.user_id, UserGroup.group_id]
+            delete(model)
+            .where(
+                tuple_(model.user_id, target).in_(keys),
+                model.expires_at.is_not(None),
+                model.expires_at <= now,
             )
+            .returning(model.user_id, target)
         )
-    await session.execute(stmt)
+        for user_id, target_id in (await session.execute(stmt)).all():
+            removed.append((kind, user_id, target_id))
+    await log_membership_changes(
+        session, [(kind, user_id, target_id, "remove") for kind, user_id, target_id in removed]
+    )
     await session.commit()
+    return removed
+
+
+async def target_exists(session: AsyncSession, kind: str, target_id: int) -> bool:
+    """
+    Проверить существование доступа (kind='access') или группы (kind='group').
+    """
+    model = Access if kind == "access" else RightGroup
+    result = await session.execute(select(model.id).where(model.id == target_id))
+    return result.scalar_one_or_none() is not None
 
 
 async def get_group_by_id(session: AsyncSession, group_id: int) -> Optional[RightGroup]:
@@ -130,3 +273,411 @@ async def get_group_by_id(session: AsyncSession, group_id: int) -> Optional[Righ
     """
     result = await session.execute(select(RightGroup).where(RightGroup.id == group_id))
     return result.scalar_one_or_none()
+
+
+async def log_membership_changes(
+    session: AsyncSession, changes: List[Tuple[str, str, int, str]]
+) -> None:
+    """
+    Записать изменения (kind, user_id, target_id, op) в журнал под новой
+    версией. Счётчик увеличивается UPSERT'ом строки MembershipVersion:
+    блокировка строки держится до commit, так что транзакции получают
+    версии в порядке фиксации. Вызывать непосредственно перед commit —
+    конкурирующие изменения членства ждут эту блокировку.
+    """
+    if not changes:
+        return
+    stmt = insert(MembershipVersion).values(id=1, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MembershipVersion.id],
+        set_={"version": MembershipVersion.version + 1},
+    ).returning(MembershipVersion.version)
+    version = (await session.execute(stmt)).scalar_one()
+    session.add_all(
+        MembershipChange(
+            version=version, user_id=user_id, kind=kind, target_id=target_id, op=op
+        )
+        for kind, user_id, target_id, op in changes
+    )
+
+
+async def set_membership_frozen(session: AsyncSession, frozen: bool) -> None:
+    """
+    Заморозить или разморозить записи членства (db.membership_write).
+    UPDATE строки ждёт блокировки FOR SHARE начатых записей, поэтому после
+    commit заморозки ни одна запись членства уже не выполняется.
+    """
+    stmt = insert(MembershipFreeze).values(id=1, frozen=frozen)
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[MembershipFreeze.id], set_={"frozen": frozen}
+        )
+    )
+    await session.commit()
+
+
+async def get_membership_version(session: AsyncSession) -> int:
+    """Вернуть текущую версию членства: значение счётчика (0 — изменений не было)."""
+    result = await session.execute(
+        select(MembershipVersion.version).where(MembershipVersion.id == 1)
+    )
+    return int(result.scalar_one_or_none() or 0)
+
+
+async def get_membership_changes(
+    session: AsyncSession, since: int, limit: int
+) -> List[MembershipChange]:
+    """
+    Вернуть записи журнала с версией > since по возрастанию (version, id).
+    Версия не делится между страницами: если limit приходится на середину
+    транзакции, её записи возвращаются целиком (ответ может быть длиннее limit).
+    """
+    newer = MembershipChange.version > since
+    last = await session.execute(
+        select(MembershipChange.version)
+        .where(newer)
+        .order_by(MembershipChange.version)
+        .offset(limit - 1)
+        .limit(1)
+    )
+    cutoff = last.scalar_one_or_none()
+    stmt = select(MembershipChange).where(newer)
+    if cutoff is not None:
+        stmt = stmt.where(MembershipChange.version <= cutoff)
+    result = await session.execute(
+        stmt.order_by(MembershipChange.version, MembershipChange.id)
+    )
+    return list(result.scalars().all())
+
+
+async def stream_memberships(session: AsyncSession, kind: str):
+    """
+    Потоково вернуть все пары (user_id, target_id) вида kind ('group'|'access'),
+    упорядоченные по пользователю (побайтово, как str в Python) и цели,
+    без загрузки ORM-объектов.
+    """
+    model, target = (
+        (UserGroup, UserGroup.group_id)
+        if kind == "group"
+        else (UserAccess, UserAccess.access_id)
+    )
+    user_key = model.user_id
+    if session.get_bind().dialect.name == "postgresql":
+        user_key = user_key.collate("C")
+    stmt = select(model.user_id, target).order_by(user_key, target)
+    result = await session.stream(stmt.execution_options(yield_per=10_000))
+    try:
+        async for partition in result.partitions():
+            for row in partition:
+                yield row
+    finally:
+        await result.close()
+
+
+async def insert_audit_events(session: AsyncSession, rows: List[dict]) -> None:
+    """
+    Записать пачку событий аудита одной операцией: COPY в Postgres
+    (asyncpg copy_records_to_table), многострочный INSERT в остальных СУБД.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        columns = list(rows[0])
+        conn = await session.connection()
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            AuditEvent.__tablename__,
+            records=[tuple(row[c] for c in columns) for row in rows],
+            columns=columns,
+        )
+    else:
+        await session.execute(insert(AuditEvent), rows)
+    await session.commit()
+
+
+async def get_audit_events(
+    session: AsyncSession,
+    since: datetime,
+    until: datetime,
+    user_id: Optional[str] = None,
+    limit: int = 1000,
+) -> List[AuditEvent]:
+    """
+    Вернуть события аудита за полуинтервал [since, until) по возрастанию времени,
+    при необходимости только по пользователю. Диапазон по occurred_at читает
+    BRIN-индекс.
+    """
+    stmt = select(AuditEvent).where(
+        AuditEvent.occurred_at >= since, AuditEvent.occurred_at < until
+    )
+    if user_id is not None:
+        stmt = stmt.where(AuditEvent.user_id == user_id)
+    stmt = stmt.order_by(AuditEvent.occurred_at, AuditEvent.id).limit(limit)
+    result = await session.execute(stmt)
+    return list(result.scalars().all())
+
+
+CATALOG_CHUNK = 10_000
+
+
+def _chunks(items: List, size: int = CATALOG_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+async def load_catalog(session: AsyncSession) -> dict:
+    """
+    Прочитать справочники кортежами: {код/имя: (id, описание)} для accesses,
+    groups, resources и {(id владельца, id доступа): id связи} для связей.
+    Запросы идут через соединение (Core), минуя ORM-обработку строк сессии.
+    """
+    conn = await session.connection()
+
+    async def entities(model, key) -> Dict[str, Tuple[int, Optional[str]]]:
+        rows = await conn.execute(select(key, model.id, model.description))
+        return {k: (id_, description) for k, id_, description in rows}
+
+    async def links(model, owner) -> Dict[Tuple[int, int], int]:
+        rows = await conn.execute(select(owner, model.access_id, model.id))
+        return {(owner_id, access_id): id_ for owner_id, access_id, id_ in rows}
+
+    return {
+        "accesses": await entities(Access, Access.code),
+        "groups": await entities(RightGroup, RightGroup.code),
+        "resources": await entities(Resource, Resource.name),
+        "group_accesses": await links(GroupAccess, GroupAccess.group_id),
+        "resource_accesses": await links(ResourceAccess, ResourceAccess.resource_id),
+    }
+
+
+async def granted_catalog_entries(
+    session: AsyncSession, access_ids: List[int], group_ids: List[int]
+) -> Tuple[List[str], List[str]]:
+    """Вернуть коды доступов и групп из списков, которые выданы пользователям."""
+    found = []
+    for model, link, target in (
+        (Access, UserAccess, UserAccess.access_id),
+        (RightGroup, UserGroup, UserGroup.group_id),
+    ):
+        codes = set()
+        for chunk in _chunks(access_ids if model is Access else group_ids):
+            stmt = (
+                select(model.code)
+                .join(link, target == model.id)
+                .where(model.id.in_(chunk))
+                .distinct()
+            )
+            codes.update((await session.execute(stmt)).scalars())
+        found.append(sorted(codes))
+    return found[0], found[1]
+
+
+async def lock_catalog_entries(
+    session: AsyncSession, access_ids: List[int], group_ids: List[int]
+) -> None:
+    """
+    Заблокировать удаляемые доступы и группы (SELECT ... FOR UPDATE) до конца
+    транзакции. Вставка выдачи берёт FOR KEY SHARE на строку справочника по
+    внешнему ключу и ждёт этой блокировки, так что после проверки выданности
+    ON DELETE CASCADE не удалит выдачу, записанную в промежутке.
+    """
+    for model, ids in ((Access, access_ids), (RightGroup, group_ids)):
+        for chunk in _chunks(sorted(ids)):
+            stmt = select(model.id).where(model.id.in_(chunk)).order_by(model.id)
+            await session.execute(stmt.with_for_update())
+
+
+async def apply_catalog(session: AsyncSession, state: dict, diff) -> None:
+    """
+    Применить разницу каталога (app.catalog.CatalogDiff) в одной транзакции:
+    удаление связей и записей по id, вставка новых записей с RETURNING id,
+    обновление описаний по первичному ключу, вставка новых связей.
+    """
+    for model, link in (
+        (GroupAccess, diff.group_accesses),
+        (ResourceAccess, diff.resource_accesses),
+    ):
+        for chunk in _chunks(link.remove):
+            await session.execute(delete(model).where(model.id.in_(chunk)))
+
+    ids = {}
+    for name, model, key in (
+        ("resources", Resource, "name"),
+        ("groups", RightGroup, "code"),
+        ("accesses", Access, "code"),
+    ):
+        entity = getattr(diff, name)
+        for chunk in _chunks(entity.delete):
+            await session.execute(delete(model).where(model.id.in_(chunk)))
+        ids[name] = {k: id_ for k, (id_, _) in state[name].items()}
+        if entity.create:
+            column = getattr(model, key)
+            rows = await session.execute(
+                insert(model).returning(column, model.id),
+                [{key: k, "description": d} for k, d in entity.create],
+            )
+            ids[name].update(dict(rows.all()))
+        if entity.update:
+            await session.execute(
+                update(model), [{"id": id_, "description": d} for id_, d in entity.update]
+            )
+
+    for model, owner, link, owners in (
+        (GroupAccess, "group_id", diff.group_accesses, ids["groups"]),
+        (ResourceAccess, "resource_id", diff.resource_accesses, ids["resources"]),
+    ):
+        if link.add:
+            await session.execute(
+                insert(model),
+                [
+                    {owner: owners[key], "access_id": ids["accesses"][code]}
+                    for key, code in link.add
+                ],
+            )
+    await session.commit()
+
+
+async def replicate_catalog(session: AsyncSession, source: dict) -> bool:
+    """
+    Привести справочники шарда к состоянию основной БД (repo.load_catalog),
+    сохраняя id: удаляются записи и связи, которых нет в источнике (или
+    чей код сменил id), недостающие вставляются с id источника, описания
+    обновляются. Неизменный шард только читается.
+    :return: True, если шард изменён
+    """
+    current = await load_catalog(session)
+    changed = False
+    links = (
+        ("group_accesses", GroupAccess, "group_id"),
+        ("resource_accesses", ResourceAccess, "resource_id"),
+    )
+    entities = (
+        ("resources", Resource, "name"),
+        ("groups", RightGroup, "code"),
+        ("accesses", Access, "code"),
+    )
+    for name, model, _ in links:
+        wanted = {link_id: pair for pair, link_id in source[name].items()}
+        stale = [i for pair, i in current[name].items() if wanted.get(i) != pair]
+        for chunk in _chunks(stale):
+            await session.execute(delete(model).where(model.id.in_(chunk)))
+        changed = changed or bool(stale)
+    for name, model, _ in entities:
+        wanted = {id_: key for key, (id_, _) in source[name].items()}
+        stale = [id_ for key, (id_, _) in current[name].items() if wanted.get(id_) != key]
+        for chunk in _chunks(stale):
+            await session.execute(delete(model).where(model.id.in_(chunk)))
+        changed = changed or bool(stale)
+    for name, model, key in reversed(entities):
+        rows = [
+            {"id": id_, key: key_, "description": description}
+            for key_, (id_, description) in source[name].items()
+            if current[name].get(key_) != (id_, description)
+        ]
+        for chunk in _chunks(rows):
+            stmt = insert(model)
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[model.id],
+                    set_={"description": stmt.excluded.description},
+                ),
+                chunk,
+            )
+        changed = changed or bool(rows)
+    for name, model, owner in links:
+        have = set(current[name].items())
+        rows = [
+            {"id": link_id, owner: owner_id, "access_id": access_id}
+            for (owner_id, access_id), link_id in source[name].items()
+            if ((owner_id, access_id), link_id) not in have
+        ]
+        for chunk in _chunks(rows):
+            await session.execute(insert(model), chunk)
+        changed = changed or bool(rows)
+    await session.commit()
+    return changed
+
+
+async def stream_member_users(session: AsyncSession):
+    """Потоково вернуть user_id всех пользователей с выдачами (без повторов)."""
+    stmt = select(UserAccess.user_id).union(select(UserGroup.user_id))
+    result = await session.stream(stmt.execution_options(yield_per=10_000))
+    try:
+        async for user_id in result.scalars():
+            yield user_id
+    finally:
+        await result.close()
+
+
+async def export_memberships(
+    session: AsyncSession, user_ids: List[str]
+) -> List[Tuple[str, str, int, Optional[datetime]]]:
+    """Вернуть все выдачи пользователей как (kind, user_id, target_id, expires_at)."""
+    rows = []
+    for kind, model, target in (
+        ("access", UserAccess, UserAccess.access_id),
+        ("group", UserGroup, UserGroup.group_id),
+    ):
+        stmt = select(model.user_id, target, model.expires_at).where(
+            model.user_id.in_(user_ids)
+        )
+        for user_id, target_id, expires_at in (await session.execute(stmt)).all():
+            rows.append((kind, user_id, target_id, expires_at))
+    return rows
+
+
+async def import_memberships(
+    session: AsyncSession, rows: List[Tuple[str, str, int, Optional[datetime]]]
+) -> None:
+    """
+    Вставить выдачи (kind, user_id, target_id, expires_at) пачкой; уже
+    существующие продлеваются по тем же правилам, что и в apply_access.
+    """
+    for kind, model, target in (
+        ("access", UserAccess, "access_id"),
+        ("group", UserGroup, "group_id"),
+    ):
+        values = [
+            {"user_id": user_id, target: target_id, "expires_at": expires_at}
+            for k, user_id, target_id, expires_at in rows
+            if k == kind
+        ]
+        if not values:
+            continue
+        stmt = insert(model)
+        current, proposed = model.expires_at, stmt.excluded.expires_at
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[model.user_id, getattr(model, target)],
+                set_={"expires_at": proposed},
+                where=current.is_not(None) & (proposed.is_(None) | (proposed > current)),
+            ),
+            values,
+        )
+    await log_membership_changes(
+        session, [(kind, user_id, target_id, "add") for kind, user_id, target_id, _ in rows]
+    )
+    await session.commit()
+
+
+async def delete_memberships(
+    session: AsyncSession, user_ids: List[str]
+) -> List[Tuple[str, str, int]]:
+    """
+    Удалить все выдачи пользователей (по DELETE ... RETURNING на таблицу)
+    в одной транзакции, записав отзывы в журнал изменений членства.
+    :return: удалённые (kind, user_id, target_id)
+    """
+    removed = []
+    for kind, model, target in (
+        ("access", UserAccess, UserAccess.access_id),
+        ("group", UserGroup, UserGroup.group_id),
+    ):
+        stmt = delete(model).where(model.user_id.in_(user_ids)).returning(
+            model.user_id, target
+        )
+        for user_id, target_id in (await session.execute(stmt)).all():
+            removed.append((kind, user_id, target_id))
+    await log_membership_changes(
+        session, [(kind, user_id, target_id, "remove") for kind, user_id, target_id in removed]
+    )
+    await session.commit()
+    return removed
@@ -0,0 +1,190 @@
+"""
+Внутренний бинарный RPC Access для Authorization Service.
+
+Кадр: 4 байта длины (big-endian) + тело msgpack.
+Запрос: [msgid, method, params, meta]; ответ: [msgid, error, result],
+где error — None или [code, message]. Запросы одного соединения
+обрабатываются параллельно, ответы приходят по мере готовности (msgid).
+Методы повторяют HTTP-ручки: user_rights, group, apply.
+"""
+
+import asyncio
+import logging
+import os
+import struct
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import msgpack
+
+from acs_common import tracing
+
+from . import db
+from . import expiry
+from . import repositories as repo
+from .audit import audit_log
+from .metrics import RPC_SERVER_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Адрес RPC: tcp://host:port или unix:///path/to.sock; пусто — RPC выключен.
+RPC_LISTEN = os.getenv("ACCESS_RPC_LISTEN", "")
+MAX_FRAME = 16 * 1024 * 1024
+
+_HEADER = struct.Struct(">I")
+
+
+class RpcError(Exception):
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def pack_frame(payload: Any) -> bytes:
+    body = msgpack.packb(payload, use_bin_type=True)
+    return _HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Any:
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if size > MAX_FRAME:
+        raise ValueError(f"RPC frame too large: {size}")
+    return msgpack.unpackb(await reader.readexactly(size), raw=False)
+
+
+def _item(obj) -> Dict[str, Any]:
+    return {"id": obj.id, "code": obj.code}
+
+
+async def user_rights(params: Dict[str, Any]) -> Dict[str, Any]:
+    user_id = params["user_id"]
+    async with db.get_read_factory(user_id, params.get("consistent", False))() as session:
+        groups, direct, effective = await repo.get_user_rights(session, user_id)
+    return {
+        "user_id": user_id,
+        "groups": [{"id": id_, "code": code} for id_, code in groups],
+        "direct_accesses": [{"id": id_, "code": code} for id_, code in direct],
+        "effective_accesses": [{"id": id_, "code": code} for id_, code in effective],
+    }
+
+
+async def group(params: Dict[str, Any]) -> Dict[str, Any]:
+    async with db.async_session_factory() as session:
+        g = await repo.get_group_by_id(session, params["group_id"])
+    if g is None:
+        raise RpcError("not_found", "Group not found")
+    return _item(g)
+
+
+async def apply(params: Dict[str, Any]) -> Dict[str, Any]:
+    user_id, kind, target_id = params["user_id"], params["kind"], params["target_id"]
+    # expires_at передаётся строкой ISO 8601 (msgpack не кодирует datetime)
+    expires_at = params.get("expires_at")
+    if expires_at is not None:
+        expires_at = datetime.fromisoformat(expires_at)
+    async with db.async_session_factory() as session:
+        if not await repo.target_exists(session, kind, target_id):
+            raise RpcError("not_found", "Target not found")
+        async with db.user_session(session, user_id) as shard:
+            changed = await repo.apply_access(shard, user_id, kind, target_id, expires_at)
+    db.recent_writes.mark(user_id)
+    if changed:
+        audit_log.record(
+            "grant",
+            user_id,
+            kind,
+            target_id,
+            "rpc",
+            request_id=params.get("request_id"),
+            expires_at=expires_at,
+        )
+    if expires_at is not None:
+        expiry.scheduler.schedule(user_id, kind, target_id, expires_at)
+    return {"applied": True}
+
+
+METHODS: Dict[str, Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = {
+    "user_rights": user_rights,
+    "group": group,
+    "apply": apply,
+}
+
+
+class RpcServer:
+    def __init__(self):
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    async def start(self, address: str) -> None:
+        if address.startswith("unix://"):
+            path = address[len("unix://"):]
+            if os.path.exists(path):
+                os.unlink(path)
+            self._server = await asyncio.start_unix_server(self._serve, path=path)
+        elif address.startswith("tcp://"):
+            host, _, port = address[len("tcp://"):].rpartition(":")
+            self._server = await asyncio.start_server(self._serve, host, int(port))
+        else:
+            raise ValueError(f"Unsupported RPC address: {address}")
+
+    @property
+    def sockets(self):
+        return self._server.sockets if self._server is not None else ()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for writer in list(self._writers):
+            writer.close()
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    msgid, method, params, meta = await read_frame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                task = asyncio.create_task(
+                    self._dispatch(writer, msgid, method, params, meta)
+                )
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, writer, msgid, method, params, meta) -> None:
+        started = time.perf_counter()
+        error, result = None, None
+        handler = METHODS.get(method)
+        with tracing.tracer.span(
+            f"rpc {method}", traceparent=(meta or {}).get(tracing.TRACEPARENT)
+        ) as span:
+            try:
+                if handler is None:
+                    raise RpcError("unknown_method", f"Unknown method {method!r}")
+                result = await handler(params)
+            except RpcError as exc:
+                error = [exc.code, str(exc)]
+            except db.MembershipFrozen as exc:
+                error = ["unavailable", str(exc)]
+            except Exception as exc:
+                logger.exception("RPC %s failed", method)
+                error = ["internal", type(exc).__name__]
+                span.status = "error"
+        RPC_SERVER_LATENCY.observe(
+            time.perf_counter() - started, str(method), error[0] if error else "ok"
+        )
+        if not writer.is_closing():
+            writer.write(pack_frame([msgid, error, result]))
+            await writer.drain()
+
+
+server = RpcServer()
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import List, Literal
+from datetime import datetime
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional
+from typing_extensions import NotRequired, TypedDict
 
 
 class AccessOut(BaseModel):
@@ -38,16 +40,51 @@ class RevokeRequest(BaseModel):
     target_id: int
 
 
+class RevokeAllRequest(BaseModel):
+    """Офбординг пользователя: reason — причина отмены его pending-заявок."""
+
+    reason: Optional[str] = None
+
+
+class RevokeAllBatchRequest(RevokeAllRequest):
+    """Офбординг пачки пользователей (например, подразделения) одним вызовом."""
+
+    user_ids: List[str] = Field(min_length=1, max_length=1000)
+
+
+class RevokedGrant(BaseModel):
+    kind: Literal["access", "group"]
+    target_id: int
+
+
+class RevokeAllResult(BaseModel):
+    """
+    Итог офбординга пользователя: removed — удалённые выдачи,
+    cancelled_requests — id отменённых pending-заявок (None — Request Service
+    не ответил; выдачи при этом уже отозваны, повторный вызов безопасен).
+    """
+
+    user_id: str
+    removed: List[RevokedGrant]
+    cancelled_requests: Optional[List[int]] = None
+
+
+class RevokeAllBatchResponse(BaseModel):
+    results: List[RevokeAllResult]
+
+
 class ApplyAccessRequest(BaseModel):
     """
     Запрос на применение доступа/группы после одобрения заявки.
     request_id включён для трассируемости, сервис Access его не использует.
+    expires_at — момент истечения временной выдачи (None — бессрочно).
     """
 
     request_id: int
     user_id: str
     kind: Literal["access", "group"]
     target_id: int
+    expires_at: Optional[datetime] = None
 
 
 class ResourceAccessResponse(BaseModel):
@@ -55,3 +92,115 @@ class ResourceAccessResponse(BaseModel):
 
     resource_id: int
     required_accesses: List[AccessOut]
+
+
+class MembershipChangeOut(BaseModel):
+    """Запись журнала изменений членства: op='add'|'remove'."""
+
+    id: int
+    version: int
+    user_id: str
+    kind: Literal["access", "group"]
+    target_id: int
+    op: Literal["add", "remove"]
+
+
+class MembershipChangesResponse(BaseModel):
+    """
+    Изменения членства после версии since.
+    version — версия, с которой продолжать чтение (since для следующего вызова).
+    """
+
+    version: int
+    changes: List[MembershipChangeOut]
+
+
+class AuditEventOut(BaseModel):
+    """
+    Событие аудита: action='grant'|'revoke'|'expire', source — откуда пришла
+    операция (http, rpc, expiry).
+    """
+
+    id: int
+    occurred_at: datetime
+    action: str
+    user_id: str
+    kind: str
+    target_id: int
+    request_id: Optional[int] = None
+    expires_at: Optional[datetime] = None
+    source: str
+
+
+class CatalogAccess(TypedDict):
+    """Доступ в декларативном каталоге."""
+
+    code: str
+    description: NotRequired[Optional[str]]
+
+
+class CatalogGroup(TypedDict):
+    """Группа в каталоге: accesses — коды входящих в неё доступов."""
+
+    code: str
+    description: NotRequired[Optional[str]]
+    accesses: NotRequired[List[str]]
+
+
+class CatalogResource(TypedDict):
+    """Ресурс в каталоге: accesses — коды требуемых доступов."""
+
+    name: str
+    description: NotRequired[Optional[str]]
+    accesses: NotRequired[List[str]]
+
+
+class CatalogDocument(BaseModel):
+    """
+    Полный декларативный каталог Access: всё, чего нет в документе,
+    удаляется при синхронизации. Коды уникальны, ссылки — только на доступы
+    из этого же документа. Элементы — TypedDict, а не модели: каталог на
+    десятки тысяч записей валидируется в несколько раз быстрее.
+    """
+
+    accesses: List[CatalogAccess] = []
+    groups: List[CatalogGroup] = []
+    resources: List[CatalogResource] = []
+
+    @model_validator(mode="after")
+    def _check_references(self) -> "CatalogDocument":
+        codes = {a["code"] for a in self.accesses}
+        for label, keys in (
+            ("access code", [a["code"] for a in self.accesses]),
+            ("group code", [g["code"] for g in self.groups]),
+            ("resource name", [r["name"] for r in self.resources]),
+        ):
+            if len(set(keys)) != len(keys):
+                raise ValueError(f"Duplicate {label} in catalog")
+        for owner in (*self.groups, *self.resources):
+            unknown = set(owner.get("accesses", ())) - codes
+            if unknown:
+                raise ValueError(f"Unknown access codes: {sorted(unknown)}")
+        return self
+
+
+class CatalogSectionDiff(BaseModel):
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+
+class CatalogSyncResponse(BaseModel):
+    """
+    Итог синхронизации каталога по разделам. changed=False — каталог уже
+    совпадал с документом и запись не выполнялась; dry_run — изменения
+    только посчитаны.
+    """
+
+    changed: bool
+    dry_run: bool
+    accesses: CatalogSectionDiff
+    groups: CatalogSectionDiff
+    resources: CatalogSectionDiff
+    group_accesses: CatalogSectionDiff
+    resource_accesses: CatalogSectionDiff
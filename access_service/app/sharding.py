@@ -0,0 +1,96 @@
+"""
+Шардирование членства Access (user_accesses, user_groups) по user_id.
+
+Пользователь закреплён за шардом консистентным хешированием: кольцо из
+SHARD_VNODES виртуальных точек на шард (blake2b, одинаково во всех
+процессах). При добавлении шарда к нему переезжает лишь ~1/N пользователей,
+остальные остаются на месте; переезд выполняет app.rebalance.
+
+Справочники (доступы, группы, ресурсы и связи) ведутся в основной БД и
+реплицируются на каждый шард при синхронизации каталога, поэтому все
+запросы по одному пользователю выполняются внутри его шарда, с JOIN.
+Обратные выборки (кому выдан доступ, истекающие выдачи) опрашивают все
+шарды параллельно и объединяют ответы.
+"""
+
+import asyncio
+import bisect
+import hashlib
+from typing import Awaitable, Callable, Dict, Iterable, List, Sequence, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+T = TypeVar("T")
+
+
+def parse_shard_urls(value: str) -> Dict[str, str]:
+    """Разобрать DATABASE_SHARD_URLS: "имя=url" через запятую, порядок сохраняется."""
+    shards = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition("=")
+        if not sep or not name.strip() or not url.strip():
+            raise ValueError(f"Invalid shard spec {item!r}, expected name=url")
+        shards[name.strip()] = url.strip()
+    return shards
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Кольцо консистентного хеширования с виртуальными точками."""
+
+    def __init__(self, shards: Sequence[str], vnodes: int = 64):
+        if not shards:
+            raise ValueError("At least one shard is required")
+        points = sorted(
+            (_point(f"{name}#{i}"), name) for name in shards for i in range(vnodes)
+        )
+        self.shards = list(shards)
+        self._points = [point for point, _ in points]
+        self._owners = [name for _, name in points]
+
+    def shard_for(self, key: str) -> str:
+        i = bisect.bisect(self._points, _point(key)) % len(self._points)
+        return self._owners[i]
+
+
+class ShardRouter:
+    """Фабрики сессий шардов членства и выбор шарда по user_id."""
+
+    def __init__(self, factories: Dict[str, async_sessionmaker], vnodes: int = 64):
+        self.factories = dict(factories)
+        self.ring = HashRing(list(self.factories), vnodes)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.factories)
+
+    def shard_for(self, user_id: str) -> str:
+        return self.ring.shard_for(user_id)
+
+    def factory_for(self, user_id: str) -> async_sessionmaker:
+        return self.factories[self.ring.shard_for(user_id)]
+
+    def group(self, items: Iterable[T], user_id: Callable[[T], str]) -> Dict[str, List[T]]:
+        """Разложить элементы по шардам их пользователей."""
+        grouped: Dict[str, List[T]] = {}
+        for item in items:
+            grouped.setdefault(self.shard_for(user_id(item)), []).append(item)
+        return grouped
+
+    async def fan_out(
+        self, fn: Callable[[AsyncSession], Awaitable[T]]
+    ) -> Dict[str, T]:
+        """Выполнить fn в сессии каждого шарда параллельно; {шард: результат}."""
+
+        async def run(factory: async_sessionmaker) -> T:
+            async with factory() as session:
+                return await fn(session)
+
+        results = await asyncio.gather(*(run(f) for f in self.factories.values()))
+        return dict(zip(self.factories, results))
@@ -0,0 +1,214 @@
+"""
+Компактный бинарный снапшот членства пользователей в группах и доступах.
+
+Формат (little-endian):
+  заголовок  "<8sQdI": MAGIC, версия (счётчик membership_version),
+             время формирования (unix), число пользователей;
+  шесть массивов, каждый "<cQ" (typecode array, длина) + данные:
+    1. длины имён пользователей (байты UTF-8);
+    2. имена пользователей подряд — словарь, пользователи по возрастанию;
+    3. число групп у каждого пользователя (в порядке словаря);
+    4. id групп: дельты по сквозному потоку (пользователь, группа);
+    5-6. то же для прямых доступов.
+Каждый массив хранится в самом узком целочисленном типе, в который помещается,
+поэтому загрузчик декодирует его срезом memoryview и itertools.accumulate
+без поэлементного разбора в Python.
+"""
+
+import heapq
+import mmap
+import struct
+import sys
+import time
+from array import array
+from itertools import accumulate
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+MAGIC = b"ACSNAP01"
+HEADER = struct.Struct("<8sQdI")
+ARRAY_HEADER = struct.Struct("<cQ")
+
+_UNSIGNED = ("B", "H", "I", "Q")
+_SIGNED = ("b", "h", "i", "q")
+
+
+def _narrowest(values: Sequence[int], typecodes: Tuple[str, ...]) -> array:
+    lo, hi = (min(values), max(values)) if values else (0, 0)
+    for code in typecodes:
+        bits = array(code).itemsize * 8
+        if code in _SIGNED:
+            fits = -(1 << (bits - 1)) <= lo and hi < (1 << (bits - 1))
+        else:
+            fits = lo >= 0 and hi < (1 << bits)
+        if fits:
+            return array(code, values)
+    raise OverflowError("value does not fit into 64 bits")
+
+
+def _pack_array(arr: array) -> bytes:
+    if sys.byteorder == "big" and arr.itemsize > 1:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return ARRAY_HEADER.pack(arr.typecode.encode("ascii"), len(arr)) + arr.tobytes()
+
+
+class _Section:
+    """Пары (user_id, target_id) одного вида, упорядоченные по пользователю."""
+
+    def __init__(self):
+        self.users: List[str] = []
+        self.counts: List[int] = []
+        self.deltas: List[int] = []
+        self._prev = 0
+
+    def add(self, user_id: str, target_id: int) -> None:
+        if not self.users or self.users[-1] != user_id:
+            self.users.append(user_id)
+            self.counts.append(0)
+        self.counts[-1] += 1
+        self.deltas.append(target_id - self._prev)
+        self._prev = target_id
+
+    def counts_for(self, users: Sequence[str]) -> List[int]:
+        by_user = dict(zip(self.users, self.counts))
+        return [by_user.get(u, 0) for u in users]
+
+
+def encode(
+    version: int,
+    groups: Iterable[Tuple[str, int]],
+    accesses: Iterable[Tuple[str, int]],
+) -> bytes:
+    """
+    Закодировать снапшот. groups/accesses — пары (user_id, target_id),
+    отсортированные по (user_id, target_id).
+    """
+    sections = []
+    for pairs in (groups, accesses):
+        section = _Section()
+        for user_id, target_id in pairs:
+            section.add(user_id, target_id)
+        sections.append(section)
+    return _encode_sections(version, *sections)
+
+
+def _encode_sections(version: int, groups: _Section, accesses: _Section) -> bytes:
+    users = []
+    for user in heapq.merge(groups.users, accesses.users):
+        if not users or users[-1] != user:
+            users.append(user)
+    names = [u.encode("utf-8") for u in users]
+    parts = [
+        HEADER.pack(MAGIC, version, time.time(), len(users)),
+        _pack_array(_narrowest([len(n) for n in names], _UNSIGNED)),
+        _pack_array(array("B", b"".join(names))),
+    ]
+    for section in (groups, accesses):
+        parts.append(_pack_array(_narrowest(section.counts_for(users), _UNSIGNED)))
+        parts.append(_pack_array(_narrowest(section.deltas, _SIGNED)))
+    return b"".join(parts)
+
+
+async def build(session) -> bytes:
+    """Сформировать снапшот из БД Access (в одной транзакции с версией)."""
+    from . import repositories as repo
+
+    if session.get_bind().dialect.name == "postgresql":
+        # версия и членство должны читаться из одного снимка данных
+        await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    version = await repo.get_membership_version(session)
+    sections = []
+    for kind in ("group", "access"):
+        section = _Section()
+        async for user_id, target_id in repo.stream_memberships(session, kind):
+            section.add(user_id, target_id)
+        sections.append(section)
+    return _encode_sections(version, *sections)
+
+
+class Snapshot:
+    """Декодированный снапшот: поиск групп и доступов пользователя по словарю."""
+
+    def __init__(
+        self,
+        version: int,
+        generated_at: float,
+        users: List[str],
+        group_offsets: array,
+        group_ids: array,
+        access_offsets: array,
+        access_ids: array,
+    ):
+        self.version = version
+        self.generated_at = generated_at
+        self.users = users
+        self.index: Dict[str, int] = {u: i for i, u in enumerate(users)}
+        self.group_offsets = group_offsets
+        self.group_ids = group_ids
+        self.access_offsets = access_offsets
+        self.access_ids = access_ids
+
+    def groups_of(self, user_id: str) -> List[int]:
+        i = self.index.get(user_id)
+        if i is None:
+            return []
+        return list(self.group_ids[self.group_offsets[i] : self.group_offsets[i + 1]])
+
+    def accesses_of(self, user_id: str) -> List[int]:
+        i = self.index.get(user_id)
+        if i is None:
+            return []
+        return list(self.access_ids[self.access_offsets[i] : self.access_offsets[i + 1]])
+
+    def __len__(self) -> int:
+        return len(self.group_ids) + len(self.access_ids)
+
+
+def decode(buffer) -> Snapshot:
+    """Декодировать снапшот из bytes/mmap/memoryview."""
+    view = memoryview(buffer)
+    magic, version, generated_at, n_users = HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError("Not an access snapshot")
+    pos = HEADER.size
+    arrays = []
+    for _ in range(6):
+        code, count = ARRAY_HEADER.unpack_from(view, pos)
+        pos += ARRAY_HEADER.size
+        code = code.decode("ascii")
+        size = array(code).itemsize * count
+        chunk = view[pos : pos + size]
+        if sys.byteorder == "big" and size and array(code).itemsize > 1:
+            swapped = array(code, chunk.tobytes())
+            swapped.byteswap()
+            arrays.append(memoryview(swapped))
+        else:
+            arrays.append(chunk.cast(code) if size else memoryview(array(code)))
+        pos += size
+    name_lengths, blob, group_counts, group_deltas, access_counts, access_deltas = arrays
+
+    blob = blob.tobytes()
+    users: List[str] = []
+    start = 0
+    for end in accumulate(name_lengths):
+        users.append(blob[start:end].decode("utf-8"))
+        start = end
+    if len(users) != n_users:
+        raise ValueError("Corrupted access snapshot")
+    return Snapshot(
+        version,
+        generated_at,
+        users,
+        array("q", accumulate(group_counts, initial=0)),
+        array("q", accumulate(group_deltas)),
+        array("q", accumulate(access_counts, initial=0)),
+        array("q", accumulate(access_deltas)),
+    )
+
+
+def load(path: str) -> Snapshot:
+    """Загрузить снапшот из файла через mmap."""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            snapshot = decode(mm)
+            return snapshot
@@ -0,0 +1,41 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_conflict_rules_version"
+down_revision = "0001_init"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "conflict_rules_version",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.execute("INSERT INTO conflict_rules_version(id, version) VALUES (1, 1)")
+
+    # любое изменение правил увеличивает версию — кэши решений сбрасываются
+    op.execute(
+        """
+        CREATE FUNCTION bump_conflict_rules_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE conflict_rules_version SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER conflicting_groups_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON conflicting_groups
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_conflict_rules_version()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS conflicting_groups_version ON conflicting_groups")
+    op.execute("DROP FUNCTION IF EXISTS bump_conflict_rules_version()")
+    op.drop_table("conflict_rules_version")
@@ -0,0 +1,307 @@
+"""
+Клиент Access Service для consumer'а.
+
+Единый интерфейс AccessClient с двумя реализациями: JSON/HTTP (по умолчанию)
+и бинарный RPC (msgpack-кадры по постоянному TCP/Unix-сокету с
+мультиплексированием запросов). FallbackAccessClient переходит на HTTP,
+если RPC недоступен. HTTP-вызовы идут через resilience.ResilientClient:
+автомат на конечную точку, хеджирование чтений и бюджет времени сообщения.
+"""
+
+import asyncio
+import itertools
+import struct
+import time
+from typing import Any, Dict, Optional, Protocol, Union
+
+import httpx
+import msgpack
+
+from acs_common import tracing
+from acs_common.resilience import ResilientClient
+
+from .metrics import RPC_CLIENT_LATENCY, RPC_FALLBACKS
+
+MAX_FRAME = 16 * 1024 * 1024
+
+_HEADER = struct.Struct(">I")
+
+
+class AccessClient(Protocol):
+    async def get_user_rights(self, user_id: str) -> Dict[str, Any]: ...
+
+    async def get_group(self, group_id: int) -> Optional[Dict[str, Any]]: ...
+
+    async def apply(
+        self,
+        request_id: int,
+        user_id: str,
+        kind: str,
+        target_id: int,
+        expires_at: Optional[str] = None,
+    ) -> bool: ...
+
+    async def revoke(self, user_id: str, kind: str, target_id: int) -> None: ...
+
+
+class HttpAccessClient:
+    def __init__(self, base_url: str, client: Union[httpx.AsyncClient, ResilientClient]):
+        self._base_url = base_url
+        # общий ResilientClient хранит состояние автоматов между вызовами
+        self._client = client if isinstance(client, ResilientClient) else ResilientClient(client)
+
+    async def get_user_rights(self, user_id: str) -> Dict[str, Any]:
+        # проверка конфликтов не должна видеть отставшую реплику
+        resp = await self._client.get(
+            f"{self._base_url}/user/{user_id}/rights",
+            "GET /user/{user_id}/rights",
+            params={"consistent": "true"},
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def get_group(self, group_id: int) -> Optional[Dict[str, Any]]:
+        resp = await self._client.get(
+            f"{self._base_url}/group/{group_id}", "GET /group/{group_id}"
+        )
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        return resp.json()
+
+    async def apply(
+        self,
+        request_id: int,
+        user_id: str,
+        kind: str,
+        target_id: int,
+        expires_at: Optional[str] = None,
+    ) -> bool:
+        resp = await self._client.post(
+            f"{self._base_url}/access/apply",
+            "POST /access/apply",
+            json={
+                "request_id": request_id,
+                "user_id": user_id,
+                "kind": kind,
+                "target_id": target_id,
+                "expires_at": expires_at,
+            },
+        )
+        # 404 — цели нет; прочие ошибки (в том числе 5xx) не означают отказ
+        if resp.status_code == 404:
+            return False
+        resp.raise_for_status()
+        return True
+
+    async def revoke(self, user_id: str, kind: str, target_id: int) -> None:
+        resp = await self._client.post(
+            f"{self._base_url}/user/{user_id}/revoke",
+            "POST /user/{user_id}/revoke",
+            json={"kind": kind, "target_id": target_id},
+        )
+        resp.raise_for_status()
+
+
+class RpcUnavailable(Exception):
+    """RPC-соединение не установлено или оборвалось: можно перейти на HTTP."""
+
+
+# коды ошибок сервера, означающие сбой Access, а не ответ по существу:
+# internal — непредвиденная ошибка (БД, пул), unavailable — членство
+# заморожено; вызов уходит на HTTP, а при его сбое сообщение повторяется
+UNAVAILABLE_CODES = frozenset({"internal", "unavailable"})
+
+
+class RpcError(Exception):
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class RpcAccessClient:
+    """
+    Одно постоянное соединение на процесс; запросы мультиплексируются по msgid,
+    ответы разбирает фоновая задача чтения. После обрыва соединение
+    переустанавливается при следующем вызове, но не чаще reconnect_delay.
+    """
+
+    def __init__(self, address: str, timeout: float = 10.0, reconnect_delay: float = 1.0):
+        self.address = address
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._connect_lock = asyncio.Lock()
+        self._down_until = 0.0
+
+    async def _open(self):
+        if self.address.startswith("unix://"):
+            return await asyncio.open_unix_connection(self.address[len("unix://"):])
+        if self.address.startswith("tcp://"):
+            host, _, port = self.address[len("tcp://"):].rpartition(":")
+            return await asyncio.open_connection(host, int(port))
+        raise ValueError(f"Unsupported RPC address: {self.address}")
+
+    async def _ensure_connected(self) -> asyncio.StreamWriter:
+        if self._writer is not None and not self._writer.is_closing():
+            return self._writer
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+            if time.monotonic() < self._down_until:
+                raise RpcUnavailable(f"RPC {self.address} is down")
+            try:
+                reader, writer = await asyncio.wait_for(self._open(), self.timeout)
+            except (OSError, asyncio.TimeoutError) as exc:
+                self._down_until = time.monotonic() + self.reconnect_delay
+                raise RpcUnavailable(str(exc)) from exc
+            self._writer = writer
+            self._reader_task = asyncio.create_task(self._read_loop(reader))
+            return writer
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                if size > MAX_FRAME:
+                    raise ValueError(f"RPC frame too large: {size}")
+                msgid, error, result = msgpack.unpackb(
+                    await reader.readexactly(size), raw=False
+                )
+                future = self._pending.pop(msgid, None)
+                if future is None or future.done():
+                    continue
+                if error:
+                    future.set_exception(RpcError(error[0], error[1]))
+                else:
+                    future.set_result(result)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as exc:
+            self._fail_pending(RpcUnavailable(f"RPC connection lost: {exc!r}"))
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def _fail_pending(self, exc: Exception) -> None:
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Any:
+        writer = await self._ensure_connected()
+        msgid = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[msgid] = future
+        span = tracing.tracer.start_span(f"rpc {method}", attributes={"rpc.method": method})
+        started = time.perf_counter()
+        result = "ok"
+        try:
+            body = msgpack.packb(
+                [msgid, method, params, {tracing.TRACEPARENT: span.traceparent}],
+                use_bin_type=True,
+            )
+            try:
+                writer.write(_HEADER.pack(len(body)) + body)
+                await writer.drain()
+                return await asyncio.wait_for(future, self.timeout)
+            except (ConnectionError, asyncio.TimeoutError) as exc:
+                raise RpcUnavailable(repr(exc)) from exc
+        except RpcError as exc:
+            result = exc.code
+            if exc.code in UNAVAILABLE_CODES:
+                raise RpcUnavailable(f"RPC {method}: {exc.code}: {exc}") from exc
+            raise
+        except RpcUnavailable:
+            result = "unavailable"
+            raise
+        finally:
+            self._pending.pop(msgid, None)
+            RPC_CLIENT_LATENCY.observe(time.perf_counter() - started, method, result)
+            span.attributes["rpc.result"] = result
+            span.end(None if result in ("ok", "not_found") else "error")
+
+    async def get_user_rights(self, user_id: str) -> Dict[str, Any]:
+        return await self.call("user_rights", {"user_id": user_id, "consistent": True})
+
+    async def get_group(self, group_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            return await self.call("group", {"group_id": group_id})
+        except RpcError as exc:
+            if exc.code == "not_found":
+                return None
+            raise
+
+    async def apply(
+        self,
+        request_id: int,
+        user_id: str,
+        kind: str,
+        target_id: int,
+        expires_at: Optional[str] = None,
+    ) -> bool:
+        try:
+            await self.call(
+                "apply",
+                {
+                    "request_id": request_id,
+                    "user_id": user_id,
+                    "kind": kind,
+                    "target_id": target_id,
+                    "expires_at": expires_at,
+                },
+            )
+        except RpcError as exc:
+            if exc.code == "not_found":
+                return False
+            raise
+        return True
+
+    async def aclose(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._fail_pending(RpcUnavailable("RPC client closed"))
+
+
+class FallbackAccessClient:
+    """RPC с переходом на JSON/HTTP при недоступности RPC-соединения."""
+
+    def __init__(self, primary: RpcAccessClient, fallback: AccessClient):
+        self._primary = primary
+        self._fallback = fallback
+
+    async def _call(self, name: str, *args):
+        try:
+            return await getattr(self._primary, name)(*args)
+        except RpcUnavailable:
+            RPC_FALLBACKS.inc(name)
+            return await getattr(self._fallback, name)(*args)
+
+    async def get_user_rights(self, user_id: str) -> Dict[str, Any]:
+        return await self._call("get_user_rights", user_id)
+
+    async def get_group(self, group_id: int) -> Optional[Dict[str, Any]]:
+        return await self._call("get_group", group_id)
+
+    async def apply(
+        self,
+        request_id: int,
+        user_id: str,
+        kind: str,
+        target_id: int,
+        expires_at: Optional[str] = None,
+    ) -> bool:
+        return await self._call(
+            "apply", request_id, user_id, kind, target_id, expires_at
+        )
+
+    async def revoke(self, user_id: str, kind: str, target_id: int) -> None:
+        # отзыв — редкая компенсация, в RPC его нет
+        await self._fallback.revoke(user_id, kind, target_id)
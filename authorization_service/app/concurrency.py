@@ -0,0 +1,164 @@
+"""
+Адаптивный предел одновременно обрабатываемых сообщений consumer'а.
+
+Предел подбирается по AIMD, как окно перегрузки TCP: пока обработка
+укладывается в tolerance × базовую задержку и предел действительно
+используется, он растёт на 1 за «окно» (1/limit на сообщение); при ошибке
+или росте сглаженной задержки выше порога умножается на backoff. Снижение
+выполняется не чаще раза за сглаженную задержку, чтобы одна волна таймаутов
+не обрушила предел до минимума. Базовая задержка — минимум наблюдений,
+медленно дрейфующий вверх, чтобы после смены нагрузки порог не застыл.
+
+Предел ограничивает обработку локально (acquire/release) и задаёт prefetch
+канала RabbitMQ: при изменении целой части вызываются подписчики.
+Ожидающие места разложены по полосам приоритета (lanes): освободившееся
+место достаётся полосе, выбранной взвешенно-справедливо.
+"""
+
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+from .lanes import DEFAULT_LANE, WeightedFairQueue, parse_weights
+from .settings import settings
+
+
+class AdaptiveLimiter:
+    """Семафор с пределом, который подстраивается по задержке и ошибкам."""
+
+    def __init__(
+        self,
+        initial: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 100,
+        tolerance: float = 2.0,
+        backoff: float = 0.9,
+        smoothing: float = 0.2,
+        baseline_drift: float = 0.001,
+        clock: Callable[[], float] = time.monotonic,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.baseline_drift = baseline_drift
+        self._clock = clock
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        # сглаженная задержка последних сообщений и базовая (без перегрузки)
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.decreases = {"error": 0, "latency": 0}
+        self._decreased_at = float("-inf")
+        self._waiters: WeightedFairQueue[asyncio.Future] = WeightedFairQueue(
+            weights or {DEFAULT_LANE: 1.0}
+        )
+        self._listeners: List[Callable[[int], None]] = []
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    @property
+    def lanes(self) -> List[str]:
+        return list(self._waiters.weights)
+
+    def lane(self, name: str) -> str:
+        """Полоса ожидания по имени; неизвестные — полоса по умолчанию."""
+        return self._waiters.lane(name)
+
+    def subscribe(self, listener: Callable[[int], None]) -> None:
+        """Вызывать listener(новый целый предел) при его изменении."""
+        self._listeners.append(listener)
+
+    async def acquire(self, lane: str = DEFAULT_LANE) -> None:
+        """
+        Занять место; пока in_flight не меньше предела — ждать в очереди
+        полосы lane (неизвестная полоса — полоса по умолчанию).
+        """
+        if not self._waiters and self.in_flight < self.current:
+            self.in_flight += 1
+            return
+        lane = self.lane(lane)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(lane, waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # место уже выдано, но не занято — вернуть его
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self._waiters.remove(lane, waiter)
+            raise
+
+    def release(self, latency: Optional[float] = None, ok: bool = True) -> None:
+        """
+        Освободить место и учесть исход: latency — время обработки
+        (None — не учитывать, например при отмене), ok — без ошибки.
+        """
+        before = self.current
+        if latency is not None:
+            self._observe(latency, ok)
+        self.in_flight -= 1
+        self._wake()
+        if self.current != before:
+            for listener in self._listeners:
+                listener(self.current)
+
+    def _observe(self, latency: float, ok: bool) -> None:
+        if ok:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline += (latency - self.baseline) * self.baseline_drift
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += (latency - self.latency) * self.smoothing
+            if self.latency > self.baseline * self.tolerance:
+                self._decrease("latency")
+            elif self.in_flight >= self.limit / 2:
+                # растём, только если предел упирается в нагрузку
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        else:
+            self._decrease("error")
+
+    def _decrease(self, reason: str) -> None:
+        now = self._clock()
+        if now - self._decreased_at < (self.latency or 0.0):
+            return
+        self._decreased_at = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self.decreases[reason] += 1
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.current:
+            _, waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.current,
+            "in_flight": self.in_flight,
+            "waiting": self._waiters.depths(),
+            "latency": self.latency,
+            "baseline": self.baseline,
+            "decreases": dict(self.decreases),
+        }
+
+
+# Общий предел процесса: им пользуются consumer и метрики.
+limiter = AdaptiveLimiter(
+    initial=settings.consumer_initial_concurrency,
+    min_limit=settings.consumer_min_concurrency,
+    max_limit=settings.consumer_max_concurrency,
+    tolerance=settings.consumer_latency_tolerance,
+    backoff=settings.consumer_backoff_ratio,
+    weights=parse_weights(settings.priority_lane_weights),
+)
@@ -1,101 +1,316 @@
 import asyncio
 import json
+import time
+from typing import Optional
 import httpx
 import aio_pika
 from aio_pika.abc import AbstractIncomingMessage
+from acs_common import tracing
+from acs_common.resilience import ResilientClient, deadline_scope
+
+from .access_client import (
+    AccessClient,
+    FallbackAccessClient,
+    HttpAccessClient,
+    RpcAccessClient,
+    RpcUnavailable,
+)
 from .db import async_session_factory
-from .services import RepositoryGroupConflictPolicy
+from . import metrics
+from .concurrency import limiter
+from .lanes import DEFAULT_LANE, LANE_HEADER, lane_queue
+from .metrics import CONSUMER_OUTCOMES, CONSUMER_PROCESSING, LANE_LATENCY, QUEUE_LAG
+from .services import conflict_policy
 from .settings import settings
+from .status_batcher import StatusBatcher
 
 REQUEST_SERVICE_URL = settings.request_service_url
 ACCESS_SERVICE_URL = settings.access_service_url
 RABBITMQ_URL = settings.rabbitmq_url
 QUEUE_NAME = settings.requests_queue
 
+status_batcher = StatusBatcher(
+    f"{REQUEST_SERVICE_URL}/requests/status:batch",
+    max_batch=settings.status_batch_size,
+    max_delay=settings.status_batch_delay_ms / 1000,
+    retries=settings.status_batch_retries,
+    backoff=settings.status_batch_backoff_ms / 1000,
+)
+
+http_client: Optional[httpx.AsyncClient] = None
+resilient_client: Optional[ResilientClient] = None
+# Транспорт исходящих вызовов: None — сеть; в режиме монолита — вызовы
+# приложений Access/Request в том же процессе.
+transport: Optional[httpx.AsyncBaseTransport] = None
+
+
+rpc_client: Optional[RpcAccessClient] = (
+    RpcAccessClient(settings.access_rpc_url) if settings.access_rpc_url else None
+)
+
+def get_http_client() -> httpx.AsyncClient:
+    """Общий HTTP-клиент consumer'а: один пул соединений на время жизни процесса."""
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            timeout=settings.http_timeout_seconds,
+            transport=tracing.TracingTransport(transport),
+            event_hooks=metrics.httpx_event_hooks(),
+        )
+    return http_client
+
+
+def get_resilient_client() -> ResilientClient:
+    """
+    Обёртка общего HTTP-клиента с автоматами отключения и хеджированием;
+    одна на процесс, чтобы состояние автоматов переживало сообщения.
+    """
+    global resilient_client
+    client = get_http_client()
+    if resilient_client is None or resilient_client.client is not client:
+        resilient_client = ResilientClient(
+            client,
+            timeout=settings.http_timeout_seconds,
+            failure_threshold=settings.circuit_failure_threshold,
+            reset_timeout=settings.circuit_reset_seconds,
+            hedge=settings.hedge_enabled,
+            hedge_min_samples=settings.hedge_min_samples,
+        )
+    return resilient_client
+
+
+def get_access_client() -> AccessClient:
+    """Клиент Access: RPC с переходом на HTTP, если RPC настроен, иначе HTTP."""
+    http = HttpAccessClient(ACCESS_SERVICE_URL, get_resilient_client())
+    if rpc_client is None:
+        return http
+    return FallbackAccessClient(rpc_client, http)
+
+
+async def close_consumer() -> None:
+    """Отправить оставшиеся статусы и закрыть HTTP-клиенты consumer'а."""
+    global http_client, resilient_client
+    await status_batcher.aclose()
+    if rpc_client is not None:
+        await rpc_client.aclose()
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+        resilient_client = None
+
 
 async def process_message(message: AbstractIncomingMessage) -> None:
     """
-    Обработать одно сообщение из очереди:
-    1) распарсить payload {request_id, user_id, kind, target_id}
-    2) получить текущие права пользователя из Access
-    3) при kind=group — получить код целевой группы; если не найдена — reject
-    4) проверить конфликт; при наличии — PATCH rejected в Request
-       иначе — POST /access/apply, затем PATCH approved в Request
+    Обработать одно сообщение из очереди (см. handle_request).
+    Учитывает задержку в очереди (по заголовку x-published-at),
+    время обработки и исход в метриках. Обработка идёт в спане,
+    продолжающем трассу из заголовка traceparent сообщения.
+    Число одновременно обрабатываемых сообщений ограничено адаптивным
+    пределом (concurrency.limiter), которому сообщается время и исход;
+    место ожидается в полосе приоритета из заголовка x-priority.
+    Возврат в очередь (retry) считается ошибкой для предела.
+    """
+    headers = getattr(message, "headers", None) or {}
+    lane = limiter.lane(str(headers.get(LANE_HEADER, DEFAULT_LANE)))
+    await limiter.acquire(lane)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        outcome = await _process(message, lane)
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        limiter.release(
+            None if outcome == "cancelled" else time.perf_counter() - started,
+            ok=outcome not in ("error", "retry"),
+        )
+
+
+def message_budget(headers: dict) -> float:
+    """
+    Бюджет времени на сообщение: MESSAGE_DEADLINE_SECONDS, но не дольше
+    срока из заголовка x-deadline (unix-время), если публикатор его задал.
+    """
+    budget = settings.message_deadline_seconds
+    deadline = headers.get("x-deadline")
+    if deadline is not None:
+        budget = min(budget, float(deadline) - time.time())
+    return budget
+
+
+def is_retryable(exc: BaseException) -> bool:
     """
-    async with message.process():
-        payload = json.loads(message.body)
-        request_id = payload["request_id"]
-        user_id = payload["user_id"]
-        kind = payload["kind"]
-        target_id = payload["target_id"]
-        base_request_url = f"{REQUEST_SERVICE_URL}/requests/{request_id}"
-        request_status_url = f"{base_request_url}/status"
-
-        async with async_session_factory() as session, httpx.AsyncClient() as client:
-            rights_url = f"{ACCESS_SERVICE_URL}/user/{user_id}/rights"
-            rights_resp = await client.get(rights_url, timeout=10)
-            rights_resp.raise_for_status()
-            groups = rights_resp.json().get("groups", [])
-            current_group_codes = [g["code"] for g in groups]
-
-            target_group_code = None
-            if kind == "group":
-                group_url = f"{ACCESS_SERVICE_URL}/group/{target_id}"
-                try:
-                    g_resp = await client.get(group_url, timeout=10)
-                    g_resp.raise_for_status()
-                    target_group_code = g_resp.json().get("code")
-                except httpx.HTTPStatusError:
-                    await client.patch(
-                        request_status_url,
-                        json={
-                            "status": "rejected",
-                            "reason": "Group not found",
-                        },
+    Сбой на стороне Access/Request, а не в самом сообщении: открытый автомат
+    (CircuitOpenError), исчерпанный бюджет (DeadlineExceeded), таймаут или
+    сетевая ошибка, 5xx, недоступный RPC.
+    """
+    if isinstance(exc, (httpx.TransportError, RpcUnavailable)):
+        return True
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code >= 500
+
+
+async def _process(message: AbstractIncomingMessage, lane: str = DEFAULT_LANE) -> str:
+    """
+    Обработать сообщение в контексте подтверждения: при успехе — ack,
+    при ошибке в самом сообщении — reject без возврата. Если же недоступен
+    Access или Request (is_retryable), сообщение после паузы
+    MESSAGE_RETRY_DELAY_SECONDS возвращается в очередь (nack с requeue):
+    пока автомат открыт, сообщения не сгорают, а ждут восстановления;
+    пауза держит место в prefetch и тем притормаживает выборку. Сообщение
+    с истёкшим x-deadline не возвращается.
+    """
+    outcome = "error"
+    async with message.process(ignore_processed=True):
+        started = time.perf_counter()
+        headers = getattr(message, "headers", None) or {}
+        published_at = headers.get("x-published-at")
+        if published_at is not None:
+            lag = max(0.0, time.time() - float(published_at))
+            QUEUE_LAG.observe(lag)
+            LANE_LATENCY.observe(lag, lane, "queue")
+        with tracing.tracer.span(
+            f"{QUEUE_NAME} process", traceparent=headers.get(tracing.TRACEPARENT)
+        ) as span, deadline_scope(message_budget(headers)):
+            try:
+                outcome = await handle_request(json.loads(message.body))
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            except Exception as exc:
+                if not is_retryable(exc) or message_budget(headers) <= 0:
+                    raise
+                outcome = "retry"
+                span.attributes["error"] = type(exc).__name__
+            finally:
+                span.attributes["outcome"] = outcome
+                span.attributes["lane"] = lane
+                CONSUMER_OUTCOMES.inc(outcome)
+                CONSUMER_PROCESSING.observe(time.perf_counter() - started, outcome)
+                if published_at is not None:
+                    LANE_LATENCY.observe(
+                        max(0.0, time.time() - float(published_at)), lane, "total"
                     )
-                    return
-
-            candidate_groups = list(current_group_codes)
-            if kind == "group" and target_group_code:
-                candidate_groups.append(target_group_code)
-
-            policy = RepositoryGroupConflictPolicy(session)
-            conflict = await policy.has_conflict(candidate_groups)
-            if conflict:
-                await client.patch(
-                    request_status_url,
-                    json={
-                        "status": "rejected",
-                        "reason": "Conflicting groups",
-                    },
+        if outcome == "retry":
+            await asyncio.sleep(settings.message_retry_delay_seconds)
+            await message.nack(requeue=True)
+    return outcome
+
+
+async def request_is_pending(request_id: int, created_at: Optional[str] = None) -> bool:
+    """Заявка всё ещё ждёт решения (не отменена, например, при офбординге)."""
+    resp = await get_resilient_client().get(
+        f"{REQUEST_SERVICE_URL}/requests/{request_id}",
+        "GET /requests/{request_id}",
+        params={"created_at": created_at} if created_at else None,
+    )
+    if resp.status_code == 404:
+        return False
+    resp.raise_for_status()
+    return resp.json()["status"] == "pending"
+
+
+async def handle_request(payload: dict) -> str:
+    """
+    1) распарсить payload {request_id, user_id, kind, target_id, expires_at?,
+       created_at?}
+    2) пропустить заявку, которая уже не pending (отменена при офбординге)
+    3) получить текущие права пользователя из Access (RPC или HTTP)
+    4) при kind=group — получить код целевой группы; если не найдена — reject
+    5) проверить конфликт; при наличии — rejected в Request
+       иначе — применить доступ в Access, затем approved в Request;
+       если Access не нашёл цель (apply вернул False) — rejected
+    Статусы отправляются в Request пачками через StatusBatcher (вместе с
+    created_at заявки — для отсечения секций); Request меняет
+    только pending-заявки. Если заявку отменили между шагами 2 и 5, approved
+    не записывается (found=false, текущий статус cancelled) и только что
+    выданный доступ отзывается. Повтор пачки после таймаута, когда approved
+    уже записан, возвращает found=true — выдача остаётся.
+    Возвращает исход: approved, rejected_conflict, group_not_found,
+    target_not_found, not_pending или cancelled_revoked.
+    """
+    request_id = payload["request_id"]
+    user_id = payload["user_id"]
+    kind = payload["kind"]
+    target_id = payload["target_id"]
+    created_at = payload.get("created_at")
+
+    if not await request_is_pending(request_id, created_at):
+        return "not_pending"
+
+    access = get_access_client()
+    async with async_session_factory() as session:
+        rights = await access.get_user_rights(user_id)
+        current_group_codes = [g["code"] for g in rights.get("groups", [])]
+
+        target_group_code = None
+        if kind == "group":
+            group = await access.get_group(target_id)
+            if group is None:
+                await status_batcher.submit(
+                    request_id, "rejected", "Group not found", created_at=created_at
                 )
-                return
-
-            await client.post(
-                f"{ACCESS_SERVICE_URL}/access/apply",
-                json={
-                    "request_id": request_id,
-                    "user_id": user_id,
-                    "kind": kind,
-                    "target_id": target_id,
-                },
+                return "group_not_found"
+            target_group_code = group.get("code")
+
+        candidate_groups = list(current_group_codes)
+        if kind == "group" and target_group_code:
+            candidate_groups.append(target_group_code)
+
+        policy = conflict_policy(session)
+        conflict = await policy.has_conflict(candidate_groups)
+        if conflict:
+            await status_batcher.submit(
+                request_id, "rejected", "Conflicting groups", created_at=created_at
             )
-            await client.patch(
-                request_status_url,
-                json={"status": "approved"},
+            return "rejected_conflict"
+
+        applied = await access.apply(
+            request_id, user_id, kind, target_id, payload.get("expires_at")
+        )
+        if not applied:
+            await status_batcher.submit(
+                request_id, "rejected", "Target not found", created_at=created_at
             )
+            return "target_not_found"
+        result = await status_batcher.submit(request_id, "approved", created_at=created_at)
+        if not result["found"]:
+            current = result.get("request")
+            if current is None or current["status"] != "cancelled":
+                return "not_pending"
+            held = rights.get("groups" if kind == "group" else "direct_accesses", [])
+            # выдачу, бывшую у пользователя до заявки, не трогаем
+            if all(item["id"] != target_id for item in held):
+                await access.revoke(user_id, kind, target_id)
+            return "cancelled_revoked"
+        return "approved"
 
 
-async def run_consumer() -> None:
+async def run_consumer(queue=None) -> None:
     """
     Запустить подписчика на очередь RabbitMQ
     и обрабатывать сообщения бесконечно.
-    Используется QoS prefetch и подтверждения сообщений.
+    Используется QoS prefetch и подтверждения сообщений; prefetch следует
+    за адаптивным пределом concurrency.limiter. Очередь каждой полосы
+    приоритета читается своим подписчиком (prefetch действует на каждого),
+    так что сообщения всех полос ждут места в пределе одновременно.
+    queue — локальная очередь с `consume(callback, prefetch)` вместо RabbitMQ
+    (режим монолита): воркеров — по верхней границе, работу ограничивает предел.
     """
+    if queue is not None:
+        await queue.consume(process_message, prefetch=limiter.max_limit)
+        return
+
     connection = await aio_pika.connect_robust(RABBITMQ_URL)
     channel = await connection.channel()
-    await channel.set_qos(prefetch_count=10)
-    queue = await channel.declare_queue(QUEUE_NAME, durable=True)
-    await queue.consume(process_message)
+    await channel.set_qos(prefetch_count=limiter.current)
+
+    def update_prefetch(limit: int) -> None:
+        asyncio.get_running_loop().create_task(channel.set_qos(prefetch_count=limit))
+
+    limiter.subscribe(update_prefetch)
+    for lane in limiter.lanes:
+        queue = await channel.declare_queue(lane_queue(QUEUE_NAME, lane), durable=True)
+        await queue.consume(process_message)
 
     await asyncio.Event().wait()
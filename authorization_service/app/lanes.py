@@ -0,0 +1,82 @@
+"""
+Полосы приоритета заявок и взвешенно-справедливый выбор между ними.
+
+Каждая полоса — своя очередь RabbitMQ (normal — прежняя requests_queue).
+Сообщения всех полос ждут места в общем адаптивном пределе
+(concurrency.limiter); когда место освобождается, полоса выбирается по
+виртуальному времени (stride scheduling): у каждой полосы счётчик pass,
+обслуживание увеличивает его на 1/вес, выбирается непустая полоса с
+наименьшим pass. При постоянной нагрузке всех полос доли равны весам;
+критическое сообщение ждёт не дольше одного «шага» bulk, а bulk не
+голодает — его pass в конце концов окажется наименьшим. Полоса, пустовавшая
+какое-то время, не копит кредит: её pass подтягивается к текущему
+виртуальному времени.
+"""
+
+from collections import deque
+from typing import Deque, Dict, Generic, Tuple, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_LANE = "normal"
+LANE_HEADER = "x-priority"
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """Разобрать PRIORITY_LANE_WEIGHTS: "полоса=вес" через запятую."""
+    weights = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        lane, sep, weight = item.partition("=")
+        if not sep or not lane.strip() or float(weight) <= 0:
+            raise ValueError(f"Invalid lane weight {item!r}, expected lane=positive number")
+        weights[lane.strip()] = float(weight)
+    if DEFAULT_LANE not in weights:
+        raise ValueError(f"Lane {DEFAULT_LANE!r} must have a weight")
+    return weights
+
+
+def lane_queue(base: str, lane: str) -> str:
+    """Имя очереди полосы (как в Request Service)."""
+    return base if lane == DEFAULT_LANE else f"{base}.{lane}"
+
+
+class WeightedFairQueue(Generic[T]):
+    """Очереди по полосам; popleft() выбирает полосу взвешенно-справедливо."""
+
+    def __init__(self, weights: Dict[str, float]):
+        self.weights = dict(weights)
+        self._items: Dict[str, Deque[T]] = {lane: deque() for lane in self.weights}
+        self._pass = {lane: 0.0 for lane in self.weights}
+        self._vtime = 0.0
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._items.values())
+
+    def lane(self, name: str) -> str:
+        """Известная полоса по имени; неизвестные — в полосу по умолчанию."""
+        return name if name in self.weights else DEFAULT_LANE
+
+    def append(self, lane: str, item: T) -> None:
+        items = self._items[lane]
+        if not items:
+            self._pass[lane] = max(self._pass[lane], self._vtime)
+        items.append(item)
+
+    def remove(self, lane: str, item: T) -> None:
+        self._items[lane].remove(item)
+
+    def popleft(self) -> Tuple[str, T]:
+        # при равных pass побеждает полоса, объявленная раньше
+        lane = min(
+            (name for name, items in self._items.items() if items),
+            key=self._pass.__getitem__,
+        )
+        self._vtime = self._pass[lane]
+        self._pass[lane] += 1 / self.weights[lane]
+        return lane, self._items[lane].popleft()
+
+    def depths(self) -> Dict[str, int]:
+        return {lane: len(items) for lane, items in self._items.items()}
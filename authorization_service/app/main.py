@@ -1,8 +1,11 @@
 import asyncio
 from fastapi import FastAPI, Depends
-from .consumer import run_consumer
+from acs_common.tracing import setup_tracing
+
+from .consumer import close_consumer, run_consumer
 from . import schemas
-from .services import GroupConflictPolicy, get_conflict_policy
+from .services import GroupConflictPolicy, decision_cache, get_conflict_policy
+from .metrics import setup_metrics
 
 app = FastAPI(
     title="Authorization Service",
@@ -13,6 +16,8 @@ app = FastAPI(
         "Request/Access для обновления состояния."
     ),
 )
+setup_metrics(app)
+setup_tracing(app, "authorization_service")
 
 
 @app.on_event("startup")
@@ -20,6 +25,11 @@ async def startup_event():
     asyncio.create_task(run_consumer())
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_consumer()
+
+
 @app.get("/health", tags=["Техническое"], summary="Проверка здоровья")
 async def health():
     """Возвращает статус готовности сервиса к обработке запросов."""
@@ -33,7 +43,8 @@ async def health():
     description=(
         "Проверяет наличие конфликта среди переданных кодов групп. "
         "Реализация инкапсулирована в политике, "
-        "поставляемой через Depends (инверсия зависимостей)."
+        "поставляемой через Depends (инверсия зависимостей). "
+        "Решения кэшируются по набору кодов и версии правил."
     ),
 )
 async def conflicts_check(
@@ -42,3 +53,17 @@ async def conflicts_check(
 ):
     conflict = await policy.has_conflict(body.codes)
     return schemas.ConflictCheckResponse(conflict=conflict)
+
+
+@app.get(
+    "/conflicts/cache/stats",
+    tags=["Техническое"],
+    summary="Статистика кэша решений о конфликтах",
+    description=(
+        "Попадания и промахи кэша решений, доля попаданий, число записей, "
+        "сбросы и текущая версия правил конфликтов."
+    ),
+)
+async def conflicts_cache_stats():
+    """Вернуть счётчики общего кэша решений о конфликтах."""
+    return decision_cache.snapshot()
@@ -0,0 +1,154 @@
+"""
+Метрики Authorization Service. Реестр, типы метрик и общие метрики (HTTP, SQL, пул,
+исходящие вызовы) — в acs_common.metrics; здесь регистрируются метрики
+этого сервиса, а общий API реэкспортируется для модулей app.
+"""
+
+from typing import Dict, Tuple
+
+from acs_common.metrics import (  # noqa: F401 — общий API метрик сервиса
+    Counter,
+    Gauge,
+    Histogram,
+    LATENCY_BUCKETS,
+    REGISTRY,
+    httpx_event_hooks,
+    instrument_engine,
+    setup_metrics,
+)
+
+
+CONSUMER_PROCESSING = REGISTRY.register(
+    Histogram(
+        "consumer_processing_duration_seconds",
+        "Time to process one request event, by outcome.",
+        ("outcome",),
+    )
+)
+CONSUMER_OUTCOMES = REGISTRY.register(
+    Counter(
+        "consumer_messages_total",
+        "Processed request events by outcome.",
+        ("outcome",),
+    )
+)
+QUEUE_LAG = REGISTRY.register(
+    Histogram(
+        "consumer_queue_lag_seconds",
+        "Time between publishing an event and the start of its processing.",
+        buckets=LATENCY_BUCKETS + (30, 60, 300),
+    )
+)
+RPC_CLIENT_LATENCY = REGISTRY.register(
+    Histogram(
+        "rpc_client_duration_seconds",
+        "Internal RPC call latency to Access by method and result.",
+        ("method", "result"),
+    )
+)
+RPC_FALLBACKS = REGISTRY.register(
+    Counter(
+        "rpc_fallbacks_total",
+        "Access calls served over HTTP because RPC was unavailable.",
+        ("method",),
+    )
+)
+
+
+def _conflict_cache_lookups() -> Dict[Tuple[str, ...], float]:
+    from .services import decision_cache
+
+    return {("hit",): decision_cache.hits, ("miss",): decision_cache.misses}
+
+
+def _conflict_cache_entries() -> Dict[Tuple[str, ...], float]:
+    from .services import decision_cache
+
+    return {(): len(decision_cache)}
+
+
+CONFLICT_CACHE_LOOKUPS = REGISTRY.register(
+    Counter(
+        "conflict_cache_lookups_total",
+        "Conflict decision cache lookups by result (hit or miss).",
+        ("result",),
+        callback=_conflict_cache_lookups,
+    )
+)
+CONFLICT_CACHE_ENTRIES = REGISTRY.register(
+    Gauge(
+        "conflict_cache_entries",
+        "Number of cached conflict decisions.",
+        callback=_conflict_cache_entries,
+    )
+)
+
+
+def _consumer_limit() -> Dict[Tuple[str, ...], float]:
+    from .concurrency import limiter
+
+    return {("limit",): limiter.current, ("in_flight",): limiter.in_flight}
+
+
+def _consumer_latency() -> Dict[Tuple[str, ...], float]:
+    from .concurrency import limiter
+
+    if limiter.latency is None:
+        return {}
+    return {("recent",): limiter.latency, ("baseline",): limiter.baseline}
+
+
+def _consumer_limit_decreases() -> Dict[Tuple[str, ...], float]:
+    from .concurrency import limiter
+
+    return {(reason,): count for reason, count in limiter.decreases.items()}
+
+
+CONSUMER_CONCURRENCY = REGISTRY.register(
+    Gauge(
+        "consumer_concurrency",
+        "Adaptive consumer concurrency: current limit and messages in flight.",
+        ("state",),
+        callback=_consumer_limit,
+    )
+)
+CONSUMER_LATENCY_ESTIMATE = REGISTRY.register(
+    Gauge(
+        "consumer_latency_estimate_seconds",
+        "Smoothed recent and baseline processing latency driving the limit.",
+        ("signal",),
+        callback=_consumer_latency,
+    )
+)
+CONSUMER_LIMIT_DECREASES = REGISTRY.register(
+    Counter(
+        "consumer_limit_decreases_total",
+        "Multiplicative decreases of the consumer limit by reason.",
+        ("reason",),
+        callback=_consumer_limit_decreases,
+    )
+)
+
+
+def _consumer_lane_waiting() -> Dict[Tuple[str, ...], float]:
+    from .concurrency import limiter
+
+    return {(lane,): depth for lane, depth in limiter.snapshot()["waiting"].items()}
+
+
+LANE_LATENCY = REGISTRY.register(
+    Histogram(
+        "consumer_lane_latency_seconds",
+        "Per priority lane: publish to processing start (queue) and to completion (total).",
+        ("lane", "stage"),
+        buckets=LATENCY_BUCKETS + (30, 60, 300),
+    )
+)
+CONSUMER_LANE_WAITING = REGISTRY.register(
+    Gauge(
+        "consumer_lane_waiting",
+        "Delivered messages waiting for a slot under the concurrency limit, per lane.",
+        ("lane",),
+        callback=_consumer_lane_waiting,
+    )
+)
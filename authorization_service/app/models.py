@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import Integer, String, UniqueConstraint
+from sqlalchemy import BigInteger, Integer, String, UniqueConstraint
 from .db import Base
 
 
@@ -13,3 +13,15 @@ class ConflictingGroup(Base):
     __table_args__ = (
         UniqueConstraint("group_code_a", "group_code_b", name="uq_conflict_pair"),
     )
+
+
+class ConflictRulesVersion(Base):
+    """
+    Версия правил конфликтов: единственная строка (id=1), которую триггер
+    увеличивает при каждом изменении conflicting_groups.
+    """
+
+    __tablename__ = "conflict_rules_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
@@ -1,7 +1,38 @@
-from typing import Iterable
+from typing import FrozenSet, Iterable, Sequence, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from .models import ConflictingGroup
+from .models import ConflictingGroup, ConflictRulesVersion
+
+
+async def get_conflict_pairs(session: AsyncSession) -> FrozenSet[Tuple[str, str]]:
+    """Загрузить все пары конфликтующих групп, нормализованные как (min, max)."""
+    rows = (
+        await session.execute(
+            select(ConflictingGroup.group_code_a, ConflictingGroup.group_code_b)
+        )
+    ).all()
+    return frozenset((min(a, b), max(a, b)) for a, b in rows)
+
+
+async def get_conflict_rules_version(session: AsyncSession) -> int:
+    """
+    Вернуть версию правил конфликтов (увеличивается триггером при любом
+    изменении conflicting_groups; 0 — версия ещё не заведена).
+    """
+    result = await session.execute(
+        select(ConflictRulesVersion.version).where(ConflictRulesVersion.id == 1)
+    )
+    return result.scalar_one_or_none() or 0
+
+
+def find_conflict(pairs: FrozenSet[Tuple[str, str]], codes: Sequence[str]) -> bool:
+    """Есть ли среди кодов хотя бы одна пара из множества конфликтующих пар."""
+    for i in range(len(codes)):
+        for j in range(i + 1, len(codes)):
+            pair = (min(codes[i], codes[j]), max(codes[i], codes[j]))
+            if pair in pairs:
+                return True
+    return False
 
 
 async def has_conflict(session: AsyncSession, group_codes: Iterable[str]) -> bool:
@@ -16,15 +47,4 @@ async def has_conflict(session: AsyncSession, group_codes: Iterable[str]) -> boo
     codes = list(group_codes)
     if len(codes) < 2:
         return False
-    stmt = select(ConflictingGroup)
-    rows = (await session.execute(stmt)).scalars().all()
-    pairs = {
-        (min(r.group_code_a, r.group_code_b), max(r.group_code_a, r.group_code_b))
-        for r in rows
-    }
-    for i in range(len(codes)):
-        for j in range(i + 1, len(codes)):
-            pair = (min(codes[i], codes[j]), max(codes[i], codes[j]))
-            if pair in pairs:
-                return True
-    return False
+    return find_conflict(await get_conflict_pairs(session), codes)
@@ -7,6 +7,7 @@ class IncomingRequest(BaseModel):
     user_id: str
     kind: Literal["access", "group"]
     target_id: int
+    expires_at: Optional[str] = None
 
 
 class StatusPatch(BaseModel):
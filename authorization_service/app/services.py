@@ -1,9 +1,14 @@
-from typing import Iterable, Protocol
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, FrozenSet, Iterable, Optional, Protocol, Tuple
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from . import repositories as repo
 from .repositories import has_conflict as repo_has_conflict
 from .deps import get_session
+from .settings import settings
 
 
 class GroupConflictPolicy(Protocol):
@@ -18,7 +23,112 @@ class RepositoryGroupConflictPolicy:
         return await repo_has_conflict(self._session, group_codes)
 
 
+class ConflictDecisionCache:
+    """
+    Ограниченный LRU-кэш решений о конфликте.
+
+    Ключ — версия правил и хэш отсортированного набора кодов групп, поэтому
+    пользователи с одинаковым набором групп получают одно решение. Версия
+    правил перечитывается из БД не чаще раза в check_interval секунд; при её
+    изменении перезагружаются пары конфликтов и сбрасываются решения.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        check_interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self._clock = clock
+        self._decisions: "OrderedDict[Tuple[int, str], bool]" = OrderedDict()
+        self._pairs: Optional[FrozenSet[Tuple[str, str]]] = None
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._decisions)
+
+    @staticmethod
+    def key(group_codes: Iterable[str]) -> str:
+        """Канонический хэш набора кодов: не зависит от порядка."""
+        return hashlib.blake2b(
+            "\x1f".join(sorted(group_codes)).encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+    async def _refresh(self, session: AsyncSession) -> int:
+        now = self._clock()
+        if self._pairs is not None and now - self._checked_at < self.check_interval:
+            return self._version
+        version = await repo.get_conflict_rules_version(session)
+        self._checked_at = now
+        if self._pairs is None or version != self._version:
+            if self._pairs is not None:
+                self.invalidations += 1
+            self._pairs = await repo.get_conflict_pairs(session)
+            self._version = version
+            self._decisions.clear()
+        return version
+
+    async def has_conflict(self, session: AsyncSession, group_codes: Iterable[str]) -> bool:
+        codes = sorted(group_codes)
+        if len(codes) < 2:
+            return False
+        key = (await self._refresh(session), self.key(codes))
+        decision = self._decisions.get(key)
+        if decision is not None:
+            self.hits += 1
+            self._decisions.move_to_end(key)
+            return decision
+        self.misses += 1
+        decision = repo.find_conflict(self._pairs, codes)
+        self._decisions[key] = decision
+        if len(self._decisions) > self.max_entries:
+            self._decisions.popitem(last=False)
+        return decision
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+            "invalidations": self.invalidations,
+            "rules_version": self._version,
+        }
+
+
+class CachedGroupConflictPolicy:
+    """Политика конфликтов поверх общего кэша решений."""
+
+    def __init__(self, session: AsyncSession, cache: ConflictDecisionCache):
+        self._session = session
+        self._cache = cache
+
+    async def has_conflict(self, group_codes: Iterable[str]) -> bool:
+        return await self._cache.has_conflict(self._session, group_codes)
+
+
+# Общий кэш процесса: им пользуются и /conflicts/check, и consumer.
+decision_cache = ConflictDecisionCache(
+    max_entries=settings.conflict_cache_size,
+    check_interval=settings.conflict_rules_check_seconds,
+)
+
+
+def conflict_policy(session: AsyncSession) -> GroupConflictPolicy:
+    """Политика конфликтов для сессии: с кэшем решений, если он включён."""
+    if decision_cache.max_entries > 0:
+        return CachedGroupConflictPolicy(session, decision_cache)
+    return RepositoryGroupConflictPolicy(session)
+
+
 async def get_conflict_policy(
     session: AsyncSession = Depends(get_session),
 ) -> GroupConflictPolicy:
-    return RepositoryGroupConflictPolicy(session)
+    return conflict_policy(session)
@@ -20,5 +20,111 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices("REQUESTS_QUEUE"),
     )
 
+    status_batch_size: int = Field(
+        default=100,
+        validation_alias=AliasChoices("STATUS_BATCH_SIZE"),
+    )
+    status_batch_delay_ms: float = Field(
+        default=5.0,
+        validation_alias=AliasChoices("STATUS_BATCH_DELAY_MS"),
+    )
+    # Повторы пачки коллбеков при временном сбое Request и первая пауза
+    # между ними (далее удваивается).
+    status_batch_retries: int = Field(
+        default=4,
+        validation_alias=AliasChoices("STATUS_BATCH_RETRIES"),
+    )
+    status_batch_backoff_ms: float = Field(
+        default=100.0,
+        validation_alias=AliasChoices("STATUS_BATCH_BACKOFF_MS"),
+    )
+
+    # Адрес внутреннего RPC Access (tcp://host:port или unix:///path);
+    # пусто — вызовы Access только по JSON/HTTP.
+    access_rpc_url: str = Field(
+        default="",
+        validation_alias=AliasChoices("ACCESS_RPC_URL"),
+    )
+
+    # Кэш решений о конфликте групп: размер (0 — без кэша) и период
+    # перечитывания версии правил из БД.
+    conflict_cache_size: int = Field(
+        default=10_000,
+        validation_alias=AliasChoices("CONFLICT_CACHE_SIZE"),
+    )
+    conflict_rules_check_seconds: float = Field(
+        default=1.0,
+        validation_alias=AliasChoices("CONFLICT_RULES_CHECK_SECONDS"),
+    )
+
+
+    # Адаптивный предел одновременной обработки сообщений consumer'ом
+    # (он же prefetch канала): границы, начальное значение, допустимый рост
+    # задержки относительно базовой и множитель снижения.
+    consumer_initial_concurrency: int = Field(
+        default=10,
+        validation_alias=AliasChoices("CONSUMER_INITIAL_CONCURRENCY"),
+    )
+    consumer_min_concurrency: int = Field(
+        default=1,
+        validation_alias=AliasChoices("CONSUMER_MIN_CONCURRENCY"),
+    )
+    consumer_max_concurrency: int = Field(
+        default=100,
+        validation_alias=AliasChoices("CONSUMER_MAX_CONCURRENCY"),
+    )
+    consumer_latency_tolerance: float = Field(
+        default=2.0,
+        validation_alias=AliasChoices("CONSUMER_LATENCY_TOLERANCE"),
+    )
+    consumer_backoff_ratio: float = Field(
+        default=0.9,
+        validation_alias=AliasChoices("CONSUMER_BACKOFF_RATIO"),
+    )
+
+
+    # Исходящие HTTP-вызовы (resilience): таймаут, автомат отключения
+    # (ошибок подряд до открытия, пауза до пробного вызова), хеджирование
+    # GET после p95 (не раньше hedge_min_samples наблюдений) и бюджет
+    # времени на обработку одного сообщения.
+    http_timeout_seconds: float = Field(
+        default=10.0,
+        validation_alias=AliasChoices("HTTP_TIMEOUT_SECONDS"),
+    )
+    circuit_failure_threshold: int = Field(
+        default=5,
+        validation_alias=AliasChoices("CIRCUIT_FAILURE_THRESHOLD"),
+    )
+    circuit_reset_seconds: float = Field(
+        default=5.0,
+        validation_alias=AliasChoices("CIRCUIT_RESET_SECONDS"),
+    )
+    hedge_enabled: bool = Field(
+        default=True,
+        validation_alias=AliasChoices("HEDGE_ENABLED"),
+    )
+    hedge_min_samples: int = Field(
+        default=20,
+        validation_alias=AliasChoices("HEDGE_MIN_SAMPLES"),
+    )
+    message_deadline_seconds: float = Field(
+        default=30.0,
+        validation_alias=AliasChoices("MESSAGE_DEADLINE_SECONDS"),
+    )
+    # Пауза перед возвратом сообщения в очередь, если Access/Request
+    # недоступны (автомат открыт, таймаут, сетевая ошибка, 5xx).
+    message_retry_delay_seconds: float = Field(
+        default=5.0,
+        validation_alias=AliasChoices("MESSAGE_RETRY_DELAY_SECONDS"),
+    )
+
+    # Полосы приоритета заявок и их веса ("полоса=вес" через запятую):
+    # при занятом пределе места выдаются полосам пропорционально весам.
+    # Очередь полосы normal — requests_queue, прочих — requests_queue.<полоса>.
+    priority_lane_weights: str = Field(
+        default="critical=8,normal=4,bulk=1",
+        validation_alias=AliasChoices("PRIORITY_LANE_WEIGHTS"),
+    )
+
 
 settings = Settings()
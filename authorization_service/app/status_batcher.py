@@ -0,0 +1,134 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+import httpx
+
+from acs_common import tracing
+from acs_common.resilience import ResilientClient
+
+from . import metrics
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """Сбой, который может пройти сам: сеть, таймаут, открытый автомат, 5xx."""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code >= 500
+
+
+class StatusBatcher:
+    """
+    Группирует коллбеки статусов заявок в один `PATCH /requests/status:batch`.
+    Каждый вызов `submit` ждёт отправки своей пачки, поэтому сообщение очереди
+    подтверждается только после того, как статус реально записан в Request.
+    Пачка отправляется при достижении `max_batch` элементов или через `max_delay`
+    секунд после первого элемента — что наступит раньше. Отправка идёт через
+    автомат отключения (resilience), без бюджета отдельных сообщений: пачка
+    общая для многих сообщений.
+    Временный сбой Request (сеть, таймаут, открытый автомат, 5xx) не валит
+    сразу все ожидающие submit: пачка повторяется до `retries` раз с
+    экспоненциальной паузой от `backoff` до `max_backoff` секунд. Ошибка
+    отдаётся ожидающим только после последней попытки или при ответе 4xx.
+    """
+
+    def __init__(
+        self,
+        batch_url: str,
+        max_batch: int = 100,
+        max_delay: float = 0.005,
+        client: Optional[httpx.AsyncClient] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        retries: int = 4,
+        backoff: float = 0.1,
+        max_backoff: float = 2.0,
+    ):
+        self._batch_url = batch_url
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._client = client
+        self._transport = transport
+        self._resilient: Optional[ResilientClient] = None
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(
+        self,
+        request_id: int,
+        status: str,
+        reason: Optional[str] = None,
+        created_at: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Поставить переход статуса в текущую пачку и дождаться её отправки.
+        created_at — время создания заявки из сообщения: по нему Request
+        обновляет заявку в одной секции таблицы.
+        :return: результат по элементу {request_id, found, request}
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        item = {"request_id": request_id, "status": status, "reason": reason}
+        if created_at is not None:
+            item["created_at"] = created_at
+        self._pending.append((item, future))
+        if len(self._pending) >= self._max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=10,
+                transport=tracing.TracingTransport(self._transport),
+                event_hooks=metrics.httpx_event_hooks(),
+            )
+        if self._resilient is None or self._resilient.client is not self._client:
+            self._resilient = ResilientClient(
+                self._client, hedge=False, propagate_deadline=False
+            )
+        attempt = 0
+        while True:
+            try:
+                resp = await self._resilient.patch(
+                    self._batch_url,
+                    "PATCH /requests/status:batch",
+                    json={"items": [item for item, _ in batch]},
+                )
+                resp.raise_for_status()
+                results = resp.json()["results"]
+                break
+            except Exception as exc:
+                if attempt < self._retries and _is_transient(exc):
+                    await asyncio.sleep(min(self._backoff * 2**attempt, self._max_backoff))
+                    attempt += 1
+                    continue
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def aclose(self) -> None:
+        """Отправить остаток пачки и закрыть HTTP-клиент."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,207 @@
+"""
+Микробенчмарки функций repositories всех трёх сервисов на синтетических данных.
+
+Запуск: pytest bench/bench_repositories.py [--benchmark-only]
+Объём данных масштабируется BENCH_SCALE (1 — около 2 тыс. пользователей и
+20 тыс. заявок). Базы — временные SQLite либо BENCH_ACCESS_DB_URL,
+BENCH_AUTH_DB_URL, BENCH_REQUEST_DB_URL (пустые базы Postgres; схема
+создаётся через metadata).
+"""
+
+import asyncio
+import itertools
+import os
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from access_service.app import repositories as access_repo
+from authorization_service.app import repositories as auth_repo
+from request_service.app import repositories as request_repo
+from bench.conftest import QueryCounter
+from bench.datagen import (
+    AccessBase,
+    AccessVolumes,
+    AuthBase,
+    RequestBase,
+    create_schema,
+    generate_access,
+    generate_auth,
+    generate_requests,
+)
+
+SCALE = float(os.getenv("BENCH_SCALE", "1"))
+VOLUMES = AccessVolumes(
+    users=int(2_000 * SCALE),
+    groups=int(200 * SCALE),
+    accesses=int(2_000 * SCALE),
+    resources=int(400 * SCALE),
+)
+REQUESTS = int(20_000 * SCALE)
+CONFLICTS = int(500 * SCALE)
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module")
+def databases(loop, tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("bench_db")
+    specs = {
+        "access": (os.getenv("BENCH_ACCESS_DB_URL"), AccessBase),
+        "auth": (os.getenv("BENCH_AUTH_DB_URL"), AuthBase),
+        "request": (os.getenv("BENCH_REQUEST_DB_URL"), RequestBase),
+    }
+
+    async def setup():
+        dbs = {}
+        for name, (url, base) in specs.items():
+            engine = create_async_engine(url or f"sqlite+aiosqlite:///{tmp / name}.db")
+            await create_schema(engine, base)
+            dbs[name] = (engine, async_sessionmaker(bind=engine, expire_on_commit=False))
+        async with dbs["access"][0].begin() as conn:
+            await generate_access(conn, VOLUMES)
+        async with dbs["auth"][0].begin() as conn:
+            await generate_auth(conn, CONFLICTS, VOLUMES.groups)
+        async with dbs["request"][0].begin() as conn:
+            await generate_requests(conn, REQUESTS, VOLUMES.users, VOLUMES.groups, months=3)
+        return dbs
+
+    dbs = loop.run_until_complete(setup())
+    yield dbs
+    for engine, _ in dbs.values():
+        loop.run_until_complete(engine.dispose())
+
+
+def run(benchmark, loop, db, fn):
+    """Замерить fn(session) в отдельной сессии на вызов и число SQL-запросов."""
+    engine, factory = db
+
+    async def call():
+        async with factory() as session:
+            return await fn(session)
+
+    def once():
+        return loop.run_until_complete(call())
+
+    counter = QueryCounter(engine)
+    try:
+        once()
+        benchmark.extra_info["queries_per_call"] = counter.count
+    finally:
+        counter.close()
+    return benchmark(once)
+
+
+# --- Access Service ---
+
+
+def test_get_user_groups(benchmark, loop, databases):
+    run(benchmark, loop, databases["access"], lambda s: access_repo.get_user_groups(s, "u1"))
+
+
+def test_get_user_direct_accesses(benchmark, loop, databases):
+    run(
+        benchmark, loop, databases["access"],
+        lambda s: access_repo.get_user_direct_accesses(s, "u1"),
+    )
+
+
+def test_get_accesses_for_groups(benchmark, loop, databases):
+    group_ids = list(range(1, 11))
+    run(
+        benchmark, loop, databases["access"],
+        lambda s: access_repo.get_accesses_for_groups(s, group_ids),
+    )
+
+
+def test_get_required_accesses_for_resource(benchmark, loop, databases):
+    run(
+        benchmark, loop, databases["access"],
+        lambda s: access_repo.get_required_accesses_for_resource(s, 1),
+    )
+
+
+def test_get_group_by_id(benchmark, loop, databases):
+    run(benchmark, loop, databases["access"], lambda s: access_repo.get_group_by_id(s, 1))
+
+
+def test_apply_and_revoke_access(benchmark, loop, databases):
+    targets = itertools.cycle(range(1, VOLUMES.accesses + 1))
+
+    async def apply_revoke(s):
+        target = next(targets)
+        await access_repo.apply_access(s, "bench_user", "access", target)
+        await access_repo.revoke_user_target(s, "bench_user", "access", target)
+
+    run(benchmark, loop, databases["access"], apply_revoke)
+
+
+# --- Authorization Service ---
+
+
+def test_has_conflict(benchmark, loop, databases):
+    codes = [f"GRP_{i}" for i in range(1, 8)]
+    run(benchmark, loop, databases["auth"], lambda s: auth_repo.has_conflict(s, codes))
+
+
+# --- Request Service ---
+
+
+def test_get_request(benchmark, loop, databases):
+    run(benchmark, loop, databases["request"], lambda s: request_repo.get_request(s, 1))
+
+
+def test_get_user_requests(benchmark, loop, databases):
+    run(
+        benchmark, loop, databases["request"],
+        lambda s: request_repo.get_user_requests(s, "u1"),
+    )
+
+
+def test_find_pending_request(benchmark, loop, databases):
+    run(
+        benchmark, loop, databases["request"],
+        lambda s: request_repo.find_pending_request(s, "u1", "group", 1),
+    )
+
+
+def test_get_request_by_idempotency_key(benchmark, loop, databases):
+    run(
+        benchmark, loop, databases["request"],
+        lambda s: request_repo.get_request_by_idempotency_key(s, "missing"),
+    )
+
+
+def test_create_request(benchmark, loop, databases):
+    counter = itertools.count()
+
+    async def create(s):
+        n = next(counter)
+        return await request_repo.create_request(
+            s, f"bench_{n}", "group", 1, idempotency_key=f"bench-{n}"
+        )
+
+    run(benchmark, loop, databases["request"], create)
+
+
+def test_patch_status(benchmark, loop, databases):
+    ids = itertools.cycle(range(1, REQUESTS + 1))
+    run(
+        benchmark, loop, databases["request"],
+        lambda s: request_repo.patch_status(s, next(ids), "approved", None),
+    )
+
+
+def test_patch_statuses_batch_100(benchmark, loop, databases):
+    ids = itertools.cycle(range(1, REQUESTS + 1))
+    run(
+        benchmark, loop, databases["request"],
+        lambda s: request_repo.patch_statuses(
+            s, [(next(ids), "rejected", "bench", None) for _ in range(100)]
+        ),
+    )
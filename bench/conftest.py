@@ -0,0 +1,76 @@
+"""
+Общие фикстуры микробенчмарков репозиториев.
+
+Если установлен pytest-benchmark, используется его фикстура `benchmark`;
+иначе — упрощённая замена с тем же способом вызова (benchmark(fn, *args)),
+печатающая сводку в конце сессии. Число SQL-запросов на вызов
+записывается в benchmark.extra_info["queries_per_call"].
+"""
+
+import statistics
+import time
+from typing import Dict, List
+
+import pytest
+from sqlalchemy import event
+
+_fallback_results: Dict[str, dict] = {}
+
+
+class QueryCounter:
+    """Счётчик SQL-запросов движка через событие before_cursor_execute."""
+
+    def __init__(self, async_engine):
+        self.count = 0
+        self._engine = async_engine.sync_engine
+        event.listen(self._engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *_args, **_kwargs) -> None:
+        self.count += 1
+
+    def close(self) -> None:
+        event.remove(self._engine, "before_cursor_execute", self._on_execute)
+
+
+class _FallbackBenchmark:
+    def __init__(self, name: str, rounds: int = 30):
+        self.name = name
+        self.rounds = rounds
+        self.extra_info: dict = {}
+
+    def __call__(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)  # warmup
+        timings: List[float] = []
+        for _ in range(self.rounds):
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            timings.append(time.perf_counter() - started)
+        _fallback_results[self.name] = {
+            "mean_ms": statistics.fmean(timings) * 1000,
+            "min_ms": min(timings) * 1000,
+            "max_ms": max(timings) * 1000,
+            **self.extra_info,
+        }
+        return result
+
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+
+    @pytest.fixture
+    def benchmark(request):
+        return _FallbackBenchmark(request.node.name)
+
+    def pytest_terminal_summary(terminalreporter):
+        if not _fallback_results:
+            return
+        terminalreporter.section("repository benchmarks")
+        for name, r in sorted(_fallback_results.items()):
+            extra = ", ".join(
+                f"{k}={v}" for k, v in r.items() if k not in ("mean_ms", "min_ms", "max_ms")
+            )
+            terminalreporter.write_line(
+                f"{name:<50} mean={r['mean_ms']:.3f}ms min={r['min_ms']:.3f}ms "
+                f"max={r['max_ms']:.3f}ms {extra}"
+            )
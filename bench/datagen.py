@@ -0,0 +1,284 @@
+"""
+Генератор синтетических данных для схем всех трёх сервисов.
+
+Строки генерируются порциями и загружаются через COPY (asyncpg,
+copy_records_to_table) для Postgres либо через executemany для прочих
+диалектов (SQLite). Идентификаторы задаются явно, последовательности
+Postgres после загрузки сдвигаются на max(id).
+
+Пример (объёмы из ТЗ):
+    python -m bench.datagen access --url postgresql+asyncpg://... --users 1000000 \\
+        --groups 5000 --accesses 50000
+    python -m bench.datagen auth --url ... --conflicts 10000 --groups 5000
+    python -m bench.datagen requests --url ... --requests 10000000 --users 1000000
+"""
+
+import argparse
+import asyncio
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import Table, insert, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+from access_service.app import models as access_models
+from access_service.app.db import Base as AccessBase
+from authorization_service.app.db import Base as AuthBase
+from authorization_service.app.models import ConflictingGroup
+from request_service.app import stats
+from request_service.app.db import Base as RequestBase
+from request_service.app.maintenance import add_months, create_partition, month_start
+from request_service.app.models import Request, RequestLatencyHourly, RequestStatsHourly
+
+CHUNK = 50_000
+
+
+@dataclass
+class AccessVolumes:
+    users: int = 1_000_000
+    groups: int = 5_000
+    accesses: int = 50_000
+    resources: int = 10_000
+    accesses_per_group: int = 10
+    accesses_per_resource: int = 3
+    groups_per_user: int = 3
+    direct_per_user: int = 2
+
+
+def _chunks(rows: Iterable[tuple], size: int = CHUNK) -> Iterator[List[tuple]]:
+    chunk: List[tuple] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def bulk_load(
+    conn: AsyncConnection, table: Table, columns: Sequence[str], rows: Iterable[tuple]
+) -> int:
+    """
+    Загрузить строки в таблицу: COPY для asyncpg, executemany для прочих.
+    :return: число загруженных строк
+    """
+    total = 0
+    if conn.dialect.name == "postgresql":
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+        for chunk in _chunks(rows):
+            await driver.copy_records_to_table(table.name, records=chunk, columns=list(columns))
+            total += len(chunk)
+        if "id" in columns:
+            await conn.execute(
+                text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {table.name}))"
+                )
+            )
+        return total
+    for chunk in _chunks(rows):
+        await conn.execute(insert(table), [dict(zip(columns, row)) for row in chunk])
+        total += len(chunk)
+    return total
+
+
+def _sample(rnd: random.Random, upper: int, k: int) -> List[int]:
+    """k различных id из 1..upper."""
+    return rnd.sample(range(1, upper + 1), min(k, upper))
+
+
+async def generate_access(conn: AsyncConnection, v: AccessVolumes, seed: int = 0) -> dict:
+    """Справочники, связи и членство пользователей u0..u{users-1} в схеме Access."""
+    rnd = random.Random(seed)
+    t = lambda model: model.__table__  # noqa: E731
+    counts = {
+        "accesses": await bulk_load(
+            conn, t(access_models.Access), ("id", "code", "description"),
+            ((i, f"ACC_{i}", None) for i in range(1, v.accesses + 1)),
+        ),
+        "right_groups": await bulk_load(
+            conn, t(access_models.RightGroup), ("id", "code", "description"),
+            ((i, f"GRP_{i}", None) for i in range(1, v.groups + 1)),
+        ),
+        "resources": await bulk_load(
+            conn, t(access_models.Resource), ("id", "name", "description"),
+            ((i, f"res_{i}", None) for i in range(1, v.resources + 1)),
+        ),
+    }
+    counts["group_accesses"] = await bulk_load(
+        conn, t(access_models.GroupAccess), ("group_id", "access_id"),
+        (
+            (g, a)
+            for g in range(1, v.groups + 1)
+            for a in _sample(rnd, v.accesses, v.accesses_per_group)
+        ),
+    )
+    counts["resource_accesses"] = await bulk_load(
+        conn, t(access_models.ResourceAccess), ("resource_id", "access_id"),
+        (
+            (r, a)
+            for r in range(1, v.resources + 1)
+            for a in _sample(rnd, v.accesses, rnd.randint(1, v.accesses_per_resource))
+        ),
+    )
+    counts["user_groups"] = await bulk_load(
+        conn, t(access_models.UserGroup), ("user_id", "group_id"),
+        (
+            (f"u{u}", g)
+            for u in range(v.users)
+            for g in _sample(rnd, v.groups, rnd.randint(0, 2 * v.groups_per_user))
+        ),
+    )
+    counts["user_accesses"] = await bulk_load(
+        conn, t(access_models.UserAccess), ("user_id", "access_id"),
+        (
+            (f"u{u}", a)
+            for u in range(v.users)
+            for a in _sample(rnd, v.accesses, rnd.randint(0, 2 * v.direct_per_user))
+        ),
+    )
+    return counts
+
+
+async def generate_auth(
+    conn: AsyncConnection, conflicts: int = 10_000, groups: int = 5_000, seed: int = 0
+) -> dict:
+    """Уникальные пары конфликтующих групп GRP_a/GRP_b (a < b)."""
+    rnd = random.Random(seed)
+    conflicts = min(conflicts, groups * (groups - 1) // 2)
+    pairs = set()
+    while len(pairs) < conflicts:
+        a, b = sorted(rnd.sample(range(1, groups + 1), 2))
+        pairs.add((a, b))
+    count = await bulk_load(
+        conn, ConflictingGroup.__table__, ("id", "group_code_a", "group_code_b"),
+        ((i, f"GRP_{a}", f"GRP_{b}") for i, (a, b) in enumerate(sorted(pairs), 1)),
+    )
+    return {"conflicting_groups": count}
+
+
+async def generate_requests(
+    conn: AsyncConnection,
+    requests: int = 10_000_000,
+    users: int = 1_000_000,
+    targets: int = 5_000,
+    months: int = 12,
+    pending_share: float = 0.01,
+    seed: int = 0,
+) -> dict:
+    """
+    Заявки за последние `months` месяцев: в основном approved/rejected,
+    доля pending — без дублей (user_id, kind, target_id) среди pending.
+    Роллапы статистики пересчитываются по загруженным данным.
+    """
+    rnd = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    span = timedelta(days=30 * months).total_seconds()
+    if conn.dialect.name == "postgresql":
+        partitioned = (
+            await conn.execute(text("SELECT relkind = 'p' FROM pg_class WHERE relname = 'requests'"))
+        ).scalar()
+        if partitioned:
+            first = month_start(now - timedelta(seconds=span))
+            for i in range(months + 2):
+                month = add_months(first, i)
+                await conn.run_sync(lambda sync_conn: create_partition(sync_conn, month))
+    pending_keys = set()
+    created_counts: dict = {}
+    latency_counts: dict = {}
+
+    def rows() -> Iterator[tuple]:
+        for i in range(1, requests + 1):
+            user_id = f"u{rnd.randrange(users)}"
+            kind = "group" if rnd.random() < 0.7 else "access"
+            target_id = rnd.randint(1, targets)
+            created = now - timedelta(seconds=rnd.random() * span)
+            status = "approved" if rnd.random() < 0.8 else "rejected"
+            if rnd.random() < pending_share and (user_id, kind, target_id) not in pending_keys:
+                pending_keys.add((user_id, kind, target_id))
+                status = "pending"
+            updated = created
+            reason = None
+            if status != "pending":
+                latency = rnd.expovariate(1 / 0.5)
+                updated = created + timedelta(seconds=latency)
+                bucket = (stats.hour_bucket(updated), kind, status, stats.latency_bin(latency))
+                latency_counts[bucket] = latency_counts.get(bucket, 0) + 1
+                if status == "rejected":
+                    reason = "Conflicting groups"
+            key = (stats.hour_bucket(created), kind, status)
+            created_counts[key] = created_counts.get(key, 0) + 1
+            yield (i, user_id, kind, target_id, status, reason, created, updated)
+
+    count = await bulk_load(
+        conn,
+        Request.__table__,
+        ("id", "user_id", "kind", "target_id", "status", "reason", "created_at", "updated_at"),
+        rows(),
+    )
+    await bulk_load(
+        conn, RequestStatsHourly.__table__, ("bucket", "kind", "status", "count"),
+        (key + (c,) for key, c in created_counts.items()),
+    )
+    await bulk_load(
+        conn, RequestLatencyHourly.__table__, ("bucket", "kind", "status", "bin", "count"),
+        (key + (c,) for key, c in latency_counts.items()),
+    )
+    return {"requests": count, "pending": len(pending_keys)}
+
+
+async def create_schema(engine: AsyncEngine, base) -> None:
+    """Создать схему через metadata (для SQLite и пустых баз без миграций)."""
+    async with engine.begin() as conn:
+        await conn.run_sync(base.metadata.create_all)
+
+
+async def _main(args: argparse.Namespace) -> None:
+    engine = create_async_engine(args.url)
+    base = {"access": AccessBase, "auth": AuthBase, "requests": RequestBase}[args.service]
+    if args.create_schema:
+        await create_schema(engine, base)
+    async with engine.begin() as conn:
+        if args.service == "access":
+            counts = await generate_access(
+                conn,
+                AccessVolumes(
+                    users=args.users,
+                    groups=args.groups,
+                    accesses=args.accesses,
+                    resources=args.resources,
+                ),
+                seed=args.seed,
+            )
+        elif args.service == "auth":
+            counts = await generate_auth(conn, args.conflicts, args.groups, seed=args.seed)
+        else:
+            counts = await generate_requests(
+                conn, args.requests, args.users, args.groups, seed=args.seed
+            )
+    await engine.dispose()
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.datagen")
+    parser.add_argument("service", choices=("access", "auth", "requests"))
+    parser.add_argument("--url", required=True, help="async SQLAlchemy URL")
+    parser.add_argument("--create-schema", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--groups", type=int, default=5_000)
+    parser.add_argument("--accesses", type=int, default=50_000)
+    parser.add_argument("--resources", type=int, default=10_000)
+    parser.add_argument("--conflicts", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=10_000_000)
+    asyncio.run(_main(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+"""
+Нагрузочный прогон всего конвейера заявок в одном процессе.
+
+Request Service, Access Service и consumer Authorization Service соединяются
+через httpx.ASGITransport и очередь в памяти; базы — SQLite во временном
+каталоге (по умолчанию) или локальный Postgres (--*-db-url; схема создаётся
+через metadata.create_all, без миграций). Переданные базы очищаются
+(metadata.drop_all) только с явным --reset — без него прогон отказывается
+запускаться, чтобы не стереть чужие данные. Для каждой заявки измеряется время
+от POST /requests до записи итогового статуса в Request Service.
+
+Запуск: python -m bench.pipeline --requests 1000 --concurrency 50 --mix group=0.7,access=0.3
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from acs_common import metrics, tracing
+from access_service.app import main as access_main
+from access_service.app import models as access_models
+from access_service.app.db import Base as AccessBase
+from authorization_service.app import consumer
+from authorization_service.app import services as auth_services
+from authorization_service.app.db import Base as AuthBase
+from authorization_service.app.models import ConflictingGroup
+from authorization_service.app.status_batcher import StatusBatcher
+from request_service.app import main as request_main
+from request_service.app import messaging
+from request_service.app.db import Base as RequestBase
+from request_service.app.result_cache import request_cache
+from request_service.app.upstream import AccessProxy
+
+ACCESS_URL = "http://access"
+REQUEST_URL = "http://request"
+
+
+class InMemoryMessage:
+    """Сообщение очереди в памяти с интерфейсом, используемым consumer'ом."""
+
+    def __init__(
+        self,
+        body: bytes,
+        headers: Optional[Dict[str, Any]] = None,
+        queue: "Optional[InMemoryQueue]" = None,
+    ):
+        self.body = body
+        self.headers = headers or {}
+        self.acked = False
+        self.processed = False
+        self._queue = queue
+
+    @contextlib.asynccontextmanager
+    async def process(self, ignore_processed: bool = False):
+        yield self
+        if not self.processed:
+            self.acked = self.processed = True
+
+    async def nack(self, requeue: bool = True) -> None:
+        self.processed = True
+        if requeue and self._queue is not None:
+            await self._queue.publish(self.body, self.headers)
+
+
+class InMemoryQueue:
+    """
+    Очередь в памяти, совместимая по поведению с access_requests:
+    publish() кладёт JSON-сообщение, consume() обрабатывает их не более чем
+    prefetch штук одновременно (аналог QoS prefetch_count).
+    """
+
+    def __init__(self):
+        self._queue: "asyncio.Queue[InMemoryMessage]" = asyncio.Queue()
+        self.failures: List[BaseException] = []
+
+    async def publish(self, body: bytes, headers: Dict[str, Any]) -> None:
+        await self._queue.put(InMemoryMessage(body, headers, self))
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def consume(self, callback, prefetch: int = 10) -> None:
+        async def worker():
+            while True:
+                message = await self._queue.get()
+                try:
+                    await callback(message)
+                except Exception as exc:  # the pipeline must keep running
+                    self.failures.append(exc)
+                finally:
+                    self._queue.task_done()
+
+        await asyncio.gather(*[worker() for _ in range(prefetch)])
+
+
+class RoutingTransport(httpx.AsyncBaseTransport):
+    """Направляет запросы в ASGI-приложение по имени хоста и отмечает решения."""
+
+    def __init__(self, routes: Dict[str, httpx.ASGITransport], on_batch=None):
+        self._routes = routes
+        self._on_batch = on_batch
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._routes[request.url.host].handle_async_request(request)
+        if self._on_batch and request.url.path == "/requests/status:batch":
+            await response.aread()
+            self._on_batch(response.json()["results"])
+        return response
+
+
+@dataclass
+class PipelineReport:
+    requests: int
+    completed: int
+    failed: int
+    elapsed: float
+    latencies: List[float] = field(repr=False)
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def as_dict(self) -> Dict[str, Any]:
+        ms = lambda v: round(v * 1000, 3) if v is not None else None  # noqa: E731
+        return {
+            "requests": self.requests,
+            "completed": self.completed,
+            "failed": self.failed,
+            "elapsed_s": round(self.elapsed, 3),
+            "throughput_rps": round(self.throughput, 1),
+            "p50_ms": ms(self.percentile(0.50)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "statuses": self.statuses,
+        }
+
+
+async def _make_factory(
+    url: str, base, writer: bool = True, reset: bool = False
+) -> async_sessionmaker:
+    """
+    Движок и фабрика сессий базы прогона. reset — удалить таблицы схемы
+    перед созданием; без него база должна быть пустой (временная SQLite).
+    """
+    kwargs = {}
+    if url.startswith("sqlite") and writer:
+        # SQLite allows one writer; concurrent write transactions deadlock on
+        # lock upgrade, so writers share a single pooled connection
+        kwargs = {
+            "poolclass": AsyncAdaptedQueuePool,
+            "pool_size": 1,
+            "max_overflow": 0,
+            "pool_timeout": 300,
+        }
+    engine = create_async_engine(url, **kwargs)
+    if url.startswith("sqlite"):
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _pragmas(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+
+    async with engine.begin() as conn:
+        if reset:
+            await conn.run_sync(base.metadata.drop_all)
+        await conn.run_sync(base.metadata.create_all)
+    return async_sessionmaker(bind=engine, expire_on_commit=False)
+
+
+async def _seed(access_factory, auth_factory) -> None:
+    """Те же справочники, что в сидах миграций Access и Authorization."""
+    async with access_factory() as s:
+        accesses = {c: access_models.Access(code=c) for c in ("DB_READ", "DB_WRITE", "API_KEY")}
+        groups = {c: access_models.RightGroup(code=c) for c in ("DEVELOPER", "DB_ADMIN", "OWNER")}
+        s.add_all([*accesses.values(), *groups.values()])
+        await s.flush()
+        for g, a in (("DEVELOPER", "API_KEY"), ("DB_ADMIN", "DB_READ"), ("DB_ADMIN", "DB_WRITE")):
+            s.add(access_models.GroupAccess(group_id=groups[g].id, access_id=accesses[a].id))
+        await s.commit()
+    async with auth_factory() as s:
+        s.add(ConflictingGroup(group_code_a="DEVELOPER", group_code_b="OWNER"))
+        await s.commit()
+
+
+def _parse_mix(mix: str) -> List[Tuple[str, float]]:
+    items = []
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        items.append((kind.strip(), float(weight or 1)))
+    return items
+
+
+class Pipeline:
+    """
+    Собранный в одном процессе конвейер. Использование:
+
+        async with Pipeline() as p:
+            report = await p.run(requests=500, concurrency=50)
+    """
+
+    def __init__(
+        self,
+        access_db_url: Optional[str] = None,
+        auth_db_url: Optional[str] = None,
+        request_db_url: Optional[str] = None,
+        prefetch: int = 10,
+        reset: bool = False,
+    ):
+        """reset — разрешить очистку переданных баз (drop_all перед прогоном)."""
+        self._urls = (access_db_url, auth_db_url, request_db_url)
+        if any(self._urls) and not reset:
+            raise ValueError(
+                "Passed databases are wiped before the run; pass reset=True (--reset)"
+            )
+        self._prefetch = prefetch
+        self._patches: List[Tuple[Any, str, Any]] = []
+        self._done: Dict[int, Tuple[float, str]] = {}
+        self._events: Dict[int, asyncio.Event] = {}
+        self._tmp: Optional[tempfile.TemporaryDirectory] = None
+        self._consumer_task: Optional[asyncio.Task] = None
+        self.queue = InMemoryQueue()
+
+    def _patch(self, obj: Any, name: str, value: Any) -> None:
+        self._patches.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+
+    def _on_batch(self, results: List[Dict[str, Any]]) -> None:
+        now = time.perf_counter()
+        for r in results:
+            if r["found"] and r["request"]["status"] != "pending":
+                rid = r["request_id"]
+                self._done[rid] = (now, r["request"]["status"])
+                event = self._events.get(rid)
+                if event is not None:
+                    event.set()
+
+    async def __aenter__(self) -> "Pipeline":
+        self._tmp = tempfile.TemporaryDirectory()
+        tmp = Path(self._tmp.name)
+        access_url, auth_url, request_url = (
+            url or f"sqlite+aiosqlite:///{tmp / name}.db"
+            for url, name in zip(self._urls, ("access", "auth", "request"))
+        )
+        # временные SQLite пусты; переданные базы — только с reset
+        access_factory = await _make_factory(
+            access_url, AccessBase, reset=bool(self._urls[0])
+        )
+        auth_factory = await _make_factory(
+            auth_url, AuthBase, writer=False, reset=bool(self._urls[1])
+        )
+        request_factory = await _make_factory(
+            request_url, RequestBase, reset=bool(self._urls[2])
+        )
+        self._factories = (access_factory, auth_factory, request_factory)
+        for factory, db in (
+            (access_factory, "access"),
+            (auth_factory, "auth"),
+            (request_factory, "request"),
+        ):
+            for module in (metrics, tracing):
+                module.instrument_engine(factory.kw["bind"], db)
+        await _seed(access_factory, auth_factory)
+        # кэш заявок процесса помнит id из прежних баз
+        request_cache.clear()
+
+        def override(factory):
+            async def _get_session():
+                async with factory() as s:
+                    yield s
+
+            return _get_session
+
+        for main, factory in ((access_main, access_factory), (request_main, request_factory)):
+            main.app.dependency_overrides[main.get_session] = override(factory)
+            main.app.dependency_overrides[main.get_read_session] = override(factory)
+
+        transport = RoutingTransport(
+            {
+                "access": httpx.ASGITransport(app=access_main.app),
+                "request": httpx.ASGITransport(app=request_main.app),
+            },
+            on_batch=self._on_batch,
+        )
+        self._clients = [
+            httpx.AsyncClient(
+                transport=tracing.TracingTransport(transport),
+                event_hooks=metrics.httpx_event_hooks(),
+            )
+            for _ in range(3)
+        ]
+        internal, batcher_client, proxy_client = self._clients
+        self._patch(messaging, "publisher", self.queue)
+        self._patch(request_main, "access_proxy", AccessProxy(ACCESS_URL, client=proxy_client))
+        self._patch(consumer, "ACCESS_SERVICE_URL", ACCESS_URL)
+        self._patch(consumer, "REQUEST_SERVICE_URL", REQUEST_URL)
+        self._patch(consumer, "async_session_factory", auth_factory)
+        self._patch(auth_services, "decision_cache", auth_services.ConflictDecisionCache())
+        self._patch(consumer, "http_client", internal)
+        self._patch(
+            consumer,
+            "status_batcher",
+            StatusBatcher(f"{REQUEST_URL}/requests/status:batch", client=batcher_client),
+        )
+        # приложение Authorization не поднимается: имя сервиса для спанов consumer'а
+        with tracing.service_scope("authorization_service"):
+            self._consumer_task = asyncio.create_task(
+                self.queue.consume(consumer.process_message, prefetch=self._prefetch)
+            )
+        self.client = httpx.AsyncClient(transport=transport, base_url=REQUEST_URL)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._consumer_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._consumer_task
+        await consumer.status_batcher.aclose()
+        for obj, name, value in reversed(self._patches):
+            setattr(obj, name, value)
+        for main in (access_main, request_main):
+            main.app.dependency_overrides.pop(main.get_session, None)
+            main.app.dependency_overrides.pop(main.get_read_session, None)
+        await self.client.aclose()
+        for client in self._clients:
+            await client.aclose()
+        for factory in self._factories:
+            await factory.kw["bind"].dispose()
+        self._tmp.cleanup()
+
+    async def run(
+        self,
+        requests: int = 200,
+        concurrency: int = 20,
+        users: int = 50,
+        mix: str = "group=0.7,access=0.3",
+        timeout: float = 60.0,
+        seed: int = 0,
+    ) -> PipelineReport:
+        """
+        Прогнать `requests` заявок с не более чем `concurrency` одновременными
+        клиентами. Цели: группы 1..3 и доступы 1..3 (включая конфликт
+        DEVELOPER/OWNER), пользователи u0..u{users-1}.
+        """
+        rnd = random.Random(seed)
+        kinds, weights = zip(*_parse_mix(mix))
+        plan = [
+            (f"u{rnd.randrange(users)}", rnd.choices(kinds, weights)[0], rnd.randint(1, 3))
+            for _ in range(requests)
+        ]
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+        failed = 0
+
+        async def one(user_id: str, kind: str, target_id: int) -> None:
+            nonlocal failed
+            async with semaphore:
+                started = time.perf_counter()
+                r = await self.client.post(
+                    "/requests", json={"user_id": user_id, "kind": kind, "target_id": target_id}
+                )
+                if r.status_code != 200:
+                    failed += 1
+                    return
+                body = r.json()
+                rid = body["id"]
+                if body["status"] == "pending" and rid not in self._done:
+                    event = self._events.setdefault(rid, asyncio.Event())
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        failed += 1
+                        return
+                finished, status = self._done.get(rid, (time.perf_counter(), body["status"]))
+                latencies.append(max(finished - started, 0.0))
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one(*item) for item in plan])
+        elapsed = time.perf_counter() - started
+        return PipelineReport(
+            requests=requests,
+            completed=len(latencies),
+            failed=failed,
+            elapsed=elapsed,
+            latencies=latencies,
+            statuses=statuses,
+        )
+
+
+async def _main(args: argparse.Namespace) -> None:
+    async with Pipeline(
+        access_db_url=args.access_db_url,
+        auth_db_url=args.auth_db_url,
+        request_db_url=args.request_db_url,
+        prefetch=args.prefetch,
+        reset=args.reset,
+    ) as pipeline:
+        report = await pipeline.run(
+            requests=args.requests,
+            concurrency=args.concurrency,
+            users=args.users,
+            mix=args.mix,
+            seed=args.seed,
+        )
+    print(json.dumps(report.as_dict(), ensure_ascii=False))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.pipeline")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--mix", default="group=0.7,access=0.3")
+    parser.add_argument("--prefetch", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--access-db-url")
+    parser.add_argument("--auth-db-url")
+    parser.add_argument("--request-db-url")
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="drop and recreate the tables of the passed --*-db-url databases",
+    )
+    args = parser.parse_args(argv)
+    if (args.access_db_url or args.auth_db_url or args.request_db_url) and not args.reset:
+        parser.error("--*-db-url databases are wiped before the run; add --reset")
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
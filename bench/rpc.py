@@ -0,0 +1,159 @@
+"""
+Накладные расходы на вызов Access из consumer'а: JSON/HTTP против
+бинарного RPC (msgpack по TCP и Unix-сокету).
+
+Access Service поднимается в процессе: uvicorn на 127.0.0.1 для HTTP и
+RpcServer для RPC, обе стороны читают одну и ту же БД (временный SQLite
+или --db-url). Вызовы get_user_rights/get_group выполняются через
+реализации AccessClient, которыми пользуется consumer.
+
+Запуск: python -m bench.rpc --calls 2000 --concurrency 1
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import uvicorn
+
+from access_service.app import db as access_db
+from access_service.app import main as access_main
+from access_service.app import models as access_models
+from access_service.app import rpc
+from access_service.app.db import Base as AccessBase
+from authorization_service.app.access_client import HttpAccessClient, RpcAccessClient
+
+from .pipeline import _make_factory
+
+
+async def _seed(factory, users: int) -> None:
+    async with factory() as s:
+        groups = [access_models.RightGroup(code=f"GROUP_{i}") for i in range(5)]
+        s.add_all(groups)
+        await s.flush()
+        s.add_all(
+            access_models.UserGroup(user_id=f"user-{u}", group_id=groups[u % 5].id)
+            for u in range(users)
+        )
+        await s.commit()
+
+
+async def _measure(client, calls: int, concurrency: int, users: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    counter = iter(range(calls))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            if i % 2:
+                await client.get_group(1 + i % 5)
+            else:
+                await client.get_user_rights(f"user-{i % users}")
+            latencies.append(time.perf_counter() - started)
+
+    # прогрев: соединения и кэши подготовленных выражений
+    for i in range(20):
+        await client.get_user_rights(f"user-{i % users}")
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "calls_per_sec": round(calls / elapsed, 1),
+        "mean_us": round(statistics.fmean(latencies) * 1e6, 1),
+        "p50_us": round(latencies[len(latencies) // 2] * 1e6, 1),
+        "p99_us": round(latencies[int(len(latencies) * 0.99) - 1] * 1e6, 1),
+    }
+
+
+async def run(
+    calls: int = 2000,
+    concurrency: int = 1,
+    users: int = 100,
+    db_url: Optional[str] = None,
+) -> Dict[str, Dict[str, float]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = db_url or f"sqlite+aiosqlite:///{Path(tmp) / 'access.db'}"
+        factory = await _make_factory(url, AccessBase, writer=False)
+        await _seed(factory, users)
+        saved = access_db.async_session_factory, access_db.read_session_factory
+        access_db.async_session_factory = access_db.read_session_factory = factory
+
+        async def _get_session():
+            async with factory() as s:
+                yield s
+
+        overrides = access_main.app.dependency_overrides
+        overrides[access_main.get_session] = _get_session
+        overrides[access_main.get_read_session] = _get_session
+
+        server = uvicorn.Server(
+            uvicorn.Config(
+                access_main.app,
+                host="127.0.0.1",
+                port=0,
+                lifespan="off",
+                log_level="warning",
+                access_log=False,
+            )
+        )
+        serve_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+
+        rpc_server = rpc.RpcServer()
+        await rpc_server.start("tcp://127.0.0.1:0")
+        rpc_port = rpc_server.sockets[0].getsockname()[1]
+        sock = Path(tmp) / "access.sock"
+        uds_server = rpc.RpcServer()
+        await uds_server.start(f"unix://{sock}")
+
+        http = httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency))
+        clients = {
+            "http_json": HttpAccessClient(f"http://127.0.0.1:{port}", http),
+            "rpc_tcp": RpcAccessClient(f"tcp://127.0.0.1:{rpc_port}"),
+            "rpc_unix": RpcAccessClient(f"unix://{sock}"),
+        }
+        report = {}
+        try:
+            for name, client in clients.items():
+                report[name] = await _measure(client, calls, concurrency, users)
+        finally:
+            await http.aclose()
+            for name in ("rpc_tcp", "rpc_unix"):
+                await clients[name].aclose()
+            await rpc_server.close()
+            await uds_server.close()
+            server.should_exit = True
+            await serve_task
+            overrides.pop(access_main.get_session, None)
+            overrides.pop(access_main.get_read_session, None)
+            access_db.async_session_factory, access_db.read_session_factory = saved
+            await factory.kw["bind"].dispose()
+
+    base = report["http_json"]["mean_us"]
+    for name in ("rpc_tcp", "rpc_unix"):
+        report[name]["saved_us_per_call"] = round(base - report[name]["mean_us"], 1)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.rpc")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--db-url", default=None)
+    args = parser.parse_args(argv)
+    report = asyncio.run(run(args.calls, args.concurrency, args.users, args.db_url))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
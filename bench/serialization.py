@@ -0,0 +1,187 @@
+"""
+Стоимость сериализации ответа GET /user/{user_id}/rights: прежний путь
+(ORM-объекты -> pydantic-модели -> повторная валидация response_model ->
+json) против быстрого (кортежи строк -> orjson или msgpack).
+
+Прежний путь воспроизводится отдельным маршрутом в приложении бенчмарка
+поверх тех же функций репозитория, быстрый — настоящий маршрут Access.
+Запросы идут в процессе через ASGI-транспорт httpx, поэтому учитывается
+процессорное время всего запроса (time.process_time), без сети. Отдельно
+измеряется только кодирование готового ответа.
+
+Запуск: python -m bench.serialization --calls 500 --accesses 700
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import msgpack
+import orjson
+from fastapi import Depends, FastAPI
+
+from access_service.app import main as access_main
+from access_service.app import models as access_models
+from access_service.app import repositories as access_repo
+from access_service.app import schemas as access_schemas
+from access_service.app.db import Base as AccessBase
+
+from .pipeline import _make_factory
+
+USER = "user-1"
+
+
+async def _seed(factory, accesses: int, groups: int) -> None:
+    async with factory() as s:
+        items = [access_models.Access(code=f"ACCESS_{i}") for i in range(accesses)]
+        group_items = [access_models.RightGroup(code=f"GROUP_{i}") for i in range(groups)]
+        s.add_all(items + group_items)
+        await s.flush()
+        # половина доступов — прямые, остальные — через группы
+        direct, via_groups = items[: accesses // 2], items[accesses // 2 :]
+        s.add_all(access_models.UserAccess(user_id=USER, access_id=a.id) for a in direct)
+        s.add_all(access_models.UserGroup(user_id=USER, group_id=g.id) for g in group_items)
+        s.add_all(
+            access_models.GroupAccess(group_id=group_items[i % groups].id, access_id=a.id)
+            for i, a in enumerate(via_groups)
+        )
+        await s.commit()
+
+
+def _legacy_app(get_session) -> FastAPI:
+    """Маршрут прав в том виде, как он был до быстрого пути."""
+    app = FastAPI()
+
+    @app.get("/user/{user_id}/rights", response_model=access_schemas.UserRightsResponse)
+    async def legacy_rights(user_id: str, session=Depends(get_session)):
+        groups = await access_repo.get_user_groups(session, user_id)
+        direct = await access_repo.get_user_direct_accesses(session, user_id)
+        via_groups = await access_repo.get_accesses_for_groups(session, [g.id for g in groups])
+        effective = {a.id: a for a in direct}
+        for a in via_groups:
+            effective.setdefault(a.id, a)
+        return access_schemas.UserRightsResponse(
+            user_id=user_id,
+            groups=[access_schemas.GroupOut(id=g.id, code=g.code) for g in groups],
+            direct_accesses=[access_schemas.AccessOut(id=a.id, code=a.code) for a in direct],
+            effective_accesses=[
+                access_schemas.AccessOut(id=a.id, code=a.code) for a in effective.values()
+            ],
+        )
+
+    return app
+
+
+async def _measure(client: httpx.AsyncClient, calls: int, headers: Dict[str, str]) -> dict:
+    for _ in range(10):
+        (await client.get(f"/user/{USER}/rights", headers=headers)).raise_for_status()
+    cpu, wall = time.process_time(), time.perf_counter()
+    size = 0
+    for _ in range(calls):
+        response = await client.get(f"/user/{USER}/rights", headers=headers)
+        size = len(response.content)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return {
+        "cpu_us_per_request": round(cpu / calls * 1e6, 1),
+        "wall_us_per_request": round(wall / calls * 1e6, 1),
+        "body_bytes": size,
+    }
+
+
+def _encode_only(payload: dict, rounds: int) -> Dict[str, float]:
+    """Только кодирование: модели pydantic + валидация response_model против orjson/msgpack."""
+
+    def legacy():
+        model = access_schemas.UserRightsResponse(
+            user_id=payload["user_id"],
+            groups=[access_schemas.GroupOut(**g) for g in payload["groups"]],
+            direct_accesses=[access_schemas.AccessOut(**a) for a in payload["direct_accesses"]],
+            effective_accesses=[
+                access_schemas.AccessOut(**a) for a in payload["effective_accesses"]
+            ],
+        )
+        # FastAPI повторно валидирует возвращённую модель по response_model
+        validated = access_schemas.UserRightsResponse.model_validate(model.model_dump())
+        return json.dumps(validated.model_dump(mode="json")).encode()
+
+    encoders = {
+        "legacy_pydantic_json": legacy,
+        "orjson": lambda: orjson.dumps(payload),
+        "msgpack": lambda: msgpack.packb(payload, use_bin_type=True),
+    }
+    report = {}
+    for name, encode in encoders.items():
+        started = time.process_time()
+        for _ in range(rounds):
+            encode()
+        report[name] = round((time.process_time() - started) / rounds * 1e6, 1)
+    return report
+
+
+async def run(
+    calls: int = 500,
+    accesses: int = 700,
+    groups: int = 5,
+    db_url: Optional[str] = None,
+) -> Dict[str, dict]:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = db_url or f"sqlite+aiosqlite:///{Path(tmp) / 'access.db'}"
+        factory = await _make_factory(url, AccessBase, writer=False)
+        await _seed(factory, accesses, groups)
+
+        async def _get_session():
+            async with factory() as s:
+                yield s
+
+        overrides = access_main.app.dependency_overrides
+        overrides[access_main.get_read_session] = _get_session
+        apps = {
+            "legacy": (_legacy_app(_get_session), {}),
+            "orjson": (access_main.app, {"accept": "application/json"}),
+            "msgpack": (access_main.app, {"accept": "application/x-msgpack"}),
+        }
+        report: Dict[str, dict] = {}
+        try:
+            for name, (app, headers) in apps.items():
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                    report[name] = await _measure(client, calls, headers)
+            async with factory() as s:
+                groups_rows, direct, effective = await access_repo.get_user_rights(s, USER)
+        finally:
+            overrides.pop(access_main.get_read_session, None)
+            await factory.kw["bind"].dispose()
+
+    base = report["legacy"]["cpu_us_per_request"]
+    for name in ("orjson", "msgpack"):
+        report[name]["cpu_us_saved_per_request"] = round(
+            base - report[name]["cpu_us_per_request"], 1
+        )
+    payload = {
+        "user_id": USER,
+        "groups": [{"id": i, "code": c} for i, c in groups_rows],
+        "direct_accesses": [{"id": i, "code": c} for i, c in direct],
+        "effective_accesses": [{"id": i, "code": c} for i, c in effective],
+    }
+    report["encode_only_us"] = _encode_only(payload, max(calls, 100))
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.serialization")
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--accesses", type=int, default=700)
+    parser.add_argument("--groups", type=int, default=5)
+    parser.add_argument("--db-url", default=None)
+    args = parser.parse_args(argv)
+    report = asyncio.run(run(args.calls, args.accesses, args.groups, args.db_url))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Общий код сервисов Access Control System: трассировка (tracing), метрики
+(metrics), устойчивые исходящие вызовы (resilience), сериализация ответов
+(serialization) и подключение к БД с пулом и репликой (db).
+Устанавливается в образ каждого сервиса как зависимость.
+"""
@@ -0,0 +1,119 @@
+"""
+Подключение сервисов к БД: пул соединений, драйвер и чтения с реплики.
+
+Настройки пула одинаковы во всех сервисах (DB_* из окружения); каждый
+сервис передаёт только свои URL и метку движка для метрик и трассировки.
+Чтения по ключу (обычно user_id) идут на реплику, пока процесс недавно
+не писал по этому ключу (RecentWrites, read-your-writes в пределах
+процесса).
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from . import metrics, tracing
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+# Кэш подготовленных выражений на соединение (asyncpg); 0 — отключить (pgbouncer).
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# Сколько секунд после записи чтения по тому же ключу идут в основную БД.
+DB_READ_FALLBACK_SECONDS = float(os.getenv("DB_READ_FALLBACK_SECONDS", "5"))
+
+
+def engine_options(url: str) -> dict:
+    """Параметры пула и драйвера для create_async_engine из настроек DB_*."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        return {}
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if parsed.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE
+        }
+    return options
+
+
+def make_engine(url: str, db: str) -> AsyncEngine:
+    """Движок с настройками пула, метриками и спанами SQL под меткой db."""
+    engine = create_async_engine(url, echo=False, future=True, **engine_options(url))
+    metrics.instrument_engine(engine, db)
+    tracing.instrument_engine(engine, db)
+    return engine
+
+
+def session_factory(engine: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+
+
+def replica_factory(
+    url: Optional[str], db: str, primary: async_sessionmaker
+) -> async_sessionmaker:
+    """Фабрика сессий реплики по url; без реплики — основная фабрика."""
+    if not url:
+        return primary
+    return session_factory(make_engine(url, db))
+
+
+class RecentWrites:
+    """
+    Ключи (обычно user_id), по которым процесс недавно писал в основную БД.
+    Пока запись «свежая», чтения по ключу не уходят на реплику, которая
+    могла её ещё не получить (read-your-writes в пределах процесса).
+    """
+
+    def __init__(self, window: float = DB_READ_FALLBACK_SECONDS, max_keys: int = 100_000):
+        self.window = window
+        self.max_keys = max_keys
+        self._written: "OrderedDict[str, float]" = OrderedDict()
+
+    def mark(self, key: str) -> None:
+        self._written[key] = time.monotonic()
+        self._written.move_to_end(key)
+        while len(self._written) > self.max_keys:
+            self._written.popitem(last=False)
+
+    def is_recent(self, key: str) -> bool:
+        written = self._written.get(key)
+        if written is None:
+            return False
+        if time.monotonic() - written < self.window:
+            return True
+        del self._written[key]
+        return False
+
+
+def read_factory(
+    primary: async_sessionmaker,
+    replica: async_sessionmaker,
+    recent_writes: RecentWrites,
+    key: Optional[str] = None,
+    consistent: bool = False,
+) -> async_sessionmaker:
+    """
+    Фабрика сессий для чтения: реплика, если нет свежей записи по ключу.
+    consistent — читать основную БД (решения, которые нельзя принимать по
+    отставшей реплике).
+    """
+    if consistent or (key is not None and recent_writes.is_recent(key)):
+        return primary
+    return replica
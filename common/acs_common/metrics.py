@@ -0,0 +1,345 @@
+"""
+Лёгкие метрики в текстовом формате Prometheus (без внешних зависимостей).
+
+Наблюдение в гистограмму — bisect по границам и инкремент в списке,
+порядка микросекунды. Экспортируются на GET /metrics.
+
+Здесь реестр, общие для всех сервисов метрики (HTTP, SQL, пул, исходящие
+вызовы и автоматы отключения) и их подключение; метрики конкретного
+сервиса регистрируются в том же REGISTRY его модулем app.metrics.
+"""
+
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Монотонный счётчик; значения можно отдавать функцией при сборе."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Callable[[], Dict[Tuple[str, ...], float]] = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def inc(self, *labels: str, value: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        values = self._callback() if self._callback else self._values
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge:
+    """Мгновенное значение; либо set(), либо функция, вызываемая при сборе."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Callable[[], Dict[Tuple[str, ...], float]] = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        values = self._callback() if self._callback else self._values
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labelnames + ("le",)
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                yield f"{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}"
+            base = _labels(self.labelnames, labels)
+            yield f"{self.name}_sum{base} {series[-1]}"
+            yield f"{self.name}_count{base} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Latency of handled HTTP requests by route template.",
+        ("method", "route", "status"),
+    )
+)
+DB_QUERY_LATENCY = REGISTRY.register(
+    Histogram("db_query_duration_seconds", "SQL statement execution time.", ("db",))
+)
+DB_POOL_IN_USE = REGISTRY.register(
+    Gauge(
+        "db_pool_connections_in_use",
+        "Connections checked out of the pool.",
+        ("db",),
+    )
+)
+DB_CONNECT_LATENCY = REGISTRY.register(
+    Histogram(
+        "db_connect_duration_seconds",
+        "Time to open a new database connection for the pool.",
+        ("db",),
+    )
+)
+HTTP_CLIENT_LATENCY = REGISTRY.register(
+    Histogram(
+        "http_client_request_duration_seconds",
+        "Outbound HTTP call latency by target host.",
+        ("target", "method", "status"),
+    )
+)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: задержка каждого HTTP-запроса по шаблону маршрута."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_LATENCY.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status),
+            )
+
+
+def setup_metrics(app: FastAPI) -> None:
+    """Подключить middleware и маршрут GET /metrics к приложению."""
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(
+            REGISTRY.render(), media_type="text/plain; version=0.0.4"
+        )
+
+
+def instrument_engine(engine: AsyncEngine, db: str) -> None:
+    """
+    Считать длительность SQL-запросов, занятые соединения пула и время
+    открытия новых соединений — только по публичным событиям движка и пула.
+    У пула нет события начала ожидания, поэтому нехватка соединений видна
+    по db_pool_connections_in_use, упёршемуся в размер пула.
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        DB_QUERY_LATENCY.observe(time.perf_counter() - started, db)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        # after_cursor_execute не вызывается: снять метку упавшего запроса
+        conn = exception_context.connection
+        started = conn.info.get("query_started") if conn is not None else None
+        if started:
+            started.pop()
+
+    @event.listens_for(sync_engine, "do_connect")
+    def _connecting(dialect, connection_record, cargs, cparams):
+        connection_record.info["connect_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "connect")
+    def _connected(dbapi_connection, connection_record):
+        started = connection_record.info.pop("connect_started", None)
+        if started is not None:
+            DB_CONNECT_LATENCY.observe(time.perf_counter() - started, db)
+
+    def in_use(delta: int) -> None:
+        DB_POOL_IN_USE.set(DB_POOL_IN_USE.get(db) + delta, db)
+
+    @event.listens_for(sync_engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        in_use(1)
+
+    @event.listens_for(sync_engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        in_use(-1)
+
+    @event.listens_for(sync_engine, "detach")
+    def _detach(dbapi_connection, connection_record):
+        # отсоединённое соединение закрывается без checkin
+        in_use(-1)
+
+
+def httpx_event_hooks() -> Dict[str, list]:
+    """event_hooks для httpx.AsyncClient: задержка исходящих вызовов по хосту."""
+
+    async def on_request(request: httpx.Request) -> None:
+        request.extensions["metrics_started"] = time.perf_counter()
+
+    async def on_response(response: httpx.Response) -> None:
+        request = response.request
+        started = request.extensions.get("metrics_started")
+        if started is not None:
+            HTTP_CLIENT_LATENCY.observe(
+                time.perf_counter() - started,
+                request.url.netloc.decode("ascii"),
+                request.method,
+                str(response.status_code),
+            )
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def _circuit_states() -> Dict[Tuple[str, ...], float]:
+    from .resilience import OPEN, HALF_OPEN, clients
+
+    codes = {HALF_OPEN: 1, OPEN: 2}
+    return {
+        (endpoint,): codes.get(breaker.state, 0)
+        for client in list(clients)
+        for endpoint, breaker in client.breakers.items()
+    }
+
+
+def _resilience_events() -> Dict[Tuple[str, ...], float]:
+    from .resilience import clients
+
+    values: Dict[Tuple[str, ...], float] = {}
+    for client in list(clients):
+        for endpoint, breaker in client.breakers.items():
+            for event, count in (
+                ("short_circuit", breaker.short_circuits),
+                ("hedged", client.hedged.get(endpoint, 0)),
+                ("deadline_exceeded", client.deadline_exceeded.get(endpoint, 0)),
+            ):
+                key = (endpoint, event)
+                values[key] = values.get(key, 0) + count
+    return values
+
+
+HTTP_CLIENT_CIRCUIT_STATE = REGISTRY.register(
+    Gauge(
+        "http_client_circuit_state",
+        "Circuit breaker state per outbound endpoint (0 closed, 1 half-open, 2 open).",
+        ("endpoint",),
+        callback=_circuit_states,
+    )
+)
+HTTP_CLIENT_RESILIENCE_EVENTS = REGISTRY.register(
+    Counter(
+        "http_client_resilience_events_total",
+        "Outbound calls short-circuited, hedged or cut by the deadline, per endpoint.",
+        ("endpoint", "event"),
+        callback=_resilience_events,
+    )
+)
@@ -0,0 +1,321 @@
+"""
+Устойчивость исходящих HTTP-вызовов: автоматы отключения, хеджирование
+GET и бюджет времени (deadline), передаваемый вниз по цепочке.
+
+- CircuitBreaker на каждую конечную точку: после failure_threshold ошибок
+  подряд (исключение транспорта или 5xx) вызовы отклоняются сразу
+  (CircuitOpenError) в течение reset_timeout, затем пропускается пробный
+  вызов (half-open): успех закрывает автомат, ошибка открывает снова.
+- Хеджирование GET: если ответа нет дольше p95 задержки конечной точки,
+  отправляется второй такой же запрос и берётся первый пришедший ответ,
+  второй отменяется.
+- Deadline: абсолютный срок в contextvar; таймаут каждого вызова — не
+  больше остатка бюджета, остаток уходит вниз в заголовке X-Deadline-Ms.
+  Входящий бюджет принимает DeadlineMiddleware (HTTP) или deadline_scope()
+  (сообщения очереди). Истёкший бюджет — DeadlineExceeded без вызова.
+
+CircuitOpenError и DeadlineExceeded — подклассы ошибок httpx, поэтому
+существующая обработка ошибок транспорта их покрывает.
+"""
+
+import asyncio
+import contextlib
+import time
+import weakref
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+import httpx
+
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Автомат конечной точки открыт: вызов отклонён без обращения к сети."""
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """Бюджет времени исчерпан до или во время вызова."""
+
+
+def remaining() -> Optional[float]:
+    """Остаток бюджета текущего контекста в секундах (None — без срока)."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@contextlib.contextmanager
+def deadline_scope(budget: Optional[float]) -> Iterator[None]:
+    """Ограничить блок бюджетом budget секунд (вложенный срок не продлевается)."""
+    if budget is None:
+        yield
+        return
+    deadline = time.monotonic() + budget
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def budget_from_header(value: Optional[str]) -> Optional[float]:
+    """Бюджет в секундах из заголовка X-Deadline-Ms (None — нет или некорректен)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value) / 1000)
+    except ValueError:
+        return None
+
+
+class DeadlineMiddleware:
+    """ASGI-middleware: бюджет запроса из X-Deadline-Ms или default_budget."""
+
+    def __init__(self, app, default_budget: Optional[float] = None):
+        self.app = app
+        self.default_budget = default_budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget = self.default_budget
+        header = DEADLINE_HEADER.lower().encode("latin-1")
+        for key, value in scope.get("headers", ()):
+            if key == header:
+                incoming = budget_from_header(value.decode("latin-1"))
+                if incoming is not None:
+                    budget = incoming if budget is None else min(budget, incoming)
+                break
+        with deadline_scope(budget):
+            await self.app(scope, receive, send)
+
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+
+class CircuitBreaker:
+    """Автомат отключения по ошибкам подряд с пробным вызовом после паузы."""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe = False
+        self.short_circuits = 0
+
+    def allow(self) -> bool:
+        """Можно ли выполнить вызов; в half-open — один пробный за раз."""
+        if self.state == OPEN:
+            if self._clock() - self._opened_at < self.reset_timeout:
+                self.short_circuits += 1
+                return False
+            self.state = HALF_OPEN
+            self._probe = False
+        if self.state == HALF_OPEN:
+            if self._probe:
+                self.short_circuits += 1
+                return False
+            self._probe = True
+        return True
+
+    def cancel(self) -> None:
+        """Вызов завершился без исхода (отмена, бюджет вызывающего): освободить пробу."""
+        self._probe = False
+
+    def record(self, ok: bool) -> None:
+        if ok:
+            self.state = CLOSED
+            self.failures = 0
+            self._probe = False
+            return
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self._opened_at = self._clock()
+            self._probe = False
+
+
+class LatencyWindow:
+    """Скользящее окно последних задержек для порога хеджирования."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# все клиенты процесса — для метрик
+clients: "weakref.WeakSet[ResilientClient]" = weakref.WeakSet()
+
+
+class ResilientClient:
+    """
+    Обёртка над httpx.AsyncClient: автомат на конечную точку, хеджирование
+    GET после p95 и таймаут по остатку бюджета. Конечная точка — строка
+    endpoint (шаблон пути), по умолчанию "METHOD host".
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        timeout: float = 10.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 5.0,
+        hedge: bool = True,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        propagate_deadline: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.client = client
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.propagate_deadline = propagate_deadline
+        self._clock = clock
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies: Dict[str, LatencyWindow] = {}
+        self.hedged: Dict[str, int] = {}
+        self.deadline_exceeded: Dict[str, int] = {}
+        clients.add(self)
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(
+                self.failure_threshold, self.reset_timeout, self._clock
+            )
+        return breaker
+
+    async def get(self, url: str, endpoint: Optional[str] = None, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, endpoint, **kwargs)
+
+    async def post(self, url: str, endpoint: Optional[str] = None, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, endpoint, **kwargs)
+
+    async def patch(self, url: str, endpoint: Optional[str] = None, **kwargs: Any) -> httpx.Response:
+        return await self.request("PATCH", url, endpoint, **kwargs)
+
+    async def request(
+        self, method: str, url: str, endpoint: Optional[str] = None, **kwargs: Any
+    ) -> httpx.Response:
+        endpoint = endpoint or f"{method} {httpx.URL(url).host}"
+        breaker = self.breaker(endpoint)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {endpoint} is open")
+        window = self.latencies.setdefault(endpoint, LatencyWindow())
+        started = time.perf_counter()
+        try:
+            if method == "GET" and self.hedge and len(window) >= self.hedge_min_samples:
+                response = await self._hedged(
+                    endpoint, window.percentile(self.hedge_quantile), method, url, kwargs
+                )
+            else:
+                response = await self._attempt(endpoint, method, url, kwargs)
+        except DeadlineExceeded:
+            # бюджет вызывающего исчерпан — не вина конечной точки
+            self.deadline_exceeded[endpoint] = self.deadline_exceeded.get(endpoint, 0) + 1
+            breaker.cancel()
+            raise
+        except httpx.TransportError:
+            breaker.record(False)
+            raise
+        except BaseException:
+            breaker.cancel()
+            raise
+        ok = response.status_code < 500
+        breaker.record(ok)
+        if ok:
+            window.add(time.perf_counter() - started)
+        return response
+
+    async def _attempt(
+        self, endpoint: str, method: str, url: str, kwargs: Dict[str, Any]
+    ) -> httpx.Response:
+        timeout, bounded = self.timeout, False
+        left = remaining() if self.propagate_deadline else None
+        if left is not None:
+            if left <= 0:
+                raise DeadlineExceeded(f"Deadline exceeded before calling {endpoint}")
+            if left < timeout:
+                timeout, bounded = left, True
+            headers = dict(kwargs.pop("headers", None) or {})
+            headers[DEADLINE_HEADER] = str(int(left * 1000))
+            kwargs = {**kwargs, "headers": headers}
+        try:
+            return await asyncio.wait_for(
+                self.client.request(method, url, timeout=timeout, **kwargs), timeout
+            )
+        except (asyncio.TimeoutError, httpx.TimeoutException) as exc:
+            if bounded:
+                raise DeadlineExceeded(f"Deadline exceeded calling {endpoint}") from exc
+            if isinstance(exc, httpx.TimeoutException):
+                raise
+            raise httpx.TimeoutException(f"Timed out calling {endpoint}") from exc
+
+    async def _hedged(
+        self, endpoint: str, delay: float, method: str, url: str, kwargs: Dict[str, Any]
+    ) -> httpx.Response:
+        first = asyncio.ensure_future(self._attempt(endpoint, method, url, kwargs))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedged[endpoint] = self.hedged.get(endpoint, 0) + 1
+                tasks.add(asyncio.ensure_future(self._attempt(endpoint, method, url, kwargs)))
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            endpoint: {
+                "state": breaker.state,
+                "failures": breaker.failures,
+                "short_circuits": breaker.short_circuits,
+                "hedged": self.hedged.get(endpoint, 0),
+                "deadline_exceeded": self.deadline_exceeded.get(endpoint, 0),
+            }
+            for endpoint, breaker in self.breakers.items()
+        }
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,59 @@
+"""
+Быстрая сериализация ответов горячих эндпоинтов чтения.
+
+Обработчики собирают ответ из кортежей строк БД (dict/list примитивов) и
+отдают его через render(): без построения pydantic-моделей и повторной
+валидации response_model. JSON кодируется orjson (формат совпадает с
+pydantic: datetime в ISO 8601, UTC с суффиксом "Z"); клиент может запросить
+MessagePack заголовком Accept: application/x-msgpack.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Mapping, Optional
+
+import msgpack
+import orjson
+from fastapi import Request, Response
+
+MSGPACK_MEDIA_TYPES = ("application/x-msgpack", "application/msgpack")
+
+# описание альтернативного формата для OpenAPI (responses= у маршрута)
+MSGPACK_RESPONSE = {200: {"content": {MSGPACK_MEDIA_TYPES[0]: {}}}}
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        if value.tzinfo is not None and value.utcoffset() == timezone.utc.utcoffset(None):
+            return value.replace(tzinfo=None).isoformat() + "Z"
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class MsgpackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def render(
+    request: Request,
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    """Ответ в формате, выбранном по Accept (MessagePack или JSON)."""
+    response_class = MsgpackResponse if wants_msgpack(request) else FastJSONResponse
+    return response_class(content, status_code=status_code, headers=headers)
@@ -0,0 +1,338 @@
+"""
+Распространение контекста трассировки W3C (traceparent) и спаны.
+
+Контекст принимается из входящих HTTP-запросов и заголовков сообщений
+RabbitMQ и передаётся во все исходящие httpx-вызовы и публикации.
+Спаны покрывают обработку HTTP-запроса, каждый SQL-запрос и исходящий
+HTTP-вызов. Экспортёр подключаемый: по умолчанию спаны не сохраняются,
+TRACE_EXPORTER=jsonl пишет их построчно в TRACE_FILE для офлайн-анализа.
+
+Трассировщик один на процесс. Имя сервиса спана берётся из контекста
+(TracingMiddleware приложения, service_scope), а без него — из
+tracer.service: так в режиме монолита спаны каждого приложения подписаны
+своим сервисом.
+"""
+
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))
+
+TRACEPARENT = "traceparent"
+
+
+@dataclass
+class Span:
+    name: str
+    service: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    sampled: bool
+    start: float = field(default_factory=time.time)
+    duration: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self, status: Optional[str] = None) -> None:
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._started
+        if status is not None:
+            self.status = status
+        if self.sampled:
+            tracer.exporter.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("_started")
+        return data
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """Разобрать заголовок traceparent: (trace_id, parent_span_id, sampled) или None."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    trace_id, span_id, flags = parts[1], parts[2], parts[3]
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        int(trace_id, 16), int(span_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, sampled
+
+
+class NullExporter:
+    def export(self, span: Span) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemoryExporter:
+    """Накапливает спаны в списке (тесты, отладка)."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def shutdown(self) -> None:
+        pass
+
+
+class JsonLinesExporter:
+    """Пишет каждый спан одной JSON-строкой в файл (буферизованно)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def exporter_from_env():
+    if TRACE_EXPORTER == "jsonl":
+        return JsonLinesExporter(TRACE_FILE)
+    return NullExporter()
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_current_service: ContextVar[Optional[str]] = ContextVar("current_service", default=None)
+
+
+@contextlib.contextmanager
+def service_scope(service: str) -> Iterator[None]:
+    """Спаны, начатые в блоке (и в созданных в нём задачах), подписаны service."""
+    token = _current_service.set(service)
+    try:
+        yield
+    finally:
+        _current_service.reset(token)
+
+
+class Tracer:
+    def __init__(self, service: str = "unknown", exporter=None):
+        self.service = service
+        self.exporter = exporter or NullExporter()
+
+    def start_span(
+        self,
+        name: str,
+        traceparent: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> Span:
+        """
+        Создать спан: дочерний к входящему traceparent, если он передан,
+        иначе к текущему спану контекста, иначе новый корневой.
+        Спан не становится текущим — для этого есть `span()`.
+        """
+        remote = parse_traceparent(traceparent)
+        parent = _current_span.get()
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+        elif parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id = f"{random.getrandbits(128):032x}"
+            parent_id = None
+            sampled = random.random() < TRACE_SAMPLE_RATIO
+        return Span(
+            name=name,
+            service=_current_service.get() or self.service,
+            trace_id=trace_id,
+            span_id=f"{random.getrandbits(64):016x}",
+            parent_id=parent_id,
+            sampled=sampled,
+            attributes=dict(attributes or {}),
+        )
+
+    @contextlib.contextmanager
+    def span(
+        self,
+        name: str,
+        traceparent: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[Span]:
+        """Спан, текущий на время блока; исключение помечает его как error."""
+        span = self.start_span(name, traceparent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.attributes["error"] = type(exc).__name__
+            span.end("error")
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+
+tracer = Tracer()
+
+
+def current_traceparent() -> Optional[str]:
+    span = _current_span.get()
+    return span.traceparent if span is not None else None
+
+
+class TracingMiddleware:
+    """ASGI-middleware: серверный спан на каждый HTTP-запрос сервиса service."""
+
+    def __init__(self, app, service: Optional[str] = None):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.service is None:
+            await self._traced(scope, receive, send)
+            return
+        with service_scope(self.service):
+            await self._traced(scope, receive, send)
+
+    async def _traced(self, scope, receive, send):
+        incoming = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                incoming = value.decode("latin-1")
+                break
+
+        with tracer.span(
+            f"{scope['method']} {scope['path']}", traceparent=incoming
+        ) as span:
+            span.attributes["http.method"] = scope["method"]
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.attributes["http.status_code"] = message["status"]
+                    if message["status"] >= 500:
+                        span.status = "error"
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{scope['method']} {route.path}"
+                    span.attributes["http.route"] = route.path
+
+
+def setup_tracing(app: FastAPI, service: str) -> None:
+    """
+    Подключить трассировку к приложению и экспортёр из окружения. Экспортёр
+    один на процесс: в режиме монолита приложения его разделяют.
+    """
+    tracer.service = service
+    if isinstance(tracer.exporter, NullExporter):
+        tracer.exporter = exporter_from_env()
+    app.add_middleware(TracingMiddleware, service=service)
+
+    @app.on_event("shutdown")
+    async def shutdown_tracing():
+        tracer.exporter.shutdown()
+
+
+def instrument_engine(engine: AsyncEngine, db: str) -> None:
+    """Спан на каждый SQL-запрос движка, дочерний к текущему спану."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        span = tracer.start_span(
+            "db.query",
+            attributes={
+                "db.name": db,
+                "db.operation": statement.split(None, 1)[0].upper() if statement else "",
+                "db.statement": statement[:500],
+            },
+        )
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        conn.info["trace_spans"].pop().end()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("trace_spans") if conn is not None else None
+        if spans:
+            span = spans.pop()
+            span.attributes["error"] = type(exception_context.original_exception).__name__
+            span.end("error")
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт httpx: клиентский спан на каждый вызов и заголовок traceparent.
+    Спан закрывается и при исключении (сеть, таймаут, отмена хеджированной
+    попытки) — со статусом error, а не остаётся незавершённым.
+    transport — нижележащий транспорт (None — сеть).
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        span = tracer.start_span(
+            f"HTTP {request.method}",
+            attributes={
+                "http.method": request.method,
+                "http.url": str(request.url),
+                "peer.host": request.url.host,
+            },
+        )
+        request.headers[TRACEPARENT] = span.traceparent
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException as exc:
+            span.attributes["error"] = type(exc).__name__
+            span.end("error")
+            raise
+        span.attributes["http.status_code"] = response.status_code
+        span.end("error" if response.status_code >= 500 else None)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
@@ -0,0 +1,7 @@
+"""
+Режим монолита: три сервиса в одном процессе и одном цикле событий.
+
+HTTP-вызовы между сервисами идут через транспорт в памяти, очередь RabbitMQ
+заменена очередью asyncio. Запуск: `uvicorn monolith.main:app` из корня
+репозитория.
+"""
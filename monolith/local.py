@@ -0,0 +1,105 @@
+"""Транспорт и очередь в памяти процесса для режима монолита."""
+
+import asyncio
+import contextlib
+import logging
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from request_service.app.messaging import DEFAULT_LANE, LANE_HEADER, PRIORITY_LANES
+
+logger = logging.getLogger(__name__)
+
+
+class LocalMessage:
+    """Сообщение локальной очереди с интерфейсом входящего сообщения aio_pika."""
+
+    __slots__ = ("body", "headers", "processed", "_queue")
+
+    def __init__(
+        self,
+        body: bytes,
+        headers: Optional[Dict[str, Any]] = None,
+        queue: "Optional[asyncio.Queue[LocalMessage]]" = None,
+    ):
+        self.body = body
+        self.headers = headers or {}
+        self.processed = False
+        self._queue = queue
+
+    @contextlib.asynccontextmanager
+    async def process(self, ignore_processed: bool = False):
+        yield self
+        self.processed = True
+
+    async def nack(self, requeue: bool = True) -> None:
+        """Вернуть сообщение в конец очереди полосы (requeue) или отбросить."""
+        self.processed = True
+        if requeue and self._queue is not None:
+            self._queue.put_nowait(LocalMessage(self.body, self.headers, self._queue))
+
+
+class LocalQueue:
+    """
+    Очереди asyncio вместо access_requests — по одной на полосу приоритета
+    (заголовок x-priority): `publish(body, headers)` — интерфейс публикатора
+    messaging, `consume(callback, prefetch)` — интерфейс, который использует
+    consumer; как в RabbitMQ, prefetch действует на каждую полосу отдельно.
+    Не переживает перезапуск процесса.
+    """
+
+    def __init__(self):
+        self._queues: Dict[str, "asyncio.Queue[LocalMessage]"] = {
+            lane: asyncio.Queue() for lane in PRIORITY_LANES
+        }
+
+    async def publish(self, body: bytes, headers: Dict[str, Any]) -> None:
+        lane = headers.get(LANE_HEADER, DEFAULT_LANE)
+        queue = self._queues.get(lane, self._queues[DEFAULT_LANE])
+        queue.put_nowait(LocalMessage(body, headers, queue))
+
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    async def join(self) -> None:
+        """Дождаться обработки всех опубликованных сообщений."""
+        for queue in self._queues.values():
+            await queue.join()
+
+    async def consume(self, callback, prefetch: int = 10) -> None:
+        async def worker(queue: "asyncio.Queue[LocalMessage]"):
+            while True:
+                message = await queue.get()
+                try:
+                    await callback(message)
+                except Exception:
+                    # как reject без requeue в RabbitMQ: сообщение отбрасывается
+                    logger.exception("Failed to process local queue message")
+                finally:
+                    queue.task_done()
+
+        await asyncio.gather(
+            *[worker(queue) for queue in self._queues.values() for _ in range(prefetch)]
+        )
+
+
+class InProcessTransport(httpx.AsyncBaseTransport):
+    """Транспорт httpx, вызывающий ASGI-приложение по имени хоста без сети."""
+
+    def __init__(self, apps: Dict[str, Any]):
+        self._routes = {
+            host: httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            for host, app in apps.items()
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = self._routes.get(request.url.host)
+        if transport is None:
+            raise httpx.ConnectError(
+                f"No in-process app for host {request.url.host!r}", request=request
+            )
+        return await transport.handle_async_request(request)
+
+    def hosts(self) -> List[str]:
+        return list(self._routes)
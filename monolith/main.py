@@ -0,0 +1,107 @@
+"""
+Единая точка входа: Request Service на `/`, Access на `/access`,
+Authorization на `/authorization`.
+
+Все DATABASE_URL сервисов в одном процессе совпадают (одна переменная
+окружения), поэтому три схемы живут в одной БД; миграции каждого сервиса
+запускаются со своим ALEMBIC_VERSION_TABLE.
+"""
+
+import asyncio
+import contextlib
+from typing import Optional
+
+from fastapi import FastAPI
+
+from acs_common import tracing
+from access_service.app import audit as access_audit
+from access_service.app import expiry as access_expiry
+from access_service.app import main as access_main
+from access_service.app import offboarding as access_offboarding
+from authorization_service.app import consumer
+from authorization_service.app import main as auth_main
+from authorization_service.app.settings import settings as auth_settings
+from authorization_service.app.status_batcher import StatusBatcher
+from request_service.app import main as request_main
+from request_service.app import admission, messaging, upstream
+
+from .local import InProcessTransport, LocalQueue
+
+# Внутренние адреса сервисов: разрешаются транспортом в памяти, не DNS.
+ACCESS_URL = "http://access"
+REQUEST_URL = "http://request"
+
+app = FastAPI(
+    title="Access Control System (monolith)",
+    version="1.0.0",
+    description=(
+        "Request, Access и Authorization в одном процессе: вызовы между "
+        "сервисами выполняются в памяти, очередь заявок — очередь asyncio."
+    ),
+)
+app.mount("/access", access_main.app)
+app.mount("/authorization", auth_main.app)
+app.mount("/", request_main.app)
+
+queue = LocalQueue()
+transport = InProcessTransport({"access": access_main.app, "request": request_main.app})
+_consumer_task: Optional[asyncio.Task] = None
+
+
+async def _local_queue_depth() -> int:
+    return queue.depth()
+
+
+def wire() -> None:
+    """Переключить межсервисные вызовы и очередь на реализации в памяти."""
+    upstream.transport = transport
+    request_main.access_proxy.base_url = ACCESS_URL
+    messaging.publisher = queue
+    admission.monitor.probe = _local_queue_depth
+    access_offboarding.transport = transport
+    access_offboarding.REQUEST_SERVICE_URL = REQUEST_URL
+
+    consumer.transport = transport
+    consumer.ACCESS_SERVICE_URL = ACCESS_URL
+    consumer.REQUEST_SERVICE_URL = REQUEST_URL
+    # вызов в памяти дешёв: пачка собирает только одновременные статусы,
+    # без ожидания по таймеру
+    consumer.status_batcher = StatusBatcher(
+        f"{REQUEST_URL}/requests/status:batch",
+        max_batch=auth_settings.status_batch_size,
+        max_delay=0,
+        transport=transport,
+        retries=auth_settings.status_batch_retries,
+        backoff=auth_settings.status_batch_backoff_ms / 1000,
+    )
+
+
+@app.on_event("startup")
+async def startup_event():
+    # события startup/shutdown вложенных приложений Starlette не вызывает:
+    # consumer запускается здесь на локальной очереди вместо RabbitMQ
+    global _consumer_task
+    wire()
+    # трассировщик общий: фоновые задачи подписывают спаны своим сервисом
+    with tracing.service_scope("authorization_service"):
+        _consumer_task = asyncio.create_task(consumer.run_consumer(queue))
+    with tracing.service_scope("request_service"):
+        admission.monitor.start()
+    with tracing.service_scope("access_service"):
+        access_expiry.scheduler.start()
+        access_audit.audit_log.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _consumer_task is not None:
+        _consumer_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _consumer_task
+    await admission.monitor.stop()
+    await access_expiry.scheduler.stop()
+    await access_audit.audit_log.stop()
+    await consumer.close_consumer()
+    await access_offboarding.aclose()
+    await request_main.access_proxy.aclose()
+    tracing.tracer.exporter.shutdown()
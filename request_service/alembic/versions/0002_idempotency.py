@@ -0,0 +1,41 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_idempotency"
+down_revision = "0001_init"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("key", sa.String(length=255), primary_key=True),
+        sa.Column("request_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.text("NOW()")
+        ),
+    )
+
+    # existing duplicate pending requests would break the unique index:
+    # keep the oldest one and reject the rest
+    conn = op.get_bind()
+    conn.execute(
+        sa.text(
+            "UPDATE requests r SET status = 'rejected', reason = 'Duplicate pending request', updated_at = NOW() "
+            "FROM requests o WHERE r.status = 'pending' AND o.status = 'pending' "
+            "AND r.user_id = o.user_id AND r.kind = o.kind AND r.target_id = o.target_id AND r.id > o.id"
+        )
+    )
+    op.create_index(
+        "uq_requests_pending_target",
+        "requests",
+        ["user_id", "kind", "target_id"],
+        unique=True,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_requests_pending_target", table_name="requests")
+    op.drop_table("idempotency_keys")
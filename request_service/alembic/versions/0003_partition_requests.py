@@ -0,0 +1,92 @@
+"""
+Перевод таблицы requests на декларативное секционирование по created_at (помесячно).
+
+Первичный ключ секционированной таблицы обязан включать ключ секционирования,
+поэтому он становится (id, created_at); id по-прежнему выдаётся общей
+последовательностью и остаётся уникальным. Частичный уникальный индекс
+pending-заявок нельзя создать на родительской таблице без created_at, поэтому
+он создаётся на каждой секции (см. app.maintenance), а межсекционную
+дедупликацию обеспечивает проверка в repositories.create_request.
+"""
+
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.maintenance import MONTHS_AHEAD, create_partition, month_start, add_months
+
+revision = "0003_partition_requests"
+down_revision = "0002_idempotency"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    op.execute("ALTER TABLE requests RENAME TO requests_legacy")
+    op.execute("ALTER INDEX requests_pkey RENAME TO requests_legacy_pkey")
+    op.execute(
+        """
+        CREATE TABLE requests (
+            id INTEGER NOT NULL DEFAULT nextval('requests_id_seq'),
+            user_id VARCHAR(100) NOT NULL,
+            kind VARCHAR(20) NOT NULL,
+            target_id INTEGER NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            reason TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("ALTER SEQUENCE requests_id_seq OWNED BY requests.id")
+
+    oldest = conn.execute(
+        sa.text("SELECT MIN(COALESCE(created_at, NOW())) FROM requests_legacy")
+    ).scalar()
+    now = datetime.now(timezone.utc)
+    month = month_start(oldest or now)
+    last = add_months(month_start(now), MONTHS_AHEAD)
+    while month <= last:
+        create_partition(conn, month)
+        month = add_months(month, 1)
+
+    op.execute(
+        "INSERT INTO requests (id, user_id, kind, target_id, status, reason, created_at, updated_at) "
+        "SELECT id, user_id, kind, target_id, status, reason, COALESCE(created_at, NOW()), updated_at "
+        "FROM requests_legacy"
+    )
+    op.execute("DROP TABLE requests_legacy")
+    op.create_index("ix_requests_user_id", "requests", ["user_id"])
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE requests RENAME TO requests_partitioned")
+    op.execute("ALTER INDEX ix_requests_user_id RENAME TO ix_requests_user_id_partitioned")
+    op.execute(
+        """
+        CREATE TABLE requests (
+            id INTEGER PRIMARY KEY DEFAULT nextval('requests_id_seq'),
+            user_id VARCHAR(100) NOT NULL,
+            kind VARCHAR(20) NOT NULL,
+            target_id INTEGER NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            reason TEXT,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE requests_id_seq OWNED BY requests.id")
+    op.execute("INSERT INTO requests SELECT * FROM requests_partitioned")
+    op.execute("DROP TABLE requests_partitioned")
+    op.create_index("ix_requests_user_id", "requests", ["user_id"])
+    op.create_index(
+        "uq_requests_pending_target",
+        "requests",
+        ["user_id", "kind", "target_id"],
+        unique=True,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
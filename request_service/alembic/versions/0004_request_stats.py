@@ -0,0 +1,48 @@
+from alembic import op
+import sqlalchemy as sa
+
+from app.stats import LATENCY_BUCKETS
+
+revision = "0004_request_stats"
+down_revision = "0003_partition_requests"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "request_stats_hourly",
+        sa.Column("bucket", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("kind", sa.String(length=20), primary_key=True),
+        sa.Column("status", sa.String(length=20), primary_key=True),
+        sa.Column("count", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.create_table(
+        "request_latency_hourly",
+        sa.Column("bucket", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("kind", sa.String(length=20), primary_key=True),
+        sa.Column("status", sa.String(length=20), primary_key=True),
+        sa.Column("bin", sa.Integer(), primary_key=True),
+        sa.Column("count", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+    # backfill rollups from existing requests
+    bounds = ", ".join(str(float(b)) for b in LATENCY_BUCKETS)
+    op.execute(
+        "INSERT INTO request_stats_hourly (bucket, kind, status, count) "
+        "SELECT date_trunc('hour', created_at), kind, status, COUNT(*) "
+        "FROM requests GROUP BY 1, 2, 3"
+    )
+    op.execute(
+        "INSERT INTO request_latency_hourly (bucket, kind, status, bin, count) "
+        "SELECT date_trunc('hour', updated_at), kind, status, "
+        f"width_bucket(EXTRACT(EPOCH FROM updated_at - created_at)::float8, ARRAY[{bounds}]::float8[]), "
+        "COUNT(*) FROM requests "
+        "WHERE status IN ('approved', 'rejected') AND updated_at > created_at "
+        "GROUP BY 1, 2, 3, 4"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("request_latency_hourly")
+    op.drop_table("request_stats_hourly")
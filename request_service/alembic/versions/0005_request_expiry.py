@@ -0,0 +1,16 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_request_expiry"
+down_revision = "0004_request_stats"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # на секционированной таблице колонка добавляется во все секции
+    op.add_column("requests", sa.Column("expires_at", sa.DateTime(timezone=True)))
+
+
+def downgrade() -> None:
+    op.drop_column("requests", "expires_at")
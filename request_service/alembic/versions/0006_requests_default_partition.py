@@ -0,0 +1,22 @@
+"""
+Секция по умолчанию requests_default: вставка в месяц, для которого секция
+ещё не создана, не падает, а строка попадает сюда до создания секции месяца
+(app.maintenance.create_partition переносит её).
+"""
+
+from alembic import op
+
+from app.maintenance import DEFAULT_PARTITION, create_default_partition
+
+revision = "0006_requests_default_partition"
+down_revision = "0005_request_expiry"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    create_default_partition(op.get_bind())
+
+
+def downgrade() -> None:
+    op.execute(f"DROP TABLE IF EXISTS {DEFAULT_PARTITION}")
@@ -0,0 +1,219 @@
+"""
+Контроль допуска заявок по глубине очередей access_requests (всех полос приоритета).
+
+QueueMonitor периодически узнаёт глубину очереди (passive declare в
+RabbitMQ или любой другой probe). Пока глубина ниже порога, POST /requests
+принимается без ограничений. Выше порога включаются token bucket'ы:
+общий на сервис и по одному на пользователя, — так одна интеграция не
+выбирает весь общий лимит. Отказ — 429 с Retry-After. Ограничение снимается,
+когда очередь опустится ниже ADMISSION_RESUME_RATIO от порога.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+import aio_pika
+
+from .messaging import PRIORITY_LANES, RABBITMQ_URL, lane_queue
+
+logger = logging.getLogger(__name__)
+
+# 0 — контроль допуска выключен
+ADMISSION_QUEUE_THRESHOLD = int(os.getenv("ADMISSION_QUEUE_THRESHOLD", "1000"))
+ADMISSION_RESUME_RATIO = float(os.getenv("ADMISSION_RESUME_RATIO", "0.8"))
+ADMISSION_POLL_INTERVAL = float(os.getenv("ADMISSION_POLL_INTERVAL", "1"))
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "50"))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "100"))
+ADMISSION_USER_RATE = float(os.getenv("ADMISSION_USER_RATE", "5"))
+ADMISSION_USER_BURST = float(os.getenv("ADMISSION_USER_BURST", "10"))
+ADMISSION_MAX_USERS = int(os.getenv("ADMISSION_MAX_USERS", "10000"))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Через сколько секунд будет доступен целый токен (после refill)."""
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        threshold: int = ADMISSION_QUEUE_THRESHOLD,
+        resume_ratio: float = ADMISSION_RESUME_RATIO,
+        rate: float = ADMISSION_RATE,
+        burst: float = ADMISSION_BURST,
+        user_rate: float = ADMISSION_USER_RATE,
+        user_burst: float = ADMISSION_USER_BURST,
+        max_users: int = ADMISSION_MAX_USERS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.resume_ratio = resume_ratio
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_users = max_users
+        self._clock = clock
+        self._global = TokenBucket(rate, burst, clock())
+        self._users: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.depth: Optional[int] = None
+        self.throttling = False
+        self.rejected = {"user": 0, "global": 0}
+
+    def observe_depth(self, depth: Optional[int]) -> None:
+        """Новое значение глубины очереди; None — неизвестно (ограничение снимается)."""
+        self.depth = depth
+        if depth is None or self.threshold <= 0:
+            self.throttling = False
+        elif depth >= self.threshold:
+            self.throttling = True
+        elif depth < self.threshold * self.resume_ratio:
+            self.throttling = False
+
+    def _user_bucket(self, user_id: str, now: float) -> TokenBucket:
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            bucket = self._users[user_id] = TokenBucket(
+                self.user_rate, self.user_burst, now
+            )
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return bucket
+
+    def admit(self, user_id: str) -> Optional[float]:
+        """
+        Принять заявку пользователя: None — допущена,
+        иначе — через сколько секунд имеет смысл повторить.
+        """
+        if not self.throttling:
+            return None
+        now = self._clock()
+        user = self._user_bucket(user_id, now)
+        user.refill(now)
+        self._global.refill(now)
+        if user.tokens < 1:
+            self.rejected["user"] += 1
+            return user.wait_time()
+        if self._global.tokens < 1:
+            self.rejected["global"] += 1
+            return self._global.wait_time()
+        user.tokens -= 1
+        self._global.tokens -= 1
+        return None
+
+    def refund(self, user_id: str) -> None:
+        """Вернуть токены допущенной заявки, оказавшейся повтором существующей."""
+        user = self._users.get(user_id)
+        if user is not None:
+            user.tokens = min(user.capacity, user.tokens + 1)
+        self._global.tokens = min(self._global.capacity, self._global.tokens + 1)
+
+
+class AmqpQueueDepth:
+    """
+    Суммарная глубина очередей всех полос через passive declare (очереди
+    не создаются; ещё не объявленная полоса считается пустой). Соединение
+    и канал открываются один раз на процесс и переиспользуются опросами.
+    """
+
+    def __init__(self, url: str = RABBITMQ_URL):
+        self.url = url
+        self._connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self._channel: Optional[aio_pika.abc.AbstractChannel] = None
+
+    async def _get_channel(self) -> aio_pika.abc.AbstractChannel:
+        if self._connection is None:
+            self._connection = await aio_pika.connect_robust(self.url)
+        if self._channel is None or self._channel.is_closed:
+            self._channel = await self._connection.channel()
+        return self._channel
+
+    async def __call__(self) -> int:
+        depth = 0
+        for lane in PRIORITY_LANES:
+            channel = await self._get_channel()
+            try:
+                queue = await channel.declare_queue(lane_queue(lane), passive=True)
+            except aio_pika.exceptions.ChannelNotFoundEntity:
+                # ошибка passive declare закрывает канал: следующий откроется заново
+                self._channel = None
+                continue
+            depth += queue.declaration_result.message_count
+        return depth
+
+    async def aclose(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+        self._connection = self._channel = None
+
+
+amqp_queue_depth = AmqpQueueDepth()
+
+
+class QueueMonitor:
+    """Периодически опрашивает probe и передаёт глубину в контроллер."""
+
+    def __init__(
+        self,
+        controller: AdmissionController,
+        probe: Callable[[], Awaitable[int]] = amqp_queue_depth,
+        interval: float = ADMISSION_POLL_INTERVAL,
+    ):
+        self.controller = controller
+        self.probe = probe
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def poll_once(self) -> None:
+        try:
+            depth = await self.probe()
+        except Exception:
+            # при неизвестной глубине заявки принимаются (fail-open)
+            logger.warning("Queue depth probe failed", exc_info=True)
+            depth = None
+        self.controller.observe_depth(depth)
+
+    async def _run(self) -> None:
+        while True:
+            await self.poll_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None and self.controller.threshold > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        aclose = getattr(self.probe, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+controller = AdmissionController()
+monitor = QueueMonitor(controller)
@@ -1,15 +1,30 @@
-import os
-from typing import AsyncGenerator
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+import math
+from datetime import datetime
+from typing import AsyncGenerator, List, Literal, Optional
 import httpx
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from acs_common.resilience import DeadlineMiddleware
+from acs_common.serialization import MSGPACK_RESPONSE, render
+from acs_common.tracing import setup_tracing
 
-from .db import async_session_factory
+from .db import async_session_factory, engine, get_read_factory, recent_writes
 from . import schemas
 from . import repositories as repo
+from . import admission
+from . import maintenance
 from . import messaging
+from . import stats
+from .result_cache import cache_headers, request_cache
+from .upstream import REQUEST_DEADLINE_SECONDS, RESOURCE_ACCESS_CACHE_TTL, access_proxy
+from .metrics import setup_metrics
 
-ACCESS_SERVICE_URL = os.getenv("ACCESS_SERVICE_URL", "http://localhost:8001")
+logger = logging.getLogger(__name__)
+
+PUBLISH_FAILED_REASON = "Failed to enqueue request"
 
 app = FastAPI(
     title="Request Service",
@@ -19,6 +34,30 @@ app = FastAPI(
         "проксирует запросы в Access, публикует события в очередь."
     ),
 )
+setup_metrics(app)
+setup_tracing(app, "request_service")
+app.add_middleware(DeadlineMiddleware, default_budget=REQUEST_DEADLINE_SECONDS)
+
+
+@app.exception_handler(httpx.TransportError)
+async def upstream_unavailable(request: Request, exc: httpx.TransportError):
+    """Access недоступен: 504 при исчерпании бюджета/таймауте, иначе 503."""
+    if isinstance(exc, httpx.TimeoutException):
+        return JSONResponse({"detail": "Upstream timed out"}, status_code=504)
+    return JSONResponse({"detail": "Upstream unavailable"}, status_code=503)
+
+
+@app.on_event("startup")
+async def startup_event():
+    admission.monitor.start()
+    maintenance.keeper.start(engine)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await admission.monitor.stop()
+    await maintenance.keeper.stop()
+    await access_proxy.aclose()
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
@@ -27,6 +66,16 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Зависимость FastAPI для эндпоинтов только на чтение: сессия реплики
+    (DATABASE_READ_URL), но основной БД, если по user_id из пути недавно
+    была запись в этом процессе.
+    """
+    async with get_read_factory(request.path_params.get("user_id"))() as session:
+        yield session
+
+
 @app.post(
     "/requests",
     response_model=schemas.RequestOut,
@@ -34,66 +83,174 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
     summary="Создать заявку",
     description=(
         "Создаёт заявку со статусом 'pending' и публикует событие "
-        "в очередь для асинхронной проверки/применения."
+        "в очередь для асинхронной проверки/применения. "
+        "Повторная отправка при уже существующей pending-заявке на ту же цель "
+        "возвращает её без повторной публикации. Необязательный заголовок "
+        "Idempotency-Key позволяет безопасно повторять запрос: ответ "
+        "воспроизводится по сохранённому ключу (заголовок Idempotent-Replayed). "
+        "Если событие не удалось опубликовать, заявка отменяется, ключ "
+        "освобождается и возвращается 503 с Retry-After. "
+        "Когда очередь заявок перегружена, новые заявки ограничиваются по "
+        "пользователю и в целом: ответ 429 с заголовком Retry-After. "
+        "Необязательный expires_at (в будущем) запрашивает временную выдачу. "
+        "priority (critical | normal | bulk) выбирает полосу очереди: массовые "
+        "bulk-заявки не задерживают срочные."
     ),
 )
 async def create_request(
-    body: schemas.CreateRequest, session: AsyncSession = Depends(get_session)
+    body: schemas.CreateRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        default=None, alias="Idempotency-Key", max_length=255
+    ),
+    session: AsyncSession = Depends(get_session),
 ):
     """
     Создать заявку на доступ или группу для пользователя.
     Статус изначально 'pending'. Также публикует событие
-    в очередь для асинхронной авторизации.
+    в очередь для асинхронной авторизации — только для новой заявки.
     """
-    req = await repo.create_request(
+    if idempotency_key:
+        stored = await repo.get_request_by_idempotency_key(session, idempotency_key)
+        if stored is not None:
+            return _replay(stored, body, response, replayed=True)
+
+    # при ограничении повтор уже принятой заявки отвечает ею, не расходуя квоту
+    charged = admission.controller.throttling and (
+        await repo.find_pending_request(session, body.user_id, body.kind, body.target_id)
+        is None
+    )
+    if charged:
+        retry_after = admission.controller.admit(body.user_id)
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=429,
+                detail="Requests queue is overloaded, retry later",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    req, created = await repo.create_request(
         session,
         body.user_id,
         body.kind,
         body.target_id,
+        idempotency_key=idempotency_key,
+        expires_at=body.expires_at,
     )
+    if not created:
+        if charged:
+            # параллельная отправка успела создать ту же заявку
+            admission.controller.refund(body.user_id)
+        return _replay(req, body, response, replayed=idempotency_key is not None)
+    recent_writes.mark(body.user_id)
     # publish to queue for async authorization
-    await messaging.publish_request(
-        {
-            "request_id": req.id,
-            "user_id": body.user_id,
-            "kind": body.kind,
-            "target_id": body.target_id,
-        }
-    )
+    try:
+        await messaging.publish_request(
+            {
+                "request_id": req.id,
+                "user_id": body.user_id,
+                "kind": body.kind,
+                "target_id": body.target_id,
+                "expires_at": body.expires_at.isoformat() if body.expires_at else None,
+                "priority": body.priority,
+                # ключ секции: коллбеки статуса по нему обходятся одной секцией
+                "created_at": req.created_at.isoformat(),
+            }
+        )
+    except Exception:
+        # заявка уже в БД, но consumer о ней не узнает: снимаем её, чтобы
+        # повтор (в том числе с тем же Idempotency-Key) создал новую
+        logger.warning("Failed to publish request %s", req.id, exc_info=True)
+        await repo.abandon_request(session, req.id, PUBLISH_FAILED_REASON)
+        await request_cache.invalidate([req.id])
+        raise HTTPException(
+            status_code=503,
+            detail="Requests queue unavailable, retry later",
+            headers={"Retry-After": "5"},
+        )
+    return schemas.RequestOut.model_validate(req.__dict__)
+
+
+def _replay(
+    req, body: schemas.CreateRequest, response: Response, replayed: bool
+) -> schemas.RequestOut:
+    """
+    Вернуть ранее созданную заявку, проверив, что она соответствует телу запроса.
+    Заголовок Idempotent-Replayed ставится, только если запрос пришёл с
+    Idempotency-Key (replayed); повтор без ключа просто дедуплицируется.
+    """
+    if (req.user_id, req.kind, req.target_id) != (
+        body.user_id,
+        body.kind,
+        body.target_id,
+    ):
+        raise HTTPException(
+            status_code=409,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
     return schemas.RequestOut.model_validate(req.__dict__)
 
 
 @app.get(
     "/requests/{request_id}",
     response_model=schemas.RequestOut,
+    responses=MSGPACK_RESPONSE,
     tags=["Заявки"],
     summary="Получить заявку",
-    description=("Возвращает текущий статус и данные заявки по её идентификатору."),
+    description=(
+        "Возвращает текущий статус и данные заявки по её идентификатору. "
+        "По заголовку Accept: application/x-msgpack ответ кодируется в MessagePack. "
+        "Завершённые заявки (approved/rejected) отдаются из кэша с "
+        "Cache-Control: immutable; по If-None-Match с текущим ETag — 304. "
+        "Необязательный created_at (время создания заявки) позволяет "
+        "читать одну секцию таблицы вместо всех."
+    ),
 )
 async def get_request(
     request_id: int,
+    request: Request,
+    created_at: Optional[datetime] = Query(default=None),
     session: AsyncSession = Depends(get_session),
 ):
-    """Получить заявку по идентификатору."""
-    req = await repo.get_request(session, request_id)
-    if not req:
-        raise HTTPException(status_code=404, detail="Request not found")
-    return schemas.RequestOut.model_validate(req.__dict__)
+    """Получить заявку по идентификатору (через кэш результатов)."""
+    req = await request_cache.get(request_id)
+    if req is None:
+        since = request_cache.begin()
+        req = await repo.get_request(session, request_id, created_at)
+        if not req:
+            raise HTTPException(status_code=404, detail="Request not found")
+        await request_cache.put(req, since)
+    headers = cache_headers(req)
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return render(request, req, headers=headers)
 
 
 @app.get(
     "/requests/user/{user_id}",
+    response_model=List[schemas.RequestOut],
+    responses=MSGPACK_RESPONSE,
     tags=["Заявки"],
     summary="Все заявки пользователя",
-    description=("Возвращает список всех заявок пользователя (по убыванию id)."),
+    description=(
+        "Возвращает список заявок пользователя (по убыванию id). "
+        "Необязательные since/until (по created_at) ограничивают период "
+        "и число читаемых секций таблицы. "
+        "По заголовку Accept: application/x-msgpack ответ кодируется в MessagePack."
+    ),
 )
 async def get_user_requests(
     user_id: str,
-    session: AsyncSession = Depends(get_session),
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    session: AsyncSession = Depends(get_read_session),
 ):
-    """Получить список всех заявок пользователя."""
-    items = await repo.get_user_requests(session, user_id)
-    return [schemas.RequestOut.model_validate(i.__dict__) for i in items]
+    """Получить список заявок пользователя, при необходимости за период."""
+    items = await repo.get_user_requests(session, user_id, since, until)
+    return render(request, items)
 
 
 @app.get(
@@ -103,10 +260,14 @@ async def get_user_requests(
     description=("Возвращает права пользователя, проксируя запрос в Access Service."),
 )
 async def proxy_user_rights(user_id: str):
-    """Проксирование запроса прав пользователя в Access Service."""
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{ACCESS_SERVICE_URL}/user/{user_id}/rights")
-        return r.json()
+    """
+    Проксирование запроса прав пользователя в Access Service.
+    Одинаковые одновременные запросы объединяются в один вызов Access.
+    """
+    status_code, data = await access_proxy.get(
+        f"/user/{user_id}/rights", endpoint="GET /user/{user_id}/rights"
+    )
+    return JSONResponse(data, status_code=status_code)
 
 
 @app.post(
@@ -116,30 +277,131 @@ async def proxy_user_rights(user_id: str):
     description=("Проксирует отзыв доступа/группы в Access Service."),
 )
 async def proxy_revoke(user_id: str, body: schemas.CreateRequest):
-    """Проксирование отзыва доступа/группы в Access Service."""
-    async with httpx.AsyncClient() as client:
-        r = await client.post(
-            f"{ACCESS_SERVICE_URL}/user/{user_id}/revoke",
-            json={"kind": body.kind, "target_id": body.target_id},
-        )
-        return r.json()
+    """
+    Проксирование отзыва доступа/группы в Access Service.
+    Сбрасывает кэш и незавершённые чтения, относящиеся к пользователю.
+    """
+    status_code, data = await access_proxy.post(
+        f"/user/{user_id}/revoke",
+        json={"kind": body.kind, "target_id": body.target_id},
+        endpoint="POST /user/{user_id}/revoke",
+    )
+    access_proxy.invalidate_user(user_id)
+    return JSONResponse(data, status_code=status_code)
 
 
 @app.get(
     "/resource/{resource_id}/access",
     tags=["Ресурсы"],
     summary="Требуемые доступы ресурса (прокси)",
-    description=("Возвращает требуемые доступы для ресурса через Access Service."),
+    description=(
+        "Возвращает требуемые доступы для ресурса через Access Service. "
+        "Ответ кэшируется на RESOURCE_ACCESS_CACHE_TTL секунд; "
+        "заголовок Cache-Control: no-cache обходит кэш."
+    ),
 )
-async def proxy_resource_access(resource_id: int):
+async def proxy_resource_access(
+    resource_id: int, cache_control: Optional[str] = Header(default=None)
+):
     """
     Проксирование запроса требований к доступам
     для ресурса в Access Service.
     """
-    async with httpx.AsyncClient() as client:
-        url = f"{ACCESS_SERVICE_URL}/resource/{resource_id}/access"
-        r = await client.get(url)
-        return r.json()
+    status_code, data = await access_proxy.get(
+        f"/resource/{resource_id}/access",
+        cache_ttl=RESOURCE_ACCESS_CACHE_TTL,
+        bypass_cache=bool(cache_control and "no-cache" in cache_control),
+        endpoint="GET /resource/{resource_id}/access",
+    )
+    return JSONResponse(data, status_code=status_code)
+
+
+@app.get(
+    "/proxy/stats",
+    tags=["Техническое"],
+    summary="Статистика проксирования",
+    description=(
+        "Счётчики вызовов Access: реальные вызовы, объединённые запросы, "
+        "попадания в кэш и итоговое число сэкономленных вызовов (saved); "
+        "в endpoints — состояние автоматов отключения и число хеджированных вызовов."
+    ),
+)
+async def proxy_stats():
+    """Вернуть счётчики общего HTTP-клиента Access и состояние автоматов."""
+    return {**access_proxy.stats.snapshot(), "endpoints": access_proxy.resilient.snapshot()}
+
+
+@app.post(
+    "/requests/cancel:batch",
+    response_model=schemas.CancelPendingResponse,
+    tags=["Заявки"],
+    summary="Отменить pending-заявки пользователей",
+    description=(
+        "Вызывается Access Service при офбординге: все pending-заявки "
+        "перечисленных пользователей переводятся в 'cancelled' одним UPDATE. "
+        "Заявки с решением не меняются; повторный вызов ничего не отменяет."
+    ),
+)
+async def cancel_pending_batch(
+    body: schemas.CancelPendingBatch,
+    session: AsyncSession = Depends(get_session),
+):
+    """Отменить pending-заявки пользователей и вернуть отменённые."""
+    cancelled = await repo.cancel_pending(session, body.user_ids, body.reason)
+    await request_cache.invalidate(req.id for req in cancelled)
+    for user_id in {req.user_id for req in cancelled}:
+        recent_writes.mark(user_id)
+    return schemas.CancelPendingResponse(
+        cancelled=[schemas.RequestOut.model_validate(req.__dict__) for req in cancelled]
+    )
+
+
+@app.patch(
+    "/requests/status:batch",
+    response_model=schemas.PatchStatusBatchResponse,
+    tags=["Заявки"],
+    summary="Обновить статусы пачки заявок (коллбек)",
+    description=(
+        "Пакетный коллбек от Authorization Service: применяет все переходы "
+        "статусов одним UPDATE и одним commit. Меняются только pending-заявки. "
+        "Вызов идемпотентен: заявка, уже находящаяся в запрошенном статусе "
+        "(повтор после таймаута), возвращается с found=true. found=false — "
+        "заявка не найдена или завершена с другим статусом (например, "
+        "отменена при офбординге); в request тогда её текущее состояние. "
+        "created_at элемента (из сообщения очереди) позволяет обновлять "
+        "заявки, не просматривая все секции таблицы."
+    ),
+)
+async def patch_status_batch(
+    body: schemas.PatchStatusBatch,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Пакетный коллбек от Authorization Service:
+    изменить статусы нескольких заявок за один запрос к БД.
+    Результаты возвращаются в порядке элементов запроса; не изменённые
+    заявки дочитываются одним SELECT, чтобы повтор пачки был идемпотентным.
+    """
+    updated = await repo.patch_statuses(
+        session, [(i.request_id, i.status, i.reason, i.created_at) for i in body.items]
+    )
+    await request_cache.invalidate(updated)
+    for req in updated.values():
+        recent_writes.mark(req.user_id)
+    current = {rid: req.__dict__ for rid, req in updated.items()}
+    missing = {i.request_id: i.created_at for i in body.items if i.request_id not in updated}
+    current.update(await repo.get_requests(session, list(missing.items())))
+    results = []
+    for item in body.items:
+        row = current.get(item.request_id)
+        results.append(
+            schemas.PatchStatusResult(
+                request_id=item.request_id,
+                found=row is not None and row["status"] == item.status,
+                request=schemas.RequestOut.model_validate(row) if row else None,
+            )
+        )
+    return schemas.PatchStatusBatchResponse(results=results)
 
 
 @app.patch(
@@ -150,7 +412,8 @@ async def proxy_resource_access(resource_id: int):
     description=(
         "Коллбек от Authorization Service: "
         "устанавливает 'approved' или 'rejected' "
-        "для заявки и, при необходимости, причину."
+        "для pending-заявки и, при необходимости, причину. "
+        "Для уже завершённой заявки — 409."
     ),
 )
 async def patch_status(
@@ -169,5 +432,38 @@ async def patch_status(
         body.reason,
     )
     if not req:
+        if await repo.get_request(session, request_id) is not None:
+            raise HTTPException(status_code=409, detail="Request is already finalized")
         raise HTTPException(status_code=404, detail="Request not found")
+    await request_cache.invalidate([request_id])
+    recent_writes.mark(req.user_id)
     return schemas.RequestOut.model_validate(req.__dict__)
+
+
+@app.get(
+    "/stats/requests",
+    response_model=schemas.RequestStatsResponse,
+    tags=["Статистика"],
+    summary="Статистика заявок",
+    description=(
+        "Число заявок по статусу, типу и часу (или дню) создания и перцентили "
+        "задержки решения p50/p95/p99. Читает только предагрегированные "
+        "почасовые таблицы. По умолчанию — последние 24 часа."
+    ),
+)
+async def request_stats(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    kind: Optional[Literal["access", "group"]] = None,
+    granularity: Literal["hour", "day"] = "hour",
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Статистика заявок за полуинтервал [since, until) из роллапов."""
+    default_since, default_until = stats.default_window()
+    return await stats.get_request_stats(
+        session,
+        since or default_since,
+        until or default_until,
+        kind=kind,
+        granularity=granularity,
+    )
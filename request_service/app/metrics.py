@@ -0,0 +1,100 @@
+"""
+Метрики Request Service. Реестр, типы метрик и общие метрики (HTTP, SQL, пул,
+исходящие вызовы) — в acs_common.metrics; здесь регистрируются метрики
+этого сервиса, а общий API реэкспортируется для модулей app.
+"""
+
+from typing import Dict, Tuple
+
+from acs_common.metrics import (  # noqa: F401 — общий API метрик сервиса
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    httpx_event_hooks,
+    instrument_engine,
+    setup_metrics,
+)
+
+
+AMQP_PUBLISH_LATENCY = REGISTRY.register(
+    Histogram(
+        "amqp_publish_duration_seconds",
+        "Time to publish a request event to the broker.",
+        ("queue",),
+    )
+)
+
+
+def _proxy_counters() -> Dict[Tuple[str, ...], float]:
+    from .upstream import access_proxy
+
+    return {(k,): v for k, v in access_proxy.stats.snapshot().items()}
+
+
+PROXY_EVENTS = REGISTRY.register(
+    Counter(
+        "access_proxy_events_total",
+        "Shared Access client counters (calls, coalesced, cache hits...).",
+        ("event",),
+        callback=_proxy_counters,
+    )
+)
+
+
+def _queue_depth() -> Dict[Tuple[str, ...], float]:
+    from .admission import controller
+
+    return {} if controller.depth is None else {(): controller.depth}
+
+
+def _admission_rejections() -> Dict[Tuple[str, ...], float]:
+    from .admission import controller
+
+    return {(reason,): count for reason, count in controller.rejected.items()}
+
+
+QUEUE_DEPTH = REGISTRY.register(
+    Gauge(
+        "requests_queue_depth",
+        "Last observed number of ready messages in the requests queue.",
+        callback=_queue_depth,
+    )
+)
+ADMISSION_REJECTIONS = REGISTRY.register(
+    Counter(
+        "admission_rejections_total",
+        "POST /requests rejected with 429 by bucket (user or global).",
+        ("bucket",),
+        callback=_admission_rejections,
+    )
+)
+
+
+def _request_cache_events() -> Dict[Tuple[str, ...], float]:
+    from .result_cache import request_cache
+
+    return {(k,): v for k, v in request_cache.stats.snapshot().items()}
+
+
+def _request_cache_entries() -> Dict[Tuple[str, ...], float]:
+    from .result_cache import request_cache
+
+    return {(): len(request_cache)}
+
+
+REQUEST_CACHE_EVENTS = REGISTRY.register(
+    Counter(
+        "request_cache_events_total",
+        "GET /requests/{id} result cache hits, backend hits, misses, stores, invalidations.",
+        ("event",),
+        callback=_request_cache_events,
+    )
+)
+REQUEST_CACHE_ENTRIES = REGISTRY.register(
+    Gauge(
+        "request_cache_entries",
+        "Requests held in the local result cache.",
+        callback=_request_cache_entries,
+    )
+)
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import Integer, String, Text, DateTime
+from sqlalchemy import BigInteger, Integer, String, Text, DateTime, Index, text
 from datetime import datetime, timezone
 from typing import Optional
 from .db import Base
@@ -12,9 +12,18 @@ class Request(Base):
     - user_id: пользователь, для которого создаётся заявка
     - kind: тип ('access' или 'group')
     - target_id: целевой id доступа или группы
-    - status: статус обработки ('pending'|'approved'|'rejected')
+    - status: статус обработки ('pending'|'approved'|'rejected'|'cancelled';
+      cancelled — заявка снята при офбординге пользователя)
     - reason: причина отказа (если есть)
+    - expires_at: срок временной выдачи (None — бессрочно), передаётся в Access
     - created_at / updated_at: отметки времени
+    Частичный уникальный индекс не допускает двух pending-заявок
+    на одну и ту же цель для пользователя.
+    В Postgres таблица секционирована по created_at помесячно
+    (миграция 0003, app.maintenance): там первичный ключ — (id, created_at),
+    а уникальный индекс pending-заявок создаётся на каждой секции; между
+    секциями дубли исключает advisory-блокировка в create_request.
+    Для SQLite (тесты) таблица остаётся обычной.
     """
 
     __tablename__ = "requests"
@@ -25,9 +34,67 @@ class Request(Base):
     target_id: Mapped[int] = mapped_column(Integer)
     status: Mapped[str] = mapped_column(String(20), default="pending")
     reason: Mapped[Optional[str]] = mapped_column(Text)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
+
+    __table_args__ = (
+        Index(
+            "uq_requests_pending_target",
+            "user_id",
+            "kind",
+            "target_id",
+            unique=True,
+            postgresql_where=text("status = 'pending'"),
+            sqlite_where=text("status = 'pending'"),
+        ),
+    )
+
+
+class IdempotencyKey(Base):
+    """
+    Сохранённый результат POST /requests для заголовка Idempotency-Key.
+    Повторный запрос с тем же ключом возвращает заявку request_id
+    вместо создания новой.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    request_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+
+
+class RequestStatsHourly(Base):
+    """
+    Роллап числа заявок по часу создания, типу и текущему статусу.
+    Обновляется инкрементально при создании заявки и смене её статуса.
+    """
+
+    __tablename__ = "request_stats_hourly"
+
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20), primary_key=True)
+    status: Mapped[str] = mapped_column(String(20), primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class RequestLatencyHourly(Base):
+    """
+    Гистограмма задержки решения (updated_at - created_at) по часу решения,
+    типу и итоговому статусу. bin — индекс корзины из stats.LATENCY_BUCKETS.
+    """
+
+    __tablename__ = "request_latency_hourly"
+
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20), primary_key=True)
+    status: Mapped[str] = mapped_column(String(20), primary_key=True)
+    bin: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
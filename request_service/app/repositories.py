@@ -1,50 +1,328 @@
-from typing import List, Optional
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from .models import Request
+from sqlalchemy import (
+    DateTime,
+    delete,
+    Integer,
+    String,
+    Text,
+    case,
+    column,
+    func,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.exc import IntegrityError
+from .models import IdempotencyKey, Request
+from . import stats
 
 
 async def create_request(
-    session: AsyncSession, user_id: str, kind: str, target_id: int
-) -> Request:
+    session: AsyncSession,
+    user_id: str,
+    kind: str,
+    target_id: int,
+    idempotency_key: Optional[str] = None,
+    expires_at: Optional[datetime] = None,
+) -> Tuple[Request, bool]:
     """
-    Создать заявку со статусом 'pending'.
-    Возвращает созданную запись Request.
+    Создать заявку со статусом 'pending' либо вернуть уже существующую
+    pending-заявку на ту же цель (дедупликация повторных отправок).
+    expires_at — срок временной выдачи, сохраняется в заявке.
+    Если передан idempotency_key, он привязывается к возвращаемой заявке.
+    Гонки одновременных вставок разрешаются частичным уникальным индексом
+    uq_requests_pending_target и первичным ключом idempotency_keys.
+    В Postgres этот индекс есть только на каждой секции и не видит pending-
+    заявку соседнего месяца, поэтому проверка и вставка идут под
+    транзакционной advisory-блокировкой цели (user_id, kind, target_id):
+    параллельная отправка дождётся commit и найдёт уже созданную заявку.
+    :return: (заявка, True если создана новая заявка)
     """
-    req = Request(user_id=user_id, kind=kind, target_id=target_id, status="pending")
+    if session.get_bind().dialect.name == "postgresql":
+        await session.execute(
+            select(
+                func.pg_advisory_xact_lock(
+                    func.hashtextextended(f"{user_id}:{kind}:{target_id}", 0)
+                )
+            )
+        )
+    existing = await find_pending_request(session, user_id, kind, target_id)
+    if existing is not None:
+        if idempotency_key:
+            session.add(IdempotencyKey(key=idempotency_key, request_id=existing.id))
+            try:
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+        return existing, False
+
+    now = datetime.now(timezone.utc)
+    req = Request(
+        user_id=user_id,
+        kind=kind,
+        target_id=target_id,
+        status="pending",
+        expires_at=expires_at,
+        created_at=now,
+        updated_at=now,
+    )
     session.add(req)
-    await session.commit()
+    try:
+        await session.flush()
+        await stats.record_created(session, [(now, kind)])
+        if idempotency_key:
+            session.add(IdempotencyKey(key=idempotency_key, request_id=req.id))
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        winner = None
+        if idempotency_key:
+            winner = await get_request_by_idempotency_key(session, idempotency_key)
+        if winner is None:
+            winner = await find_pending_request(session, user_id, kind, target_id)
+        if winner is None:
+            raise
+        return winner, False
     await session.refresh(req)
-    return req
+    return req, True
 
 
-async def get_request(session: AsyncSession, request_id: int) -> Optional[Request]:
-    """Вернуть заявку по идентификатору или None."""
-    res = await session.execute(select(Request).where(Request.id == request_id))
+async def find_pending_request(
+    session: AsyncSession, user_id: str, kind: str, target_id: int
+) -> Optional[Request]:
+    """Вернуть pending-заявку пользователя на указанную цель или None."""
+    res = await session.execute(
+        select(Request).where(
+            Request.user_id == user_id,
+            Request.kind == kind,
+            Request.target_id == target_id,
+            Request.status == "pending",
+        )
+    )
     return res.scalar_one_or_none()
 
 
-async def get_user_requests(session: AsyncSession, user_id: str) -> List[Request]:
-    """Вернуть все заявки пользователя (по убыванию id)."""
+async def get_request_by_idempotency_key(
+    session: AsyncSession, idempotency_key: str
+) -> Optional[Request]:
+    """Вернуть заявку, ранее созданную с данным Idempotency-Key, или None."""
     res = await session.execute(
-        select(Request).where(Request.user_id == user_id).order_by(Request.id.desc())
+        select(Request)
+        .join(IdempotencyKey, IdempotencyKey.request_id == Request.id)
+        .where(IdempotencyKey.key == idempotency_key)
     )
-    return list(res.scalars().all())
+    return res.scalar_one_or_none()
+
+
+# столбцы RequestOut: чтение заявок для ответа идёт кортежами, без ORM-объектов
+REQUEST_OUT_COLUMNS = (
+    Request.id,
+    Request.user_id,
+    Request.kind,
+    Request.target_id,
+    Request.status,
+    Request.reason,
+    Request.expires_at,
+    Request.created_at,
+    Request.updated_at,
+)
+
+
+async def get_request(
+    session: AsyncSession, request_id: int, created_at: Optional[datetime] = None
+) -> Optional[dict]:
+    """
+    Вернуть заявку (поля RequestOut словарём) по идентификатору или None.
+    Известный created_at заявки позволяет Postgres читать одну секцию
+    вместо поиска id во всех.
+    """
+    stmt = select(*REQUEST_OUT_COLUMNS).where(Request.id == request_id)
+    if created_at is not None and session.get_bind().dialect.name == "postgresql":
+        stmt = stmt.where(Request.created_at == created_at)
+    res = await session.execute(stmt)
+    row = res.mappings().one_or_none()
+    return dict(row) if row is not None else None
+
+
+async def get_requests(
+    session: AsyncSession, keys: Sequence[Tuple[int, Optional[datetime]]]
+) -> Dict[int, dict]:
+    """
+    Вернуть заявки (поля RequestOut словарями) по (request_id, created_at
+    или None) одним SELECT: {request_id: заявка}, отсутствующих id нет.
+    Если у всех известен created_at, в Postgres границы пачки по нему
+    отсекают лишние секции.
+    """
+    if not keys:
+        return {}
+    stmt = select(*REQUEST_OUT_COLUMNS).where(Request.id.in_([rid for rid, _ in keys]))
+    created = [ca for _, ca in keys]
+    if all(ca is not None for ca in created) and session.get_bind().dialect.name == "postgresql":
+        stmt = stmt.where(Request.created_at.between(min(created), max(created)))
+    res = await session.execute(stmt)
+    return {row["id"]: dict(row) for row in res.mappings()}
+
+
+async def get_user_requests(
+    session: AsyncSession,
+    user_id: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[dict]:
+    """
+    Вернуть заявки пользователя (поля RequestOut словарями, по убыванию id).
+    Границы since/until по created_at позволяют Postgres читать
+    только секции нужного периода (partition pruning).
+    """
+    stmt = select(*REQUEST_OUT_COLUMNS).where(Request.user_id == user_id)
+    if since is not None:
+        stmt = stmt.where(Request.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(Request.created_at < until)
+    res = await session.execute(stmt.order_by(Request.id.desc()))
+    return [dict(row) for row in res.mappings()]
 
 
 async def patch_status(
     session: AsyncSession, request_id: int, status: str, reason: Optional[str]
 ) -> Optional[Request]:
     """
-    Изменить статус заявки и при необходимости указать причину.
-    Возвращает обновлённую заявку или None, если не найдена.
+    Изменить статус pending-заявки и при необходимости указать причину.
+    Возвращает обновлённую заявку или None, если не найдена или уже завершена.
+    """
+    updated = await patch_statuses(session, [(request_id, status, reason, None)])
+    return updated.get(request_id)
+
+
+async def patch_statuses(
+    session: AsyncSession,
+    items: Sequence[Tuple[int, str, Optional[str], Optional[datetime]]],
+) -> Dict[int, Request]:
+    """
+    Применить пачку переходов статусов одним UPDATE ... RETURNING и одним commit.
+    Для Postgres используется UPDATE ... FROM (VALUES ...), для прочих диалектов
+    (SQLite в тестах) — эквивалентный UPDATE с CASE по id.
+    Меняются только заявки в статусе pending: завершённая (в том числе
+    отменённая) заявка не перезаписывается, её id в результат не попадает.
+    При повторе id в пачке побеждает последний элемент.
+    Если у всех элементов известен created_at заявки, в Postgres UPDATE
+    сопоставляет и его, а границы пачки по created_at отсекают лишние секции.
+    :param items: последовательность (request_id, status, reason, created_at или None)
+    :return: словарь request_id -> обновлённая заявка; отсутствующие и уже
+             завершённые id в него не попадают
     """
-    res = await session.execute(select(Request).where(Request.id == request_id))
-    req = res.scalar_one_or_none()
-    if not req:
-        return None
-    req.status = status
-    req.reason = reason
+    latest = {
+        request_id: (status, reason, created_at)
+        for request_id, status, reason, created_at in items
+    }
+    if not latest:
+        return {}
+    now = datetime.now(timezone.utc)
+    if session.get_bind().dialect.name == "postgresql":
+        v = values(
+            column("id", Integer),
+            column("status", String),
+            column("reason", Text),
+            column("created_at", DateTime(timezone=True)),
+            name="v",
+        ).data([(rid, st, rs, ca) for rid, (st, rs, ca) in latest.items()])
+        table = Request.__table__
+        stmt = update(table).where(table.c.id == v.c.id, table.c.status == "pending")
+        created = [ca for _, _, ca in latest.values()]
+        if all(ca is not None for ca in created):
+            stmt = stmt.where(
+                table.c.created_at == v.c.created_at,
+                table.c.created_at.between(min(created), max(created)),
+            )
+        stmt = (
+            stmt
+            .values(status=v.c.status, reason=v.c.reason, updated_at=now)
+            .returning(*table.c)
+        )
+        res = await session.execute(stmt)
+        updated = [Request(**{c.key: m[c] for c in table.c}) for m in res.mappings()]
+    else:
+        stmt = (
+            update(Request)
+            .where(Request.id.in_(list(latest)), Request.status == "pending")
+            .values(
+                status=case(
+                    {rid: st for rid, (st, _, _) in latest.items()}, value=Request.id
+                ),
+                reason=case(
+                    {rid: rs for rid, (_, rs, _) in latest.items()}, value=Request.id
+                ),
+                updated_at=now,
+            )
+            .returning(Request)
+        )
+        res = await session.execute(
+            stmt, execution_options={"synchronize_session": False}
+        )
+        updated = list(res.scalars().all())
+    # условие status = 'pending' гарантирует, что прежний статус — pending
+    await stats.record_transitions(
+        session,
+        [(req.created_at, now, req.kind, "pending", req.status) for req in updated],
+    )
+    await session.commit()
+    return {req.id: req for req in updated}
+
+
+async def cancel_pending(
+    session: AsyncSession, user_ids: Sequence[str], reason: Optional[str]
+) -> List[Request]:
+    """
+    Отменить все pending-заявки пользователей одним UPDATE ... RETURNING
+    (status='cancelled'); заявки, уже получившие решение, не трогаются.
+    :return: отменённые заявки
+    """
+    if not user_ids:
+        return []
+    now = datetime.now(timezone.utc)
+    stmt = (
+        update(Request)
+        .where(Request.user_id.in_(list(user_ids)), Request.status == "pending")
+        .values(status="cancelled", reason=reason, updated_at=now)
+        .returning(Request)
+    )
+    res = await session.execute(stmt, execution_options={"synchronize_session": False})
+    cancelled = list(res.scalars().all())
+    await stats.record_transitions(
+        session,
+        [(req.created_at, now, req.kind, "pending", "cancelled") for req in cancelled],
+    )
+    await session.commit()
+    return cancelled
+
+
+async def abandon_request(
+    session: AsyncSession, request_id: int, reason: str
+) -> Optional[Request]:
+    """
+    Снять заявку, событие которой не удалось опубликовать: pending-заявка
+    становится cancelled (иначе дедупликация вечно возвращала бы её, хотя
+    consumer о ней не узнает), а её Idempotency-Key освобождается, чтобы
+    повтор запроса с тем же ключом создал заявку заново.
+    :return: отменённая заявка или None, если она уже не pending
+    """
+    now = datetime.now(timezone.utc)
+    res = await session.execute(
+        update(Request)
+        .where(Request.id == request_id, Request.status == "pending")
+        .values(status="cancelled", reason=reason, updated_at=now)
+        .returning(Request),
+        execution_options={"synchronize_session": False},
+    )
+    req = res.scalars().one_or_none()
+    if req is not None:
+        await stats.record_transitions(
+            session, [(req.created_at, now, req.kind, "pending", "cancelled")]
+        )
+    await session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.request_id == request_id)
+    )
     await session.commit()
-    await session.refresh(req)
     return req
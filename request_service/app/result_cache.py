@@ -0,0 +1,170 @@
+"""
+Кэш результатов заявок для GET /requests/{request_id}.
+
+Заявка в статусе approved/rejected/cancelled больше не меняется, поэтому
+хранится в кэше бессрочно (до вытеснения LRU) и отдаётся с долгоживущими
+Cache-Control: immutable и ETag. Заявка в pending кэшируется лишь на
+REQUEST_CACHE_PENDING_TTL секунд: коллбеки patch_status в этом процессе
+сбрасывают запись сразу, смену статуса через другой экземпляр процесс
+увидит не позже чем через TTL.
+
+Локальный уровень — ограниченный LRU в памяти процесса. Завершённые
+заявки дополнительно пишутся в общий backend (REQUEST_CACHE_BACKEND —
+"модуль:фабрика", возвращающая объект с async get/set/delete, например
+поверх Redis; сериализацию значений выполняет сам backend), чтобы
+экземпляры сервиса не читали одну и ту же заявку из БД каждый.
+
+Гонка «чтение pending из БД — коллбек — запись в кэш» закрыта меткой
+begin(): pending-строка, прочитанная до инвалидации, в кэш не попадает.
+"""
+
+import importlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Protocol, Tuple
+
+REQUEST_CACHE_SIZE = int(os.getenv("REQUEST_CACHE_SIZE", "10000"))
+REQUEST_CACHE_PENDING_TTL = float(os.getenv("REQUEST_CACHE_PENDING_TTL", "1"))
+REQUEST_CACHE_BACKEND = os.getenv("REQUEST_CACHE_BACKEND", "")
+
+FINAL_STATUSES = frozenset({"approved", "rejected", "cancelled"})
+FINAL_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PENDING_CACHE_CONTROL = "no-cache"
+
+
+class CacheBackend(Protocol):
+    """Общее хранилище завершённых заявок (ключ — id заявки)."""
+
+    async def get(self, key: int) -> Optional[dict]: ...
+
+    async def set(self, key: int, value: dict) -> None: ...
+
+    async def delete(self, keys: Iterable[int]) -> None: ...
+
+
+def load_backend(spec: str) -> Optional[CacheBackend]:
+    """Создать backend по строке "пакет.модуль:фабрика" (пусто — без backend)."""
+    if not spec:
+        return None
+    module, sep, attr = spec.partition(":")
+    if not sep:
+        raise ValueError(f"Invalid REQUEST_CACHE_BACKEND {spec!r}, expected module:factory")
+    return getattr(importlib.import_module(module), attr)()
+
+
+def etag(row: dict) -> str:
+    """
+    Слабый ETag заявки: id, статус и время изменения. Слабый — потому что
+    JSON и MessagePack одной версии заявки различаются побайтно.
+    """
+    changed = row.get("updated_at") or row.get("created_at")
+    stamp = int(changed.timestamp() * 1_000_000) if isinstance(changed, datetime) else 0
+    return f'W/"{row["id"]}-{row["status"]}-{stamp}"'
+
+
+def cache_headers(row: dict) -> Dict[str, str]:
+    """Заголовки кэширования ответа: immutable для завершённых, no-cache для pending."""
+    final = row["status"] in FINAL_STATUSES
+    return {
+        "ETag": etag(row),
+        "Cache-Control": FINAL_CACHE_CONTROL if final else PENDING_CACHE_CONTROL,
+        "Vary": "Accept",
+    }
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    backend_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    invalidations: int = 0
+
+    def snapshot(self) -> dict:
+        return asdict(self)
+
+
+class RequestResultCache:
+    """LRU заявок в памяти с TTL для pending и общим backend для завершённых."""
+
+    def __init__(
+        self,
+        max_size: int = REQUEST_CACHE_SIZE,
+        pending_ttl: float = REQUEST_CACHE_PENDING_TTL,
+        backend: Optional[CacheBackend] = None,
+    ):
+        self.max_size = max_size
+        self.pending_ttl = pending_ttl
+        self.backend = backend
+        self.stats = CacheStats()
+        # id -> (срок годности или None для завершённых, строка заявки)
+        self._entries: "OrderedDict[int, Tuple[Optional[float], dict]]" = OrderedDict()
+        self._epoch = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def begin(self) -> int:
+        """Метка перед чтением из БД; передаётся в put()."""
+        return self._epoch
+
+    async def get(self, request_id: int) -> Optional[dict]:
+        entry = self._entries.get(request_id)
+        if entry is not None:
+            expires, row = entry
+            if expires is None or time.monotonic() < expires:
+                self._entries.move_to_end(request_id)
+                self.stats.hits += 1
+                return row
+            del self._entries[request_id]
+        if self.backend is not None:
+            row = await self.backend.get(request_id)
+            if row is not None:
+                self._store(request_id, None, row)
+                self.stats.backend_hits += 1
+                return row
+        self.stats.misses += 1
+        return None
+
+    async def put(self, row: dict, since: Optional[int] = None) -> None:
+        """
+        Запомнить строку заявки. Pending-строка, прочитанная до инвалидации
+        (since старше текущей метки), пропускается как возможно устаревшая.
+        """
+        if row["status"] in FINAL_STATUSES:
+            self._store(row["id"], None, row)
+            if self.backend is not None:
+                await self.backend.set(row["id"], row)
+        elif self.pending_ttl > 0 and (since is None or since == self._epoch):
+            self._store(row["id"], time.monotonic() + self.pending_ttl, row)
+        else:
+            return
+        self.stats.stores += 1
+
+    async def invalidate(self, request_ids: Iterable[int]) -> None:
+        """Забыть заявки после смены статуса (локально и в backend)."""
+        ids = list(request_ids)
+        if not ids:
+            return
+        self._epoch += 1
+        for request_id in ids:
+            self._entries.pop(request_id, None)
+        if self.backend is not None:
+            await self.backend.delete(ids)
+        self.stats.invalidations += len(ids)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._epoch += 1
+
+    def _store(self, request_id: int, expires: Optional[float], row: dict) -> None:
+        self._entries[request_id] = (expires, row)
+        self._entries.move_to_end(request_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+request_cache = RequestResultCache(backend=load_backend(REQUEST_CACHE_BACKEND))
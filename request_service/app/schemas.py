@@ -1,11 +1,28 @@
-from pydantic import BaseModel
-from typing import Literal, List, Optional
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, Literal, List, Optional
 
 
 class CreateRequest(BaseModel):
     user_id: str
     kind: Literal["access", "group"]
     target_id: int
+    # срок временной выдачи (например, DB_ADMIN на 4 часа); None — бессрочно
+    expires_at: Optional[datetime] = None
+    # полоса очереди: critical — срочные (дежурный, инцидент), bulk — массовые
+    # (онбординг пачками); bulk не задерживает critical и normal
+    priority: Literal["critical", "normal", "bulk"] = "normal"
+
+    @field_validator("expires_at")
+    @classmethod
+    def _expires_in_future(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        if value <= datetime.now(timezone.utc):
+            raise ValueError("expires_at must be in the future")
+        return value
 
 
 class RequestOut(BaseModel):
@@ -15,8 +32,82 @@ class RequestOut(BaseModel):
     target_id: int
     status: str
     reason: Optional[str] = None
+    expires_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
 
 class PatchStatus(BaseModel):
     status: Literal["approved", "rejected", "pending"]
     reason: Optional[str] = None
+
+
+class CancelPendingBatch(BaseModel):
+    """Отмена pending-заявок пользователей (офбординг), одним вызовом."""
+
+    user_ids: List[str] = Field(min_length=1, max_length=1000)
+    reason: Optional[str] = None
+
+
+class CancelPendingResponse(BaseModel):
+    cancelled: List[RequestOut]
+
+
+class PatchStatusItem(PatchStatus):
+    request_id: int
+    # время создания заявки из сообщения очереди (для отсечения секций)
+    created_at: Optional[datetime] = None
+
+
+class PatchStatusBatch(BaseModel):
+    items: List[PatchStatusItem]
+
+
+class PatchStatusResult(BaseModel):
+    """
+    Результат по одному элементу пачки: found=True, если заявка в запрошенном
+    статусе (в том числе уже была в нём). request — её текущее состояние
+    (None, если заявка не найдена).
+    """
+
+    request_id: int
+    found: bool
+    request: Optional[RequestOut] = None
+
+
+class PatchStatusBatchResponse(BaseModel):
+    results: List[PatchStatusResult]
+
+
+class StatsBucket(BaseModel):
+    bucket: datetime
+    kind: str
+    status: str
+    count: int
+
+
+class LatencyBin(BaseModel):
+    """Корзина гистограммы: lt — верхняя граница в секундах (None — открытая)."""
+
+    lt: Optional[float] = None
+    count: int
+
+
+class LatencyStats(BaseModel):
+    """Перцентили задержки решения (секунды) для итогового статуса или 'all'."""
+
+    status: str
+    count: int
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+    histogram: List[LatencyBin]
+
+
+class RequestStatsResponse(BaseModel):
+    since: datetime
+    until: datetime
+    granularity: str
+    buckets: List[StatsBucket]
+    totals: Dict[str, int]
+    latency: List[LatencyStats]
@@ -0,0 +1,217 @@
+"""
+Инкрементальные роллапы статистики заявок и запросы к ним.
+
+Счётчики ведутся в тех же транзакциях, что и изменения заявок
+(repositories.create_request / patch_statuses), поэтому GET /stats/requests
+читает только компактные почасовые таблицы, а не саму requests.
+"""
+
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import RequestLatencyHourly, RequestStatsHourly
+
+# upper bounds (seconds) of latency histogram bins; the last bin is open-ended
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800, 3600,
+)
+FINAL_STATUSES = ("approved", "rejected")
+
+
+def as_utc(dt: datetime) -> datetime:
+    """Привести момент времени к UTC; naive-значения (SQLite) считаются UTC."""
+    return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def hour_bucket(dt: datetime) -> datetime:
+    """Начало часа (UTC) для момента времени."""
+    return as_utc(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def latency_bin(seconds: float) -> int:
+    """Индекс корзины гистограммы: число границ, не превышающих значение."""
+    return bisect_right(LATENCY_BUCKETS, seconds)
+
+
+def percentile(histogram: Dict[int, int], q: float) -> Optional[float]:
+    """
+    Оценить квантиль q (0..1) по гистограмме {bin: count} линейной
+    интерполяцией внутри корзины. Для открытой последней корзины
+    возвращается её нижняя граница.
+    """
+    total = sum(histogram.values())
+    if total == 0:
+        return None
+    rank = q * total
+    seen = 0
+    for b in sorted(histogram):
+        count = histogram[b]
+        if count and seen + count >= rank:
+            lower = LATENCY_BUCKETS[b - 1] if b > 0 else 0.0
+            if b >= len(LATENCY_BUCKETS):
+                return lower
+            upper = LATENCY_BUCKETS[b]
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return LATENCY_BUCKETS[-1]
+
+
+def _insert_for(session: AsyncSession):
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+async def _upsert_counts(session: AsyncSession, model, keys: Iterable[str], deltas: Counter) -> None:
+    """
+    Прибавить дельты к счётчикам одним INSERT ... ON CONFLICT DO UPDATE.
+    Строки вставляются в порядке ключей: Postgres блокирует их в порядке
+    VALUES, и транзакции, задевающие одни и те же горячие строки (например,
+    (час, тип, pending) и (час, тип, approved)), берут блокировки в одном
+    порядке вместо взаимной блокировки.
+    """
+    rows = [
+        dict(zip(keys, key), count=delta)
+        for key, delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return
+    insert = _insert_for(session)
+    stmt = insert(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={"count": model.count + stmt.excluded.count},
+    )
+    await session.execute(stmt)
+
+
+async def record_created(
+    session: AsyncSession, items: Iterable[Tuple[datetime, str]]
+) -> None:
+    """Учесть созданные заявки: items — (created_at, kind). Без commit."""
+    deltas = Counter((hour_bucket(created), kind, "pending") for created, kind in items)
+    await _upsert_counts(session, RequestStatsHourly, ("bucket", "kind", "status"), deltas)
+
+
+async def record_transitions(
+    session: AsyncSession,
+    items: Iterable[Tuple[datetime, datetime, str, str, str]],
+) -> None:
+    """
+    Учесть смены статусов: items — (created_at, updated_at, kind, old, new).
+    Переносит заявку между статусами в часе её создания; для перехода из
+    pending в итоговый статус добавляет задержку решения в гистограмму.
+    Без commit.
+    """
+    counts: Counter = Counter()
+    latency: Counter = Counter()
+    for created, updated, kind, old, new in items:
+        if old == new:
+            continue
+        bucket = hour_bucket(created)
+        counts[(bucket, kind, old)] -= 1
+        counts[(bucket, kind, new)] += 1
+        if old == "pending" and new in FINAL_STATUSES:
+            seconds = max((as_utc(updated) - as_utc(created)).total_seconds(), 0.0)
+            latency[(hour_bucket(updated), kind, new, latency_bin(seconds))] += 1
+    await _upsert_counts(session, RequestStatsHourly, ("bucket", "kind", "status"), counts)
+    await _upsert_counts(
+        session, RequestLatencyHourly, ("bucket", "kind", "status", "bin"), latency
+    )
+
+
+async def get_request_stats(
+    session: AsyncSession,
+    since: datetime,
+    until: datetime,
+    kind: Optional[str] = None,
+    granularity: str = "hour",
+) -> dict:
+    """
+    Вернуть счётчики по (период, тип, статус) и перцентили задержки решения
+    за полуинтервал [since, until). granularity: 'hour' | 'day'.
+    """
+    counts_stmt = (
+        select(
+            RequestStatsHourly.bucket,
+            RequestStatsHourly.kind,
+            RequestStatsHourly.status,
+            RequestStatsHourly.count,
+        )
+        .where(RequestStatsHourly.bucket >= hour_bucket(since))
+        .where(RequestStatsHourly.bucket < until)
+        .where(RequestStatsHourly.count != 0)
+    )
+    latency_stmt = (
+        select(
+            RequestLatencyHourly.status,
+            RequestLatencyHourly.bin,
+            func.sum(RequestLatencyHourly.count),
+        )
+        .where(RequestLatencyHourly.bucket >= hour_bucket(since))
+        .where(RequestLatencyHourly.bucket < until)
+        .group_by(RequestLatencyHourly.status, RequestLatencyHourly.bin)
+    )
+    if kind is not None:
+        counts_stmt = counts_stmt.where(RequestStatsHourly.kind == kind)
+        latency_stmt = latency_stmt.where(RequestLatencyHourly.kind == kind)
+
+    buckets: Counter = Counter()
+    totals: Counter = Counter()
+    for bucket, k, status, count in await session.execute(counts_stmt):
+        bucket = hour_bucket(bucket)
+        if granularity == "day":
+            bucket = bucket.replace(hour=0)
+        buckets[(bucket, k, status)] += count
+        totals[status] += count
+
+    histograms: Dict[str, Dict[int, int]] = {}
+    for status, b, count in await session.execute(latency_stmt):
+        histograms.setdefault(status, {})[b] = int(count)
+    overall: Counter = Counter()
+    for hist in histograms.values():
+        overall.update(hist)
+    if histograms:
+        histograms["all"] = dict(overall)
+
+    return {
+        "since": since,
+        "until": until,
+        "granularity": granularity,
+        "buckets": [
+            {"bucket": b, "kind": k, "status": st, "count": c}
+            for (b, k, st), c in sorted(buckets.items())
+        ],
+        "totals": dict(totals),
+        "latency": [
+            {
+                "status": status,
+                "count": sum(hist.values()),
+                "p50": percentile(hist, 0.50),
+                "p95": percentile(hist, 0.95),
+                "p99": percentile(hist, 0.99),
+                "histogram": [
+                    {
+                        "lt": LATENCY_BUCKETS[b] if b < len(LATENCY_BUCKETS) else None,
+                        "count": hist[b],
+                    }
+                    for b in sorted(hist)
+                ],
+            }
+            for status, hist in sorted(histograms.items())
+        ],
+    }
+
+
+def default_window(now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """Окно по умолчанию: последние 24 часа, включая текущий час."""
+    end = hour_bucket(now or datetime.now(timezone.utc)) + timedelta(hours=1)
+    return end - timedelta(hours=24), end
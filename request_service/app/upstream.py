@@ -0,0 +1,202 @@
+"""
+Общий HTTP-клиент Request Service для проксирования в Access Service.
+
+- один пул соединений httpx.AsyncClient на время жизни приложения, с таймаутами;
+- single-flight: одинаковые одновременные GET объединяются в один вызов Access;
+- короткий TTL-кэш для ответов, которые явно его запрашивают
+  (требования ресурса к доступам);
+- автомат отключения на конечную точку, хеджирование GET после p95 и
+  таймаут по остатку бюджета входящего запроса (resilience);
+- счётчики сэкономленных вызовов для GET /proxy/stats.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from acs_common import tracing
+from acs_common.resilience import ResilientClient
+
+from . import metrics
+
+ACCESS_SERVICE_URL = os.getenv("ACCESS_SERVICE_URL", "http://localhost:8001")
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "5"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "2"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+RESOURCE_ACCESS_CACHE_TTL = float(os.getenv("RESOURCE_ACCESS_CACHE_TTL", "5"))
+PROXY_CACHE_SIZE = int(os.getenv("PROXY_CACHE_SIZE", "1024"))
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+UPSTREAM_BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET_SECONDS", "5"))
+UPSTREAM_HEDGE = os.getenv("UPSTREAM_HEDGE", "1") == "1"
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.getenv("UPSTREAM_HEDGE_MIN_SAMPLES", "20"))
+# Бюджет времени входящего запроса без заголовка X-Deadline-Ms (пусто — без срока).
+REQUEST_DEADLINE_SECONDS = (
+    float(os.environ["REQUEST_DEADLINE_SECONDS"])
+    if os.getenv("REQUEST_DEADLINE_SECONDS")
+    else None
+)
+
+UpstreamResult = Tuple[int, Any]
+
+
+@dataclass
+class ProxyStats:
+    """Счётчики вызовов Access: реальных и сэкономленных."""
+
+    upstream_calls: int = 0
+    coalesced: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    invalidations: int = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        data = asdict(self)
+        data["saved"] = self.coalesced + self.cache_hits
+        return data
+
+# Транспорт исходящих вызовов: None — сеть; в режиме монолита — вызовы
+# приложения Access в том же процессе.
+transport: Optional[httpx.AsyncBaseTransport] = None
+
+
+class AccessProxy:
+    """
+    Клиент Access Service с объединением одинаковых GET и TTL-кэшем.
+    invalidate_user() забывает кэш и незавершённые запросы пользователя,
+    поэтому чтения после отзыва не присоединяются к запросам, начатым
+    до него, и не берут их результат из кэша.
+    """
+
+    def __init__(
+        self,
+        base_url: str = ACCESS_SERVICE_URL,
+        client: Optional[httpx.AsyncClient] = None,
+        cache_size: int = PROXY_CACHE_SIZE,
+    ):
+        self.base_url = base_url
+        self.stats = ProxyStats()
+        self._client = client
+        self._resilient: Optional[ResilientClient] = None
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[float, UpstreamResult]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=tracing.TracingTransport(
+                    transport
+                    or httpx.AsyncHTTPTransport(
+                        limits=httpx.Limits(max_connections=UPSTREAM_MAX_CONNECTIONS)
+                    )
+                ),
+                timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+                event_hooks=metrics.httpx_event_hooks(),
+            )
+        return self._client
+
+    @property
+    def resilient(self) -> ResilientClient:
+        client = self.client
+        if self._resilient is None or self._resilient.client is not client:
+            self._resilient = ResilientClient(
+                client,
+                timeout=UPSTREAM_TIMEOUT,
+                failure_threshold=UPSTREAM_BREAKER_FAILURES,
+                reset_timeout=UPSTREAM_BREAKER_RESET_SECONDS,
+                hedge=UPSTREAM_HEDGE,
+                hedge_min_samples=UPSTREAM_HEDGE_MIN_SAMPLES,
+            )
+        return self._resilient
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(
+        self,
+        path: str,
+        cache_ttl: float = 0.0,
+        bypass_cache: bool = False,
+        endpoint: Optional[str] = None,
+    ) -> UpstreamResult:
+        """
+        GET в Access с объединением одинаковых одновременных запросов.
+        :param path: путь в Access, он же ключ объединения и кэша
+        :param endpoint: шаблон пути для автомата и порога хеджирования
+        :param cache_ttl: если > 0 — успешный ответ кэшируется на столько секунд
+        :param bypass_cache: не читать кэш (ответ всё равно обновит его)
+        :return: (HTTP-статус, JSON-тело)
+        """
+        key = path
+        if cache_ttl > 0 and not bypass_cache:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.stats.cache_hits += 1
+                return entry[1]
+            self.stats.cache_misses += 1
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # отменили ведущий запрос, а не этот: выполнить вызов заново
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                return await self.get(path, cache_ttl, bypass_cache, endpoint)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            self.stats.upstream_calls += 1
+            r = await self.resilient.get(f"{self.base_url}{path}", endpoint or f"GET {path}")
+            result = (r.status_code, r.json())
+        except asyncio.CancelledError:
+            # ведомые не должны ждать результата, которого не будет
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # consumed by the waiters (if any); avoid "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        future.set_result(result)
+        if cache_ttl > 0 and result[0] == 200:
+            self._cache[key] = (time.monotonic() + cache_ttl, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    async def post(
+        self, path: str, json: Any, endpoint: Optional[str] = None
+    ) -> UpstreamResult:
+        self.stats.upstream_calls += 1
+        r = await self.resilient.post(
+            f"{self.base_url}{path}", endpoint or f"POST {path}", json=json
+        )
+        return r.status_code, r.json()
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Забыть кэш и незавершённые GET, относящиеся к пользователю."""
+        prefix = f"/user/{user_id}/"
+        for key in [k for k in self._cache if k.startswith(prefix)]:
+            del self._cache[key]
+        for key in [k for k in self._inflight if k.startswith(prefix)]:
+            del self._inflight[key]
+        self.stats.invalidations += 1
+
+
+access_proxy = AccessProxy()
@@ -3,7 +3,7 @@ import pytest
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-from access_service.app.main import app, get_session
+from access_service.app.main import app, get_read_session, get_session
 from access_service.app.db import Base
 from access_service.app import models
 
@@ -15,6 +15,7 @@ async def test_session_factory():
         await conn.run_sync(Base.metadata.create_all)
     factory = async_sessionmaker(bind=engine, expire_on_commit=False)
     yield factory
+    await engine.dispose()
 
 
 @pytest.fixture(autouse=True)
@@ -24,6 +25,7 @@ async def override_session(test_session_factory):
             yield s
 
     app.dependency_overrides[get_session] = _get_session
+    app.dependency_overrides[get_read_session] = _get_session
     yield
     app.dependency_overrides.clear()
 
@@ -81,3 +83,604 @@ async def test_apply_group_and_rights(test_session_factory):
         assert r2.status_code == 200
         data = r2.json()
         assert any(g["code"] == "DEVELOPER" for g in data["groups"])
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_until_own_write(monkeypatch, test_session_factory):
+    from access_service.app import db, rpc
+    from access_service.app import repositories as repo
+
+    replica_engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    replica = async_sessionmaker(bind=replica_engine, expire_on_commit=False)
+
+    monkeypatch.setattr(db, "async_session_factory", test_session_factory)
+    monkeypatch.setattr(db, "read_session_factory", replica)
+    monkeypatch.setattr(db.recent_writes, "window", 60)
+    app.dependency_overrides.pop(get_read_session)
+
+    async with test_session_factory() as s:
+        g = models.RightGroup(code="REPLICA_LAG")
+        res = models.Resource(name="replica-lag")
+        a = models.Access(code="REPLICA_READ")
+        s.add_all([g, res, a])
+        await s.flush()
+        s.add(models.ResourceAccess(resource_id=res.id, access_id=a.id))
+        await s.commit()
+        group_id, resource_id = g.id, res.id
+
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            r = await ac.post(
+                "/access/apply",
+                json={
+                    "request_id": 7,
+                    "user_id": "u7",
+                    "kind": "group",
+                    "target_id": group_id,
+                },
+            )
+            assert r.status_code == 200
+            # свежая запись по u7 читается из основной БД
+            own = (await ac.get("/user/u7/rights")).json()
+            assert [g["code"] for g in own["groups"]] == ["REPLICA_LAG"]
+            # остальные чтения — из (отстающей) реплики
+            required = (await ac.get(f"/resource/{resource_id}/access")).json()
+            assert required["required_accesses"] == []
+
+            # чужая запись (другой процесс): реплика её не видит, consistent — видит
+            async with test_session_factory() as s:
+                await repo.apply_access(s, "u9", "group", group_id)
+            lagging = (await ac.get("/user/u9/rights")).json()
+            assert lagging["groups"] == []
+            fresh = (await ac.get("/user/u9/rights", params={"consistent": "true"})).json()
+            assert [g["code"] for g in fresh["groups"]] == ["REPLICA_LAG"]
+            by_rpc = await rpc.user_rights({"user_id": "u9", "consistent": True})
+            assert [g["code"] for g in by_rpc["groups"]] == ["REPLICA_LAG"]
+    finally:
+        await replica_engine.dispose()
+
+    assert db.get_read_factory("u8") is replica
+
+
+@pytest.mark.asyncio
+async def test_snapshot_bootstrap_then_changes(tmp_path, test_session_factory):
+    from access_service.app import repositories as repo
+    from access_service.app import snapshot
+
+    async with test_session_factory() as s:
+        g = models.RightGroup(code="SNAP_GROUP")
+        a = models.Access(code="SNAP_ACCESS")
+        s.add_all([g, a])
+        await s.commit()
+        group_id, access_id = g.id, a.id
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        for user_id, kind, target_id in [
+            ("snap-b", "group", group_id),
+            ("snap-a", "access", access_id),
+            ("snap-a", "group", group_id),
+        ]:
+            r = await ac.post(
+                "/access/apply",
+                json={"request_id": 1, "user_id": user_id, "kind": kind, "target_id": target_id},
+            )
+            assert r.status_code == 200
+
+        r = await ac.get("/snapshot")
+        assert r.status_code == 200
+        path = tmp_path / "access.snap"
+        path.write_bytes(r.content)
+        snap = snapshot.load(str(path))
+        assert int(r.headers["X-Snapshot-Version"]) == snap.version > 0
+        assert snap.groups_of("snap-a") == [group_id]
+        assert snap.accesses_of("snap-a") == [access_id]
+        assert snap.groups_of("snap-b") == [group_id]
+        assert snap.accesses_of("unknown") == []
+
+        await ac.post(
+            "/user/snap-a/revoke", json={"kind": "group", "target_id": group_id}
+        )
+        changes = (await ac.get("/changes", params={"since": snap.version})).json()
+        assert [(c["user_id"], c["op"]) for c in changes["changes"]] == [
+            ("snap-a", "remove")
+        ]
+        assert changes["version"] == changes["changes"][-1]["version"] == snap.version + 1
+        empty = (await ac.get("/changes", params={"since": changes["version"]})).json()
+        assert empty == {"version": changes["version"], "changes": []}
+
+        # записи одной транзакции — одна версия, страница её не разрывает
+        async with test_session_factory() as s:
+            await repo.delete_memberships(s, ["snap-a", "snap-b"])
+        page = (
+            await ac.get("/changes", params={"since": changes["version"], "limit": 1})
+        ).json()
+        assert len(page["changes"]) == 2
+        assert {c["version"] for c in page["changes"]} == {page["version"]}
+
+
+def test_snapshot_encoding_round_trip():
+    from access_service.app import snapshot
+
+    groups = [("u1", 3), ("é-user", 5), ("é-user", 70000)]
+    accesses = [("u0", 1), ("u1", 2**40)]
+    snap = snapshot.decode(snapshot.encode(42, groups, accesses))
+    assert snap.version == 42
+    assert snap.users == ["u0", "u1", "é-user"]
+    assert snap.groups_of("é-user") == [5, 70000]
+    assert snap.groups_of("u0") == []
+    assert snap.accesses_of("u1") == [2**40]
+    assert len(snap) == 5
+    with pytest.raises(ValueError):
+        snapshot.decode(b"x" * snapshot.HEADER.size)
+
+
+@pytest.mark.asyncio
+async def test_time_bound_grants_expire_via_scheduler(monkeypatch, test_session_factory):
+    from datetime import datetime, timedelta, timezone
+    from access_service.app import db
+    from access_service.app.expiry import ExpiryScheduler
+
+    monkeypatch.setattr(db, "async_session_factory", test_session_factory)
+    async with test_session_factory() as s:
+        g = models.RightGroup(code="DB_ADMIN_TEMP")
+        a = models.Access(code="TEMP_READ")
+        s.add_all([g, a])
+        await s.commit()
+        group_id, access_id = g.id, a.id
+
+    start = datetime.now(timezone.utc)
+    now = [start]
+    scheduler = ExpiryScheduler(batch_size=1, horizon=3600, clock=lambda: now[0])
+    await scheduler.load()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+
+        async def apply(user_id, kind, target_id, expires_at):
+            r = await ac.post(
+                "/access/apply",
+                json={
+                    "request_id": 1,
+                    "user_id": user_id,
+                    "kind": kind,
+                    "target_id": target_id,
+                    "expires_at": expires_at and expires_at.isoformat(),
+                },
+            )
+            assert r.status_code == 200
+            if expires_at:
+                scheduler.schedule(user_id, kind, target_id, expires_at)
+
+        await apply("exp-u1", "group", group_id, start + timedelta(hours=4))
+        await apply("exp-u1", "access", access_id, start + timedelta(minutes=30))
+        await apply("exp-u2", "group", group_id, start + timedelta(minutes=10))
+        # бессрочная выдача поверх временной отменяет истечение
+        await apply("exp-u2", "group", group_id, None)
+        await apply("exp-u3", "access", access_id, start + timedelta(minutes=20))
+        # уже истёкшая, но ещё не отозванная выдача не видна в правах
+        await apply("exp-u4", "access", access_id, start - timedelta(minutes=1))
+        rights = (await ac.get("/user/exp-u4/rights")).json()
+        assert rights["direct_accesses"] == []
+
+        # за горизонтом выдача в кучу не попадает, остальные — по дедлайну
+        assert len(scheduler) == 4
+        version = (await ac.get("/changes", params={"limit": 10000})).json()["version"]
+
+        now[0] = start + timedelta(minutes=45)
+        assert await scheduler.run_due() == 3
+
+        rights = (await ac.get("/user/exp-u1/rights")).json()
+        assert [g["code"] for g in rights["groups"]] == ["DB_ADMIN_TEMP"]
+        assert rights["direct_accesses"] == []
+        assert [g["code"] for g in (await ac.get("/user/exp-u2/rights")).json()["groups"]] == [
+            "DB_ADMIN_TEMP"
+        ]
+        changes = (await ac.get("/changes", params={"since": version})).json()["changes"]
+        assert sorted((c["user_id"], c["kind"], c["op"]) for c in changes) == [
+            ("exp-u1", "access", "remove"),
+            ("exp-u3", "access", "remove"),
+            ("exp-u4", "access", "remove"),
+        ]
+
+        # следующее окно подхватывает выдачу на 4 часа
+        now[0] = start + timedelta(hours=5)
+        await scheduler.load()
+        assert await scheduler.run_due() == 1
+        assert (await ac.get("/user/exp-u1/rights")).json()["groups"] == []
+
+
+@pytest.mark.asyncio
+async def test_expiry_keeps_grants_scheduled_during_load(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from access_service.app import expiry
+    from access_service.app.expiry import ExpiryScheduler
+
+    start = datetime.now(timezone.utc)
+    now = [start]
+    scheduler = ExpiryScheduler(horizon=3600, clock=lambda: now[0])
+    stale = start + timedelta(minutes=10)
+    scheduler.loaded_until = start + timedelta(minutes=30)
+
+    async def get_expiring(session, until):
+        # commit выдач пришёлся на момент после снимка запроса
+        scheduler.schedule("u-old", "group", 1, stale)
+        scheduler.schedule("u-new", "access", 2, start + timedelta(minutes=50))
+        scheduler.schedule("u-far", "access", 3, start + timedelta(hours=2))
+        return [(stale, "group", "u-old", 1)]
+
+    monkeypatch.setattr(expiry.repo, "get_expiring", get_expiring)
+    await scheduler.load()
+    assert sorted(item[2] for item in scheduler._heap) == ["u-new", "u-old"]
+    assert scheduler.loaded_until == start + timedelta(hours=1)
+
+
+@pytest.mark.asyncio
+async def test_audit_log_is_written_behind_in_batches(monkeypatch, test_session_factory):
+    from access_service.app import db
+    from access_service.app import repositories as repo
+    from access_service.app.audit import audit_log
+
+    monkeypatch.setattr(db, "async_session_factory", test_session_factory)
+    await audit_log.flush()  # события предыдущих тестов
+    async with test_session_factory() as s:
+        g = models.RightGroup(code="AUDITED")
+        s.add(g)
+        await s.commit()
+        group_id = g.id
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        body = {"request_id": 42, "user_id": "aud-u", "kind": "group", "target_id": group_id}
+        await ac.post("/access/apply", json=body)
+        await ac.post("/access/apply", json=body)  # без изменений — без события
+        await ac.post("/user/aud-u/revoke", json={"kind": "group", "target_id": group_id})
+        assert len(audit_log) == 2 and audit_log.lag() >= 0
+        # запись отложена: в БД событий ещё нет
+        assert (await ac.get("/audit", params={"user_id": "aud-u"})).json() == []
+
+        calls = []
+        original = repo.insert_audit_events
+
+        async def flaky(session, rows):
+            calls.append(len(rows))
+            if len(calls) == 1:
+                raise RuntimeError("db is down")
+            await original(session, rows)
+
+        monkeypatch.setattr(repo, "insert_audit_events", flaky)
+        with pytest.raises(RuntimeError):
+            await audit_log.flush()
+        assert len(audit_log) == 2
+
+        # остановка сбрасывает буфер целиком
+        audit_log.start()
+        await audit_log.stop()
+        assert len(audit_log) == 0 and calls == [2, 2]
+
+        events = (await ac.get("/audit", params={"user_id": "aud-u"})).json()
+        assert [(e["action"], e["request_id"], e["source"]) for e in events] == [
+            ("grant", 42, "http"),
+            ("revoke", None, "http"),
+        ]
+        before = (await ac.get(
+            "/audit", params={"user_id": "aud-u", "until": events[0]["occurred_at"]}
+        )).json()
+        assert before == []
+
+
+@pytest.mark.asyncio
+async def test_catalog_sync_applies_only_differences():
+    from access_service.app import repositories as repo
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def _get_session():
+        async with factory() as s:
+            yield s
+
+    app.dependency_overrides[get_session] = _get_session
+    app.dependency_overrides[get_read_session] = _get_session
+    catalog = {
+        "accesses": [
+            {"code": "DB_READ", "description": "Read"},
+            {"code": "DB_WRITE"},
+            {"code": "API_KEY"},
+        ],
+        "groups": [
+            {"code": "DB_ADMIN", "accesses": ["DB_READ", "DB_WRITE"]},
+            {"code": "DEVELOPER", "accesses": ["API_KEY"]},
+        ],
+        "resources": [
+            {"name": "db_cluster", "accesses": ["DB_READ"]},
+            {"name": "public_api", "accesses": ["API_KEY"]},
+        ],
+    }
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            r = await ac.post("/catalog:sync", json=catalog)
+            assert r.status_code == 200
+            assert r.json()["changed"] is True
+            assert r.json()["group_accesses"]["created"] == 3
+
+            again = (await ac.post("/catalog:sync", json=catalog)).json()
+            assert again["changed"] is False
+
+            yaml_doc = """
+accesses:
+  - {code: DB_READ, description: Read-only}
+  - {code: API_KEY}
+groups:
+  - {code: DB_ADMIN, accesses: [DB_READ]}
+  - {code: DEVELOPER, accesses: [API_KEY]}
+resources:
+  - {name: public_api, accesses: [API_KEY, DB_READ]}
+"""
+            headers = {"Content-Type": "application/yaml"}
+            dry = (
+                await ac.post("/catalog:sync?dry_run=true", content=yaml_doc, headers=headers)
+            ).json()
+            r = await ac.post("/catalog:sync", content=yaml_doc, headers=headers)
+            assert r.json() == {**dry, "dry_run": False}
+            assert r.json()["accesses"] == {"created": 0, "updated": 1, "deleted": 1}
+            assert r.json()["resources"]["deleted"] == 1
+            assert r.json()["resource_accesses"] == {"created": 1, "updated": 0, "deleted": 1}
+
+            async with factory() as s:
+                state = await repo.load_catalog(s)
+            assert set(state["accesses"]) == {"DB_READ", "API_KEY"}
+            assert state["accesses"]["DB_READ"][1] == "Read-only"
+            assert len(state["group_accesses"]) == 2
+
+            resource_id = state["resources"]["public_api"][0]
+            required = (await ac.get(f"/resource/{resource_id}/access")).json()
+            assert sorted(a["code"] for a in required["required_accesses"]) == [
+                "API_KEY",
+                "DB_READ",
+            ]
+
+            group_id = state["groups"]["DEVELOPER"][0]
+            await ac.post(
+                "/access/apply",
+                json={"request_id": 1, "user_id": "cat-u", "kind": "group", "target_id": group_id},
+            )
+            held = await ac.post(
+                "/catalog:sync",
+                json={**catalog, "groups": [{"code": "DB_ADMIN", "accesses": ["DB_READ"]}]},
+            )
+            assert held.status_code == 409
+            assert held.json()["detail"]["groups"] == ["DEVELOPER"]
+
+            bad = await ac.post(
+                "/catalog:sync", json={"groups": [{"code": "G", "accesses": ["NOPE"]}]}
+            )
+            assert bad.status_code == 422
+    finally:
+        await engine.dispose()
+
+
+def test_hash_ring_moves_only_keys_of_new_shard():
+    from access_service.app.sharding import HashRing
+
+    users = [f"user-{i}" for i in range(5000)]
+    before = HashRing(["s0", "s1", "s2"])
+    after = HashRing(["s0", "s1", "s2", "s3"])
+    placed = {u: before.shard_for(u) for u in users}
+    assert all(count > 1000 for count in
+               [list(placed.values()).count(s) for s in ("s0", "s1", "s2")])
+    moved = [u for u in users if after.shard_for(u) != placed[u]]
+    # при добавлении шарда ключи переезжают только на него, примерно 1/4
+    assert all(after.shard_for(u) == "s3" for u in moved)
+    assert 0.15 < len(moved) / len(users) < 0.35
+
+
+@pytest.mark.asyncio
+async def test_sharded_membership_routing_fan_out_and_rebalance(monkeypatch):
+    from access_service.app import db
+    from access_service.app import repositories as repo
+    from access_service.app.rebalance import rebalance
+    from access_service.app.sharding import ShardRouter
+
+    engines = {}
+
+    async def make(name):
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        engines[name] = engine
+        return async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    primary = await make("primary")
+    shard_factories = {name: await make(name) for name in ("s0", "s1", "s2")}
+    two_shards = ShardRouter({n: shard_factories[n] for n in ("s0", "s1")})
+    monkeypatch.setattr(db, "shards", two_shards)
+    monkeypatch.setattr(db, "async_session_factory", primary)
+
+    async def _get_session():
+        async with primary() as s:
+            yield s
+
+    app.dependency_overrides[get_session] = _get_session
+    # чтения прав идут через настоящую фабрику чтения — в шард пользователя
+    app.dependency_overrides.pop(get_read_session)
+    users = [f"shard-u{i}" for i in range(12)]
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            doc = {
+                "accesses": [{"code": "VPN"}, {"code": "WIKI"}],
+                "groups": [{"code": "STAFF", "accesses": ["VPN", "WIKI"]}],
+            }
+            assert (await ac.post("/catalog:sync", json=doc)).status_code == 200
+            async with primary() as s:
+                state = await repo.load_catalog(s)
+            for factory in two_shards.factories.values():
+                async with factory() as s:
+                    assert await repo.load_catalog(s) == state
+            staff = state["groups"]["STAFF"][0]
+            vpn = state["accesses"]["VPN"][0]
+
+            for user_id in users:
+                r = await ac.post(
+                    "/access/apply",
+                    json={"request_id": 1, "user_id": user_id, "kind": "group", "target_id": staff},
+                )
+                assert r.status_code == 200
+            await ac.post(
+                "/access/apply",
+                json={"request_id": 2, "user_id": users[0], "kind": "access", "target_id": vpn},
+            )
+
+            placed = {}
+            for name, factory in two_shards.factories.items():
+                async with factory() as s:
+                    placed[name] = {u async for u in repo.stream_member_users(s)}
+            assert placed["s0"] and placed["s1"]
+            assert all(two_shards.shard_for(u) == name for name, us in placed.items() for u in us)
+
+            rights = (await ac.get(f"/user/{users[0]}/rights")).json()
+            assert sorted(a["code"] for a in rights["effective_accesses"]) == ["VPN", "WIKI"]
+
+            # удаление выданного доступа находит выдачу в шарде (параллельный опрос)
+            held = await ac.post(
+                "/catalog:sync",
+                json={
+                    "accesses": [{"code": "WIKI"}],
+                    "groups": [{"code": "STAFF", "accesses": ["WIKI"]}],
+                },
+            )
+            assert held.status_code == 409
+            assert held.json()["detail"]["accesses"] == ["VPN"]
+
+            assert (await ac.get("/changes")).status_code == 400
+            feed = (await ac.get("/changes?shard=" + two_shards.shard_for(users[0]))).json()
+            assert any(c["user_id"] == users[0] for c in feed["changes"])
+
+            # добавляем шард и переносим пользователей, которых кольцо отдало ему
+            three_shards = ShardRouter(shard_factories)
+            report = await rebalance(three_shards, primary, batch_size=2)
+            moved = [u for u in users if three_shards.shard_for(u) == "s2"]
+            assert moved
+            assert sum(r["users"] for r in report.values()) == len(moved)
+            monkeypatch.setattr(db, "shards", three_shards)
+            async with shard_factories["s2"]() as s:
+                assert await repo.load_catalog(s) == state
+                assert {u async for u in repo.stream_member_users(s)} == set(moved)
+            for user_id in users:
+                rights = (await ac.get(f"/user/{user_id}/rights")).json()
+                assert [g["code"] for g in rights["groups"]] == ["STAFF"]
+            assert await rebalance(three_shards, primary) == {
+                name: {"users": 0, "rows": 0} for name in shard_factories
+            }
+
+            # пока идёт перенос, записи членства отвечают 503 и ничего не меняют
+            async with primary() as s:
+                assert await s.get(models.MembershipFreeze, 1) is not None
+                assert not (await s.get(models.MembershipFreeze, 1)).frozen
+                await repo.set_membership_frozen(s, True)
+            grant = {"request_id": 3, "user_id": users[1], "kind": "access", "target_id": vpn}
+            frozen = await ac.post("/access/apply", json=grant)
+            assert (frozen.status_code, frozen.headers["retry-after"]) == (503, "5")
+            revoke = {"kind": "group", "target_id": staff}
+            assert (await ac.post(f"/user/{users[1]}/revoke", json=revoke)).status_code == 503
+            async with primary() as s:
+                await repo.set_membership_frozen(s, False)
+            assert (await ac.post("/access/apply", json=grant)).status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+        for engine in engines.values():
+            await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_revoke_all_offboards_users_in_one_call(monkeypatch, test_session_factory):
+    import httpx
+    import json
+    from access_service.app import db, offboarding
+    from access_service.app.audit import audit_log
+
+    monkeypatch.setattr(db, "async_session_factory", test_session_factory)
+    await audit_log.flush()  # события предыдущих тестов
+    async with test_session_factory() as s:
+        access = models.Access(code="OFFB_ACCESS")
+        groups = [models.RightGroup(code=f"OFFB_GROUP_{i}") for i in range(2)]
+        s.add_all([access, *groups])
+        await s.commit()
+        access_id, group_ids = access.id, [g.id for g in groups]
+
+    cancel_calls = []
+
+    def request_service(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        cancel_calls.append(body)
+        if body["user_ids"] == ["off-3"]:
+            return httpx.Response(503)
+        cancelled = [{"id": 100 + i, "user_id": u} for i, u in enumerate(body["user_ids"])]
+        return httpx.Response(200, json={"cancelled": cancelled})
+
+    monkeypatch.setattr(
+        offboarding, "_client", httpx.AsyncClient(transport=httpx.MockTransport(request_service))
+    )
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        for user_id in ("off-1", "off-2", "keep"):
+            for kind, target_id in (("access", access_id), ("group", group_ids[0])):
+                body = {"request_id": 1, "user_id": user_id, "kind": kind, "target_id": target_id}
+                assert (await ac.post("/access/apply", json=body)).status_code == 200
+        body = {"request_id": 1, "user_id": "off-2", "kind": "group", "target_id": group_ids[1]}
+        await ac.post("/access/apply", json=body)
+        version = (await ac.get("/changes", params={"since": 0})).json()["version"]
+
+        r = await ac.post("/user/off-1/revoke-all")
+        assert r.status_code == 200
+        assert r.json() == {
+            "user_id": "off-1",
+            "removed": [
+                {"kind": "access", "target_id": access_id},
+                {"kind": "group", "target_id": group_ids[0]},
+            ],
+            "cancelled_requests": [100],
+        }
+
+        r = await ac.post(
+            "/users/revoke-all:batch",
+            json={"user_ids": ["off-2", "off-1", "off-2"], "reason": "Department closed"},
+        )
+        results = r.json()["results"]
+        assert [x["user_id"] for x in results] == ["off-2", "off-1"]
+        assert len(results[0]["removed"]) == 3 and results[1]["removed"] == []
+        assert cancel_calls[-1] == {"user_ids": ["off-2", "off-1"], "reason": "Department closed"}
+
+        # Request Service недоступен: выдачи всё равно отозваны
+        await ac.post(
+            "/access/apply",
+            json={"request_id": 1, "user_id": "off-3", "kind": "access", "target_id": access_id},
+        )
+        r = await ac.post("/user/off-3/revoke-all", json={"reason": "Left"})
+        assert r.status_code == 200
+        assert r.json()["cancelled_requests"] is None
+        assert r.json()["removed"] == [{"kind": "access", "target_id": access_id}]
+
+        for user_id in ("off-1", "off-2", "off-3"):
+            rights = (await ac.get(f"/user/{user_id}/rights")).json()
+            assert rights["groups"] == [] and rights["direct_accesses"] == []
+        kept = (await ac.get("/user/keep/rights")).json()
+        assert len(kept["groups"]) == 1 and len(kept["direct_accesses"]) == 1
+
+        # отзывы попали в журнал членства и в аудит
+        changes = (await ac.get("/changes", params={"since": version})).json()["changes"]
+        assert [c["op"] for c in changes].count("remove") == 6
+        await audit_log.flush()
+        events = (await ac.get("/audit", params={"user_id": "off-2"})).json()
+        assert [e["source"] for e in events if e["action"] == "revoke"] == ["offboarding"] * 3
+
+        empty = await ac.post("/users/revoke-all:batch", json={"user_ids": []})
+        assert empty.status_code == 422
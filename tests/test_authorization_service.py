@@ -21,3 +21,387 @@ async def test_has_conflict_true():
         assert await has_conflict(s, ["DEVELOPER", "OWNER"]) is True
         assert await has_conflict(s, ["DEVELOPER"]) is False
         assert await has_conflict(s, ["DEVELOPER", "DB_ADMIN"]) is False
+
+
+@pytest.mark.asyncio
+async def test_status_batcher_coalesces_submits():
+    import asyncio
+    import json
+    import httpx
+    from authorization_service.app.status_batcher import StatusBatcher
+
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        items = json.loads(request.content)["items"]
+        calls.append(items)
+        return httpx.Response(
+            200,
+            json={
+                "results": [
+                    {"request_id": i["request_id"], "found": i["request_id"] != 3}
+                    for i in items
+                ]
+            },
+        )
+
+    batcher = StatusBatcher(
+        "http://request/requests/status:batch",
+        max_delay=0.01,
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    results = await asyncio.gather(
+        batcher.submit(1, "approved"),
+        batcher.submit(2, "rejected", "Conflicting groups"),
+        batcher.submit(3, "approved"),
+    )
+    await batcher.aclose()
+
+    assert len(calls) == 1
+    assert [r["found"] for r in results] == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_status_batcher_retries_transient_failures():
+    import asyncio
+    import httpx
+    from authorization_service.app.status_batcher import StatusBatcher
+
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"results": [{"request_id": 1, "found": True}]})
+
+    batcher = StatusBatcher(
+        "http://request/requests/status:batch",
+        max_delay=0,
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        backoff=0.001,
+    )
+    result = await batcher.submit(1, "approved")
+    assert result["found"] is True
+    assert len(calls) == 3
+
+    # ответ 4xx не повторяется
+    calls.clear()
+    batcher._client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: calls.append(request) or httpx.Response(422))
+    )
+    with pytest.raises(httpx.HTTPStatusError):
+        await asyncio.wait_for(batcher.submit(2, "approved"), 1)
+    assert len(calls) == 1
+    await batcher.aclose()
+
+
+@pytest.mark.asyncio
+async def test_rpc_access_client_multiplexes_and_falls_back(monkeypatch, tmp_path):
+    import asyncio
+    import httpx
+
+    from access_service.app import db as access_db
+    from access_service.app import models as access_models
+    from access_service.app import rpc
+    from access_service.app.main import app as access_app, get_session
+    from authorization_service.app.access_client import (
+        FallbackAccessClient,
+        HttpAccessClient,
+        RpcAccessClient,
+        RpcUnavailable,
+    )
+    from authorization_service.app import consumer
+    from authorization_service.app.metrics import RPC_FALLBACKS
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(access_models.Base.metadata.create_all)
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    monkeypatch.setattr(access_db, "async_session_factory", factory)
+    monkeypatch.setattr(access_db, "read_session_factory", factory)
+    async with factory() as s:
+        s.add(access_models.RightGroup(code="DEVELOPER"))
+        await s.commit()
+
+    address = f"unix://{tmp_path / 'access.sock'}"
+    server = rpc.RpcServer()
+    await server.start(address)
+    client = RpcAccessClient(address, reconnect_delay=60)
+    try:
+        assert await client.apply(1, "r1", "group", 1) is True
+        assert await client.apply(2, "r1", "group", 99) is False
+        # параллельные вызовы идут по одному соединению и не путают ответы
+        results = await asyncio.gather(
+            *[client.get_user_rights(f"r{i % 2}") for i in range(20)],
+            client.get_group(1),
+            client.get_group(99),
+        )
+        assert [g["code"] for g in results[0]["groups"]] == []
+        assert [g["code"] for g in results[1]["groups"]] == ["DEVELOPER"]
+        assert all(r["user_id"] == f"r{i % 2}" for i, r in enumerate(results[:20]))
+        assert results[20] == {"id": 1, "code": "DEVELOPER"}
+        assert results[21] is None
+
+        # сбой БД на стороне Access — недоступность, а не ответ: сообщение повторяется
+        async def broken(params):
+            raise ConnectionRefusedError("database is down")
+
+        monkeypatch.setitem(rpc.METHODS, "group", broken)
+        with pytest.raises(RpcUnavailable) as exc_info:
+            await client.get_group(1)
+        assert consumer.is_retryable(exc_info.value)
+    finally:
+        await server.close()
+        await client.aclose()
+
+    async def _get_session():
+        async with factory() as s:
+            yield s
+
+    monkeypatch.setitem(access_app.dependency_overrides, get_session, _get_session)
+    http = httpx.AsyncClient(transport=httpx.ASGITransport(app=access_app))
+    fallback = FallbackAccessClient(client, HttpAccessClient("http://access", http))
+    before = RPC_FALLBACKS.get("get_group")
+    try:
+        assert await fallback.get_group(1) == {"id": 1, "code": "DEVELOPER"}
+        assert RPC_FALLBACKS.get("get_group") == before + 1
+    finally:
+        await http.aclose()
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_conflict_decision_cache_hits_and_invalidates_on_rule_change():
+    from sqlalchemy import update
+    from authorization_service.app.models import ConflictRulesVersion
+    from authorization_service.app.services import (
+        CachedGroupConflictPolicy,
+        ConflictDecisionCache,
+    )
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        async with factory() as s:
+            s.add(ConflictingGroup(group_code_a="DEVELOPER", group_code_b="OWNER"))
+            s.add(ConflictRulesVersion(id=1, version=1))
+            await s.commit()
+
+        now = [0.0]
+        cache = ConflictDecisionCache(max_entries=2, check_interval=5, clock=lambda: now[0])
+        async with factory() as s:
+            policy = CachedGroupConflictPolicy(s, cache)
+            assert await policy.has_conflict(["OWNER", "DEVELOPER"]) is True
+            # тот же набор в другом порядке — попадание
+            assert await policy.has_conflict(["DEVELOPER", "OWNER"]) is True
+            assert await policy.has_conflict(["DEVELOPER", "DB_ADMIN"]) is False
+            assert (cache.hits, cache.misses) == (1, 2)
+            assert len(cache) == 2
+
+            s.add(ConflictingGroup(group_code_a="DB_ADMIN", group_code_b="DEVELOPER"))
+            await s.execute(
+                update(ConflictRulesVersion).values(version=ConflictRulesVersion.version + 1)
+            )
+            await s.commit()
+            # до очередной проверки версии действует прежнее решение
+            assert await policy.has_conflict(["DEVELOPER", "DB_ADMIN"]) is False
+            now[0] = 10
+            assert await policy.has_conflict(["DEVELOPER", "DB_ADMIN"]) is True
+
+        stats = cache.snapshot()
+        assert stats["rules_version"] == 2
+        assert stats["invalidations"] == 1
+        assert stats["hit_rate"] == 0.4
+        assert ConflictDecisionCache.key(["B", "A"]) == ConflictDecisionCache.key(["A", "B"])
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limiter_grows_backs_off_and_gates():
+    import asyncio
+    from authorization_service.app.concurrency import AdaptiveLimiter
+    from authorization_service.app.metrics import REGISTRY
+
+    now = [0.0]
+    limiter = AdaptiveLimiter(initial=4, min_limit=2, max_limit=8, clock=lambda: now[0])
+    changes = []
+    limiter.subscribe(changes.append)
+
+    async def run(latency, ok=True, parallel=None):
+        parallel = parallel or limiter.current
+        for _ in range(parallel):
+            await limiter.acquire()
+        for _ in range(parallel):
+            limiter.release(latency, ok)
+
+    # быстрый и загруженный downstream: предел растёт до верхней границы
+    for _ in range(200):
+        await run(0.01)
+    assert limiter.current == 8
+    assert changes[-1] == 8
+
+    # волна ошибок в одном окне снижает предел один раз, дальше — по окну
+    await run(0.01, ok=False)
+    assert limiter.current == 7
+    assert limiter.decreases["error"] == 1
+    for _ in range(20):
+        now[0] += 1
+        await run(0.01, ok=False)
+    assert limiter.current == 2
+
+    # рост задержки выше tolerance × базовой тоже снижает предел
+    limiter.limit = 8.0
+    for _ in range(5):
+        now[0] += 1
+        await run(0.5)
+    assert limiter.decreases["latency"] > 0
+    assert limiter.current < 8
+    assert limiter.baseline < 0.05
+
+    # сверх предела acquire ждёт освобождения места
+    limiter.limit = 2.0
+    await limiter.acquire()
+    await limiter.acquire()
+    waiting = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not waiting.done()
+    limiter.release()
+    await asyncio.wait_for(waiting, 1)
+    assert limiter.in_flight == 2
+    limiter.release()
+    limiter.release()
+
+    assert 'consumer_concurrency{state="limit"}' in REGISTRY.render()
+
+
+@pytest.mark.asyncio
+async def test_priority_lanes_weighted_fair_under_limit():
+    import asyncio
+    from authorization_service.app.concurrency import AdaptiveLimiter
+    from authorization_service.app.lanes import WeightedFairQueue, parse_weights
+
+    weights = parse_weights("critical=8,normal=4,bulk=1")
+    with pytest.raises(ValueError):
+        parse_weights("critical=8,bulk=1")
+
+    # при постоянной нагрузке всех полос доли равны весам
+    queue = WeightedFairQueue(weights)
+    for lane in weights:
+        for i in range(26):
+            queue.append(lane, i)
+    served = [queue.popleft()[0] for _ in range(26)]
+    assert (served.count("critical"), served.count("normal"), served.count("bulk")) == (16, 8, 2)
+
+    limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1, weights=weights)
+    assert limiter.lane("unknown") == "normal"
+    order = []
+
+    async def job(lane, i):
+        await limiter.acquire(lane)
+        order.append((lane, i))
+
+    await limiter.acquire()
+    bulk = [asyncio.create_task(job("bulk", i)) for i in range(5)]
+    await asyncio.sleep(0)
+    limiter.release()
+    await asyncio.sleep(0)
+    assert order == [("bulk", 0)]
+    assert limiter.snapshot()["waiting"]["bulk"] == 4
+
+    # срочная заявка, пришедшая за пачкой bulk, получает следующее место
+    urgent = asyncio.create_task(job("critical", 0))
+    await asyncio.sleep(0)
+    for _ in range(5):
+        limiter.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(urgent, *bulk)
+    assert order[:3] == [("bulk", 0), ("critical", 0), ("bulk", 1)]
+    assert len(order) == 6
+
+
+@pytest.mark.asyncio
+async def test_unavailable_downstream_requeues_message(monkeypatch):
+    import contextlib
+    import json
+    import time
+    import httpx
+    from authorization_service.app import consumer
+    from authorization_service.app.metrics import Counter
+    from acs_common.resilience import CircuitOpenError
+
+    class Message:
+        def __init__(self, headers=None):
+            self.body = json.dumps({"request_id": 1}).encode()
+            self.headers = headers or {}
+            self.processed = False
+            self.nacked = []
+
+        @contextlib.asynccontextmanager
+        async def process(self, ignore_processed=False):
+            yield self
+            self.processed = True
+
+        async def nack(self, requeue=True):
+            self.processed = True
+            self.nacked.append(requeue)
+
+    errors = [CircuitOpenError("open")]
+
+    async def handle(_):
+        raise errors[0]
+
+    monkeypatch.setattr(consumer, "handle_request", handle)
+    monkeypatch.setattr(consumer.settings, "message_retry_delay_seconds", 0)
+    # исходы этого теста не должны попасть в общий счётчик процесса
+    outcomes = Counter("consumer_messages_total", "", ("outcome",))
+    monkeypatch.setattr(consumer, "CONSUMER_OUTCOMES", outcomes)
+
+    # автомат открыт: сообщение возвращается в очередь, а не сгорает
+    message = Message()
+    assert await consumer._process(message) == "retry"
+    assert message.nacked == [True]
+
+    errors[0] = httpx.HTTPStatusError(
+        "boom", request=httpx.Request("GET", "http://x"), response=httpx.Response(503)
+    )
+    message = Message()
+    assert await consumer._process(message) == "retry"
+    assert message.nacked == [True]
+
+    # ошибка в самом сообщении и истёкший x-deadline — reject без возврата
+    for error, headers in (
+        (KeyError("user_id"), {}),
+        (CircuitOpenError("open"), {"x-deadline": time.time() - 1}),
+    ):
+        errors[0] = error
+        message = Message(headers)
+        with pytest.raises(type(error)):
+            await consumer._process(message)
+        assert message.nacked == []
+    assert (outcomes.get("retry"), outcomes.get("error")) == (2, 2)
+
+
+@pytest.mark.asyncio
+async def test_http_access_client_separates_not_found_from_failures():
+    import httpx
+    from authorization_service.app.access_client import HttpAccessClient
+
+    status = {"code": 404}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(status["code"], json={"detail": "x"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+        client = HttpAccessClient("http://access", http)
+        assert await client.apply(1, "u1", "group", 9) is False
+        assert await client.get_group(9) is None
+        # 5xx — сбой Access, а не отказ: исключение, сообщение вернётся в очередь
+        status["code"] = 503
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.apply(1, "u1", "group", 9)
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.get_group(9)
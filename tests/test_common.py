@@ -0,0 +1,63 @@
+import asyncio
+
+import httpx
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_client_span_ends_on_transport_error(monkeypatch):
+    from acs_common import tracing
+
+    exporter = tracing.InMemoryExporter()
+    monkeypatch.setattr(tracing.tracer, "exporter", exporter)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/down":
+            raise httpx.ConnectError("connection refused", request=request)
+        assert request.headers[tracing.TRACEPARENT]
+        return httpx.Response(200)
+
+    async def slow(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1)
+        return httpx.Response(200)
+
+    client = httpx.AsyncClient(transport=tracing.TracingTransport(httpx.MockTransport(handler)))
+    assert (await client.get("http://svc/ok")).status_code == 200
+    with pytest.raises(httpx.ConnectError):
+        await client.get("http://svc/down")
+
+    # отменённая по таймауту попытка тоже закрывает спан
+    slow_client = httpx.AsyncClient(transport=tracing.TracingTransport(httpx.MockTransport(slow)))
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(slow_client.get("http://svc/slow"), 0.01)
+
+    with tracing.service_scope("svc"):
+        await client.get("http://svc/ok")
+
+    assert [(s.status, s.attributes.get("error")) for s in exporter.spans] == [
+        ("ok", None),
+        ("error", "ConnectError"),
+        ("error", "CancelledError"),
+        ("ok", None),
+    ]
+    assert all(s.duration is not None for s in exporter.spans)
+    assert exporter.spans[-1].service == "svc"
+
+
+def test_engine_options_and_read_routing(monkeypatch):
+    from acs_common import db
+
+    assert db.engine_options("sqlite+aiosqlite:///:memory:") == {}
+    pg = db.engine_options("postgresql+asyncpg://u:p@h/db")
+    assert pg["pool_size"] == db.DB_POOL_SIZE
+    assert pg["connect_args"] == {
+        "prepared_statement_cache_size": db.DB_STATEMENT_CACHE_SIZE
+    }
+
+    primary, replica = object(), object()
+    recent = db.RecentWrites(window=60)
+    recent.mark("u1")
+    assert db.read_factory(primary, replica, recent, "u1") is primary
+    assert db.read_factory(primary, replica, recent, "u2") is replica
+    assert db.read_factory(primary, replica, recent, "u2", consistent=True) is primary
+    assert db.replica_factory(None, "svc_read", primary) is primary
@@ -0,0 +1,86 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from access_service.app import db as access_db
+from access_service.app import main as access_main
+from access_service.app import models as access_models
+from access_service.app.db import Base as AccessBase
+from authorization_service.app import consumer
+from authorization_service.app.db import Base as AuthBase
+from request_service.app import main as request_main
+from request_service.app import admission, messaging, upstream
+from request_service.app.result_cache import request_cache
+from request_service.app.db import Base as RequestBase
+
+import monolith.main as monolith
+
+
+async def _factory(base):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(base.metadata.create_all)
+    return async_sessionmaker(bind=engine, expire_on_commit=False)
+
+
+@pytest.fixture
+async def monolith_app(monkeypatch):
+    access, auth, request = [await _factory(b) for b in (AccessBase, AuthBase, RequestBase)]
+    async with access() as s:
+        s.add(access_models.RightGroup(code="DEVELOPER"))
+        await s.commit()
+
+    def override(factory):
+        async def _get_session():
+            async with factory() as s:
+                yield s
+
+        return _get_session
+
+    for main, factory in ((access_main, access), (request_main, request)):
+        overrides = main.app.dependency_overrides
+        monkeypatch.setitem(overrides, main.get_session, override(factory))
+        monkeypatch.setitem(overrides, main.get_read_session, override(factory))
+    monkeypatch.setattr(consumer, "async_session_factory", auth)
+    monkeypatch.setattr(access_db, "async_session_factory", access)
+    request_cache.clear()
+    # wire() подменяет модульные объекты сервисов — вернуть их после теста
+    for obj, name in (
+        (upstream, "transport"),
+        (request_main.access_proxy, "base_url"),
+        (messaging, "publisher"),
+        (consumer, "transport"),
+        (consumer, "ACCESS_SERVICE_URL"),
+        (consumer, "REQUEST_SERVICE_URL"),
+        (consumer, "status_batcher"),
+        (admission.monitor, "probe"),
+    ):
+        monkeypatch.setattr(obj, name, getattr(obj, name))
+
+    await monolith.startup_event()
+    try:
+        yield monolith.app
+    finally:
+        await monolith.shutdown_event()
+        for factory in (access, auth, request):
+            await factory.kw["bind"].dispose()
+
+
+@pytest.mark.asyncio
+async def test_monolith_approves_request_in_process(monolith_app):
+    transport = ASGITransport(app=monolith_app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        r = await ac.post(
+            "/requests", json={"user_id": "m1", "kind": "group", "target_id": 1}
+        )
+        assert r.status_code == 200
+        await monolith.queue.join()
+
+        req = (await ac.get(f"/requests/{r.json()['id']}")).json()
+        assert req["status"] == "approved"
+        rights = (await ac.get("/access/user/m1/rights")).json()
+        assert [g["code"] for g in rights["groups"]] == ["DEVELOPER"]
+        # тот же ответ через прокси Request Service (в памяти, без сети)
+        proxied = (await ac.get("/user/m1/rights")).json()
+        assert proxied == rights
+        assert (await ac.get("/authorization/health")).json() == {"status": "ok"}
@@ -1,9 +1,11 @@
+import json
 import pytest
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-from request_service.app.main import app, get_session
+from request_service.app.main import app, get_read_session, get_session
 from request_service.app.db import Base
+from request_service.app.result_cache import request_cache
 
 
 @pytest.fixture(scope="module")
@@ -22,6 +24,9 @@ async def override_session(test_session_factory):
             yield s
 
     app.dependency_overrides[get_session] = _get_session
+    app.dependency_overrides[get_read_session] = _get_session
+    # кэш заявок процесса соответствует одной БД
+    request_cache.clear()
     yield
     app.dependency_overrides.clear()
 
@@ -47,3 +52,832 @@ async def test_create_and_patch_request(monkeypatch):
         p = await ac.patch(f"/requests/{rid}/status", json={"status": "approved"})
         assert p.status_code == 200
         assert p.json()["status"] == "approved"
+
+
+@pytest.mark.asyncio
+async def test_patch_status_batch(monkeypatch):
+    async def dummy_publish(_: dict) -> None:
+        return None
+
+    from request_service.app import messaging
+
+    monkeypatch.setattr(messaging, "publish_request", dummy_publish)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        created = [
+            (
+                await ac.post(
+                    "/requests",
+                    json={"user_id": "u2", "kind": "access", "target_id": t},
+                )
+            ).json()
+            for t in (1, 2)
+        ]
+        r = await ac.patch(
+            "/requests/status:batch",
+            json={
+                "items": [
+                    {
+                        "request_id": created[0]["id"],
+                        "status": "approved",
+                        "created_at": created[0]["created_at"],
+                    },
+                    {"request_id": 999999, "status": "approved"},
+                    {
+                        "request_id": created[1]["id"],
+                        "status": "rejected",
+                        "reason": "Conflicting groups",
+                    },
+                ]
+            },
+        )
+        assert r.status_code == 200
+        results = r.json()["results"]
+        assert [x["found"] for x in results] == [True, False, True]
+        assert results[0]["request"]["status"] == "approved"
+        assert results[2]["request"]["reason"] == "Conflicting groups"
+        assert results[2]["request"]["updated_at"] >= created[1]["updated_at"]
+
+        # повтор пачки после таймаута: заявка уже в запрошенном статусе
+        replay = await ac.patch(
+            "/requests/status:batch",
+            json={
+                "items": [
+                    {"request_id": created[0]["id"], "status": "approved"},
+                    {"request_id": created[1]["id"], "status": "approved"},
+                ]
+            },
+        )
+        replayed = replay.json()["results"]
+        assert [x["found"] for x in replayed] == [True, False]
+        assert replayed[0]["request"]["updated_at"] == results[0]["request"]["updated_at"]
+        assert replayed[1]["request"]["status"] == "rejected"
+
+        r = await ac.get(
+            f"/requests/{created[0]['id']}",
+            params={"created_at": created[0]["created_at"]},
+        )
+        assert r.json()["status"] == "approved"
+
+
+@pytest.mark.asyncio
+async def test_duplicate_and_idempotent_submissions(monkeypatch):
+    published = []
+
+    async def dummy_publish(message: dict) -> None:
+        published.append(message)
+
+    from request_service.app import messaging
+
+    monkeypatch.setattr(messaging, "publish_request", dummy_publish)
+
+    body = {"user_id": "u3", "kind": "group", "target_id": 7}
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        first = await ac.post("/requests", json=body, headers={"Idempotency-Key": "k1"})
+        retry = await ac.post("/requests", json=body, headers={"Idempotency-Key": "k1"})
+        double_click = await ac.post("/requests", json=body)
+        misuse = await ac.post(
+            "/requests",
+            json={**body, "target_id": 8},
+            headers={"Idempotency-Key": "k1"},
+        )
+
+        assert first.status_code == 200
+        assert "Idempotent-Replayed" not in first.headers
+        assert retry.json()["id"] == first.json()["id"]
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert double_click.json()["id"] == first.json()["id"]
+        assert "Idempotent-Replayed" not in double_click.headers
+        assert misuse.status_code == 409
+        assert len(published) == 1
+
+        # after the decision a new submission creates a new request
+        await ac.patch(f"/requests/{first.json()['id']}/status", json={"status": "rejected"})
+        again = await ac.post("/requests", json=body)
+        assert again.json()["id"] != first.json()["id"]
+        assert len(published) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_publish_abandons_request(monkeypatch):
+    published = []
+    broker_down = True
+
+    async def flaky_publish(message: dict) -> None:
+        if broker_down:
+            raise ConnectionError("broker unavailable")
+        published.append(message)
+
+    from request_service.app import messaging
+
+    monkeypatch.setattr(messaging, "publish_request", flaky_publish)
+
+    body = {"user_id": "u-publish", "kind": "access", "target_id": 3}
+    headers = {"Idempotency-Key": "k-publish"}
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        failed = await ac.post("/requests", json=body, headers=headers)
+        assert failed.status_code == 503
+        assert failed.headers["Retry-After"]
+        lost = (await ac.get("/requests/user/u-publish")).json()
+        assert [r["status"] for r in lost] == ["cancelled"]
+
+        broker_down = False
+        retry = await ac.post("/requests", json=body, headers=headers)
+        assert retry.status_code == 200
+        assert "Idempotent-Replayed" not in retry.headers
+        assert retry.json()["id"] != lost[0]["id"]
+        assert retry.json()["status"] == "pending"
+        assert [m["request_id"] for m in published] == [retry.json()["id"]]
+
+
+def test_partition_maintenance_selection():
+    from datetime import datetime, timezone
+    from request_service.app.maintenance import (
+        add_months,
+        month_start,
+        partition_name,
+        partitions_to_archive,
+    )
+
+    now = datetime(2026, 3, 15, 12, 30, tzinfo=timezone.utc)
+    assert partition_name(month_start(now)) == "requests_y2026m03"
+    assert add_months(month_start(now), -3) == datetime(2025, 12, 1, tzinfo=timezone.utc)
+
+    names = [
+        "requests_y2025m01",
+        "requests_y2025m02",
+        "requests_y2025m03",
+        "requests_y2026m03",
+        "idempotency_keys",
+    ]
+    assert partitions_to_archive(names, now, retention_months=12) == [
+        "requests_y2025m01",
+        "requests_y2025m02",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_request_stats_rollups(monkeypatch):
+    async def dummy_publish(_: dict) -> None:
+        return None
+
+    from request_service.app import messaging
+
+    monkeypatch.setattr(messaging, "publish_request", dummy_publish)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        before = (await ac.get("/stats/requests", params={"kind": "access"})).json()
+        ids = [
+            (
+                await ac.post(
+                    "/requests",
+                    json={"user_id": "u4", "kind": "access", "target_id": t},
+                )
+            ).json()["id"]
+            for t in (1, 2, 3)
+        ]
+        await ac.patch(
+            "/requests/status:batch",
+            json={
+                "items": [
+                    {"request_id": ids[0], "status": "approved"},
+                    {"request_id": ids[1], "status": "rejected"},
+                ]
+            },
+        )
+        r = await ac.get("/stats/requests", params={"kind": "access"})
+        assert r.status_code == 200
+        data = r.json()
+
+    def delta(status):
+        return data["totals"].get(status, 0) - before["totals"].get(status, 0)
+
+    assert delta("pending") == 1
+    assert delta("approved") == 1
+    assert delta("rejected") == 1
+    overall = next(x for x in data["latency"] if x["status"] == "all")
+    assert overall["count"] >= 2
+    assert overall["p50"] is not None
+
+
+@pytest.mark.asyncio
+async def test_stats_upserts_rows_in_key_order(test_session_factory):
+    from datetime import datetime, timezone
+    from request_service.app import stats
+
+    hour = datetime(2026, 3, 1, 10, tzinfo=timezone.utc)
+    async with test_session_factory() as s:
+        executed = []
+        execute = s.execute
+
+        async def capture(stmt, *args, **kwargs):
+            executed.append(stmt.compile(dialect=s.get_bind().dialect).params)
+            return await execute(stmt, *args, **kwargs)
+
+        s.execute = capture
+        await stats.record_transitions(
+            s,
+            [
+                (hour, hour, "group", "pending", "rejected"),
+                (hour, hour, "access", "pending", "approved"),
+            ],
+        )
+        await s.rollback()
+
+    params = executed[0]
+    keys = [
+        (params[f"kind_m{i}"], params[f"status_m{i}"])
+        for i in range(len([k for k in params if k.startswith("kind_m")]))
+    ]
+    assert keys == sorted(keys)
+    assert len(keys) == 4
+
+
+def test_latency_percentile_interpolation():
+    from request_service.app.stats import latency_bin, percentile
+
+    hist = {latency_bin(0.07): 50, latency_bin(3.0): 50}
+    assert 0.05 <= percentile(hist, 0.5) <= 0.1
+    assert 2.5 <= percentile(hist, 0.99) <= 5
+    assert percentile({}, 0.5) is None
+
+
+@pytest.mark.asyncio
+async def test_proxy_coalescing_and_cache(monkeypatch):
+    import asyncio
+    import httpx
+    from request_service.app.upstream import AccessProxy
+    from request_service.app import main
+
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        await asyncio.sleep(0.01)
+        if request.url.path.endswith("/revoke"):
+            return httpx.Response(200, json={"removed": 1})
+        return httpx.Response(200, json={"path": request.url.path})
+
+    proxy = AccessProxy(
+        "http://access",
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(main, "access_proxy", proxy)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        rights = await asyncio.gather(*[ac.get("/user/u5/rights") for _ in range(5)])
+        assert all(r.json() == {"path": "/user/u5/rights"} for r in rights)
+        assert calls.count("/user/u5/rights") == 1
+
+        for _ in range(3):
+            r = await ac.get("/resource/1/access")
+            assert r.status_code == 200
+        assert calls.count("/resource/1/access") == 1
+        await ac.get("/resource/1/access", headers={"Cache-Control": "no-cache"})
+        assert calls.count("/resource/1/access") == 2
+
+        r = await ac.post(
+            "/user/u5/revoke", json={"user_id": "u5", "kind": "group", "target_id": 1}
+        )
+        assert r.json() == {"removed": 1}
+
+        stats = (await ac.get("/proxy/stats")).json()
+        assert stats["coalesced"] == 4
+        assert stats["cache_hits"] == 2
+        assert stats["saved"] == 6
+        assert stats["invalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_proxy_follower_survives_cancelled_leader():
+    import asyncio
+    import httpx
+    from request_service.app.upstream import AccessProxy
+
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"n": len(calls)})
+
+    proxy = AccessProxy(
+        "http://access", client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    leader = asyncio.create_task(proxy.get("/user/u6/rights"))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(proxy.get("/user/u6/rights"))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    # ведомый не зависает на future отменённого ведущего, а повторяет вызов
+    assert await asyncio.wait_for(follower, 1) == (200, {"n": 2})
+    assert leader.cancelled()
+    await proxy.aclose()
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_labels_route_templates():
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from acs_common.metrics import (
+        DB_CONNECT_LATENCY,
+        DB_POOL_IN_USE,
+        DB_QUERY_LATENCY,
+        instrument_engine,
+    )
+
+    # свой движок: слушатели не должны оставаться на общем движке модуля
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    instrument_engine(engine, "request_test")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def _get_session():
+        async with factory() as s:
+            yield s
+
+    app.dependency_overrides[get_session] = _get_session
+    app.dependency_overrides[get_read_session] = _get_session
+    async with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            await conn.execute(text("SELECT * FROM missing_table"))
+        assert DB_POOL_IN_USE.get("request_test") == 1
+        # упавший запрос не оставляет метку начала
+        assert not conn.sync_connection.info.get("query_started")
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        for rid in (101, 102):
+            r = await ac.get(f"/requests/{rid}")
+            assert r.status_code == 404
+        m = await ac.get("/metrics")
+
+    assert m.status_code == 200
+    assert m.headers["content-type"].startswith("text/plain")
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/requests/{request_id}",status="404"} 2' in m.text
+    )
+    assert DB_QUERY_LATENCY.count("request_test") >= 2
+    assert DB_CONNECT_LATENCY.count("request_test") >= 1
+    assert DB_POOL_IN_USE.get("request_test") == 0
+    await engine.dispose()
+    assert 'access_proxy_events_total{event="saved"}' in m.text
+
+
+def test_admission_buckets_and_hysteresis():
+    from request_service.app.admission import AdmissionController
+
+    now = [0.0]
+    ctl = AdmissionController(
+        threshold=100,
+        resume_ratio=0.5,
+        rate=3,
+        burst=3,
+        user_rate=1,
+        user_burst=2,
+        clock=lambda: now[0],
+    )
+    ctl.observe_depth(99)
+    assert all(ctl.admit("bulk") is None for _ in range(10))
+
+    ctl.observe_depth(100)
+    assert ctl.admit("bulk") is None
+    assert ctl.admit("bulk") is None
+    # пользователь исчерпал свой лимит, остальные ещё проходят
+    assert ctl.admit("bulk") == pytest.approx(1.0)
+    assert ctl.admit("other") is None
+    # общий лимит исчерпан
+    assert ctl.admit("third") == pytest.approx(1 / 3)
+    assert ctl.rejected == {"user": 1, "global": 1}
+
+    now[0] = 1.0
+    assert ctl.admit("bulk") is None
+
+    ctl.observe_depth(60)  # выше resume-порога: ограничение остаётся
+    assert ctl.throttling
+    ctl.observe_depth(49)
+    assert not ctl.throttling
+    ctl.observe_depth(None)  # глубина неизвестна — fail-open
+    assert ctl.admit("bulk") is None
+
+
+@pytest.mark.asyncio
+async def test_amqp_depth_probe_reuses_connection(monkeypatch):
+    import aio_pika
+    from types import SimpleNamespace
+    from request_service.app import admission
+
+    connects, channels = [], []
+
+    class FakeChannel:
+        is_closed = False
+
+        async def declare_queue(self, name, passive):
+            if name.endswith(".bulk"):
+                # как у RabbitMQ: ошибка passive declare закрывает канал
+                self.is_closed = True
+                raise aio_pika.exceptions.ChannelNotFoundEntity(name)
+            return SimpleNamespace(declaration_result=SimpleNamespace(message_count=3))
+
+    class FakeConnection:
+        closed = False
+
+        async def channel(self):
+            channels.append(FakeChannel())
+            return channels[-1]
+
+        async def close(self):
+            self.closed = True
+
+    async def connect_robust(url):
+        connects.append(FakeConnection())
+        return connects[-1]
+
+    monkeypatch.setattr(aio_pika, "connect_robust", connect_robust)
+    probe = admission.AmqpQueueDepth("amqp://test/")
+    assert await probe() == 6
+    assert await probe() == 6
+    assert len(connects) == 1
+    # канал переоткрывается только после закрывшей его ошибки
+    assert len(channels) == 2
+    await probe.aclose()
+    assert connects[0].closed
+
+
+@pytest.mark.asyncio
+async def test_create_request_rejected_with_retry_after(monkeypatch):
+    from request_service.app import admission, messaging
+
+    async def dummy_publish(_: dict) -> None:
+        return None
+
+    monkeypatch.setattr(messaging, "publish_request", dummy_publish)
+    ctl = admission.AdmissionController(
+        threshold=10, rate=100, burst=100, user_rate=0.5, user_burst=1
+    )
+    ctl.observe_depth(500)
+    monkeypatch.setattr(admission, "controller", ctl)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        body = {"user_id": "burst", "kind": "access", "target_id": 31}
+        first = await ac.post("/requests", json=body)
+        assert first.status_code == 200
+        r = await ac.post("/requests", json={**body, "target_id": 32})
+        assert r.status_code == 429
+        assert r.headers["Retry-After"] == "2"
+        # повтор принятой заявки отвечает ею, а не 429
+        again = await ac.post("/requests", json=body, headers={"Idempotency-Key": "burst-31"})
+        assert again.status_code == 200
+        assert again.json()["id"] == first.json()["id"]
+        assert ctl.rejected == {"user": 1, "global": 0}
+        other = {"user_id": "calm", "kind": "access", "target_id": 31}
+        assert (await ac.post("/requests", json=other)).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_create_time_bound_request_publishes_expiry(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from request_service.app import messaging
+
+    published = []
+
+    async def dummy_publish(message: dict) -> None:
+        published.append(message)
+
+    monkeypatch.setattr(messaging, "publish_request", dummy_publish)
+
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=4)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        past = await ac.post(
+            "/requests",
+            json={
+                "user_id": "u-temp",
+                "kind": "group",
+                "target_id": 11,
+                "expires_at": (expires_at - timedelta(days=1)).isoformat(),
+            },
+        )
+        assert past.status_code == 422
+
+        r = await ac.post(
+            "/requests",
+            json={
+                "user_id": "u-temp",
+                "kind": "group",
+                "target_id": 11,
+                "expires_at": expires_at.isoformat(),
+            },
+        )
+        assert r.status_code == 200
+        stored = (await ac.get(f"/requests/{r.json()['id']}")).json()
+        assert datetime.fromisoformat(stored["expires_at"]).replace(
+            tzinfo=timezone.utc
+        ) == expires_at
+        assert published[-1]["expires_at"] == expires_at.isoformat()
+
+
+@pytest.mark.asyncio
+async def test_fast_path_responses_match_pydantic_json(monkeypatch, test_session_factory):
+    import json
+    from datetime import datetime, timedelta, timezone
+    import msgpack
+    from pydantic import TypeAdapter
+    from request_service.app import messaging, schemas
+    from request_service.app import repositories as repo
+    from acs_common.serialization import FastJSONResponse, MsgpackResponse
+
+    async def dummy_publish(_: dict) -> None:
+        return None
+
+    monkeypatch.setattr(messaging, "publish_request", dummy_publish)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        for target_id in (41, 42):
+            r = await ac.post(
+                "/requests",
+                json={
+                    "user_id": "u-fast",
+                    "kind": "access",
+                    "target_id": target_id,
+                    "expires_at": (
+                        datetime.now(timezone.utc) + timedelta(hours=1)
+                    ).isoformat(),
+                },
+            )
+            assert r.status_code == 200
+        rid = r.json()["id"]
+
+        one = await ac.get(f"/requests/{rid}")
+        many = await ac.get("/requests/user/u-fast")
+        packed = await ac.get(
+            "/requests/user/u-fast", headers={"Accept": "application/x-msgpack"}
+        )
+
+    async with test_session_factory() as s:
+        rows = await repo.get_user_requests(s, "u-fast")
+    expected = [
+        json.loads(schemas.RequestOut.model_validate(row).model_dump_json()) for row in rows
+    ]
+    assert one.headers["content-type"] == "application/json"
+    assert one.json() == expected[0]
+    assert many.json() == expected
+    assert packed.headers["content-type"] == "application/x-msgpack"
+    assert msgpack.unpackb(packed.content) == expected
+
+    # UTC-время кодируется так же, как в pydantic: с суффиксом "Z"
+    moment = {"at": datetime(2024, 5, 1, 12, 30, 15, 250, tzinfo=timezone.utc)}
+    pydantic_at = TypeAdapter(datetime).dump_python(moment["at"], mode="json")
+    assert json.loads(FastJSONResponse(moment).body)["at"] == pydantic_at
+    assert msgpack.unpackb(MsgpackResponse(moment).body)["at"] == pydantic_at
+
+
+@pytest.mark.asyncio
+async def test_resilient_client_breaker_hedging_and_deadline():
+    import asyncio
+    import time
+    import httpx
+    from fastapi import FastAPI, Request as HttpRequest
+    from fastapi.responses import JSONResponse
+    from acs_common import resilience
+
+    # подставное приложение Access с управляемыми ошибками и задержкой
+    stand_in = FastAPI()
+    state = {"fail": True, "calls": 0, "slow": 0, "deadlines": []}
+
+    @stand_in.get("/flaky")
+    async def flaky():
+        state["calls"] += 1
+        if state["fail"]:
+            return JSONResponse({"detail": "boom"}, status_code=500)
+        return {"ok": True}
+
+    @stand_in.get("/item/{item_id}")
+    async def item(item_id: int, request: HttpRequest):
+        state["deadlines"].append(request.headers.get("x-deadline-ms"))
+        if state["slow"]:
+            state["slow"] -= 1
+            await asyncio.sleep(1)
+        return {"id": item_id}
+
+    @stand_in.get("/budget")
+    async def budget():
+        return {"remaining": resilience.remaining()}
+
+    now = [0.0]
+    http = httpx.AsyncClient(
+        transport=ASGITransport(app=resilience.DeadlineMiddleware(stand_in)),
+        base_url="http://access",
+    )
+    client = resilience.ResilientClient(
+        http, failure_threshold=3, reset_timeout=5, hedge_min_samples=5, clock=lambda: now[0]
+    )
+    try:
+        # автомат: 3 ошибки подряд открывают его, вызовы не доходят до сервиса
+        for _ in range(3):
+            assert (await client.get("http://access/flaky", "flaky")).status_code == 500
+        with pytest.raises(resilience.CircuitOpenError):
+            await client.get("http://access/flaky", "flaky")
+        assert state["calls"] == 3
+        now[0] += 5
+        await client.get("http://access/flaky", "flaky")  # проба в half-open неудачна
+        assert client.breakers["flaky"].state == resilience.OPEN
+        state["fail"] = False
+        now[0] += 5
+        assert (await client.get("http://access/flaky", "flaky")).json() == {"ok": True}
+        assert client.breakers["flaky"].state == resilience.CLOSED
+
+        # хеджирование: медленный ответ заменяется вторым запросом после p95
+        for i in range(10):
+            await client.get(f"http://access/item/{i}", "GET /item/{item_id}")
+        state["slow"] = 1
+        started = time.perf_counter()
+        r = await client.get("http://access/item/42", "GET /item/{item_id}")
+        assert r.json() == {"id": 42}
+        assert time.perf_counter() - started < 0.5
+        assert client.hedged["GET /item/{item_id}"] == 1
+
+        # бюджет: таймаут по остатку, остаток передаётся вниз, автомат не открывается
+        state["slow"] = 2
+        started = time.perf_counter()
+        with resilience.deadline_scope(0.05):
+            with pytest.raises(resilience.DeadlineExceeded):
+                await client.get("http://access/item/7", "GET /item/{item_id}")
+        assert time.perf_counter() - started < 0.5
+        assert 0 < int(state["deadlines"][-1]) <= 50
+        assert client.breakers["GET /item/{item_id}"].state == resilience.CLOSED
+        with resilience.deadline_scope(0):
+            with pytest.raises(resilience.DeadlineExceeded):
+                await client.get("http://access/item/8", "GET /item/{item_id}")
+
+        # входящий X-Deadline-Ms становится бюджетом обработчика
+        r = await http.get("/budget", headers={"X-Deadline-Ms": "200"})
+        assert 0 < r.json()["remaining"] <= 0.2
+        assert (await http.get("/budget")).json()["remaining"] is None
+    finally:
+        await http.aclose()
+
+
+@pytest.mark.asyncio
+async def test_finalized_requests_served_from_cache_with_etag(monkeypatch):
+    async def dummy_publish(_: dict) -> None:
+        return None
+
+    from request_service.app import messaging
+    from request_service.app import repositories as repo
+
+    monkeypatch.setattr(messaging, "publish_request", dummy_publish)
+    reads = []
+    original = repo.get_request
+
+    async def counting_get_request(session, request_id, created_at=None):
+        reads.append(request_id)
+        return await original(session, request_id, created_at)
+
+    monkeypatch.setattr(repo, "get_request", counting_get_request)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        rid = (
+            await ac.post("/requests", json={"user_id": "c1", "kind": "group", "target_id": 7})
+        ).json()["id"]
+
+        pending = await ac.get(f"/requests/{rid}")
+        assert pending.json()["status"] == "pending"
+        assert pending.headers["cache-control"] == "no-cache"
+        # pending кэшируется кратко: повтор не читает БД
+        await ac.get(f"/requests/{rid}")
+        assert reads == [rid]
+
+        # коллбек сбрасывает запись — новый статус виден сразу
+        await ac.patch(f"/requests/{rid}/status", json={"status": "rejected", "reason": "no"})
+        final = await ac.get(f"/requests/{rid}")
+        assert final.json()["status"] == "rejected"
+        assert "immutable" in final.headers["cache-control"]
+        assert final.headers["etag"] != pending.headers["etag"]
+        assert reads == [rid, rid]
+
+        for _ in range(3):
+            again = await ac.get(f"/requests/{rid}")
+            assert again.json() == final.json()
+        not_modified = await ac.get(
+            f"/requests/{rid}", headers={"If-None-Match": final.headers["etag"]}
+        )
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert reads == [rid, rid]
+
+        # пакетный коллбек тоже сбрасывает запись
+        rid2 = (
+            await ac.post("/requests", json={"user_id": "c1", "kind": "group", "target_id": 8})
+        ).json()["id"]
+        assert (await ac.get(f"/requests/{rid2}")).json()["status"] == "pending"
+        await ac.patch(
+            "/requests/status:batch",
+            json={"items": [{"request_id": rid2, "status": "approved"}]},
+        )
+        assert (await ac.get(f"/requests/{rid2}")).json()["status"] == "approved"
+
+    # pending-строка, прочитанная до инвалидации, в кэш не попадает
+    since = request_cache.begin()
+    await request_cache.invalidate([rid2])
+    await request_cache.put({"id": rid2, "status": "pending"}, since)
+    assert (await request_cache.get(rid2)) is None
+
+
+@pytest.mark.asyncio
+async def test_create_request_priority_routes_to_lane(monkeypatch):
+    from request_service.app import messaging
+
+    published = []
+
+    class RecordingPublisher:
+        async def publish(self, body, headers):
+            published.append((json.loads(body), headers))
+
+    monkeypatch.setattr(messaging, "publisher", RecordingPublisher())
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        for target_id, priority in ((21, "critical"), (22, None), (23, "bulk")):
+            body = {"user_id": "p1", "kind": "group", "target_id": target_id}
+            if priority:
+                body["priority"] = priority
+            assert (await ac.post("/requests", json=body)).status_code == 200
+        bad = await ac.post(
+            "/requests",
+            json={"user_id": "p1", "kind": "group", "target_id": 24, "priority": "urgent"},
+        )
+        assert bad.status_code == 422
+
+    lanes = [headers[messaging.LANE_HEADER] for _, headers in published]
+    assert lanes == ["critical", "normal", "bulk"]
+    assert [m["priority"] for m, _ in published] == lanes
+    assert [messaging.lane_queue(lane) for lane in lanes] == [
+        "access_requests.critical",
+        "access_requests",
+        "access_requests.bulk",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cancel_pending_batch_cancels_only_pending(monkeypatch):
+    from request_service.app import messaging
+
+    async def dummy_publish(_: dict) -> None:
+        return None
+
+    monkeypatch.setattr(messaging, "publish_request", dummy_publish)
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        ids = {}
+        for user_id, target_id in (("gone", 31), ("gone", 32), ("stays", 31)):
+            r = await ac.post(
+                "/requests", json={"user_id": user_id, "kind": "access", "target_id": target_id}
+            )
+            ids[(user_id, target_id)] = r.json()["id"]
+        await ac.patch(f"/requests/{ids[('gone', 32)]}/status", json={"status": "approved"})
+        # ответ pending попадает в кэш и должен сброситься при отмене
+        assert (await ac.get(f"/requests/{ids[('gone', 31)]}")).json()["status"] == "pending"
+
+        r = await ac.post(
+            "/requests/cancel:batch", json={"user_ids": ["gone"], "reason": "User offboarded"}
+        )
+        assert r.status_code == 200
+        [cancelled] = r.json()["cancelled"]
+        assert cancelled["id"] == ids[("gone", 31)]
+        assert (cancelled["status"], cancelled["reason"]) == ("cancelled", "User offboarded")
+
+        got = await ac.get(f"/requests/{ids[('gone', 31)]}")
+        assert got.json()["status"] == "cancelled"
+        assert "immutable" in got.headers["cache-control"]
+        assert (await ac.get(f"/requests/{ids[('gone', 32)]}")).json()["status"] == "approved"
+        assert (await ac.get(f"/requests/{ids[('stays', 31)]}")).json()["status"] == "pending"
+
+        again = await ac.post("/requests/cancel:batch", json={"user_ids": ["gone"]})
+        assert again.json() == {"cancelled": []}
+        # запоздавший коллбек consumer'а не перезаписывает отменённую заявку
+        late = await ac.patch(
+            "/requests/status:batch",
+            json={"items": [{"request_id": ids[("gone", 31)], "status": "approved"}]},
+        )
+        assert late.json()["results"][0]["found"] is False
+        assert late.json()["results"][0]["request"]["status"] == "cancelled"
+        single = await ac.patch(
+            f"/requests/{ids[('gone', 31)]}/status", json={"status": "approved"}
+        )
+        assert single.status_code == 409
+        assert (await ac.get(f"/requests/{ids[('gone', 31)]}")).json()["status"] == "cancelled"
+        # отменённая заявка не мешает подать новую на ту же цель
+        r = await ac.post("/requests", json={"user_id": "gone", "kind": "access", "target_id": 31})
+        assert r.json()["id"] != ids[("gone", 31)]